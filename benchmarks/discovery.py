@@ -0,0 +1,119 @@
+"""
+Benchmark the discovery of Unreal Editors.
+
+Measures the CPU time and the wake-ups of an idle discovery session, and
+the time between starting a session and receiving the first pong from a
+node answering on the local multicast group. Results are printed as JSON.
+
+usage: python benchmarks/discovery.py [--idle-seconds 10] [--runs 20]
+"""
+import argparse
+import json
+import os
+import resource
+import socket
+import statistics
+import sys
+import threading
+import time
+import uuid
+
+# the unreal package does not depend on Substance Painter
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "substance_painter2ue")
+)
+from unreal.remote_execution import (  # noqa: E402
+    DEFAULT_MULTICAST_GROUP_ENDPOINT,
+    RemoteExecution,
+)
+
+
+def pong_responder(stop: threading.Event) -> None:
+    """Answer every ping on the multicast group until stopped."""
+    node_id = str(uuid.uuid4())
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind(("0.0.0.0", DEFAULT_MULTICAST_GROUP_ENDPOINT[1]))
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 0)
+    sock.setsockopt(
+        socket.IPPROTO_IP,
+        socket.IP_ADD_MEMBERSHIP,
+        socket.inet_aton(DEFAULT_MULTICAST_GROUP_ENDPOINT[0])
+        + socket.inet_aton("0.0.0.0"),
+    )
+    sock.settimeout(0.05)
+    pong = {"version": 1, "magic": "ue_py", "type": "pong", "source": node_id}
+    while not stop.is_set():
+        try:
+            message = json.loads(sock.recv(65536))
+        except socket.timeout:
+            continue
+        if message.get("type") == "ping" and message.get("source") != node_id:
+            pong["dest"] = message["source"]
+            pong["data"] = {"project_name": "benchmark", "machine": "benchmark"}
+            sock.sendto(json.dumps(pong).encode(), DEFAULT_MULTICAST_GROUP_ENDPOINT)
+    sock.close()
+
+
+def bench_idle(seconds: float) -> dict:
+    """Measure an idle discovery session, without any node answering."""
+    remote_exec = RemoteExecution()
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    cpu = time.process_time()
+    remote_exec.start()
+    time.sleep(seconds)
+    remote_exec.stop()
+    cpu = time.process_time() - cpu
+    switches = resource.getrusage(resource.RUSAGE_SELF).ru_nvcsw - usage.ru_nvcsw
+    return {
+        "seconds": seconds,
+        "cpu_ms_per_second": cpu * 1000 / seconds,
+        "wakeups_per_second": switches / seconds,
+    }
+
+
+def bench_first_pong(runs: int) -> dict:
+    """Measure the time from the start of a session to its first node."""
+    stop = threading.Event()
+    responder = threading.Thread(target=pong_responder, args=(stop,))
+    responder.start()
+    time.sleep(0.2)
+    latencies = []
+    try:
+        for _ in range(runs):
+            remote_exec = RemoteExecution()
+            start = time.perf_counter()
+            remote_exec.start()
+            if remote_exec.wait_for_nodes(5):
+                latencies.append((time.perf_counter() - start) * 1000)
+            remote_exec.stop()
+    finally:
+        stop.set()
+        responder.join()
+    return {
+        "runs": runs,
+        "found": len(latencies),
+        "median_ms": statistics.median(latencies) if latencies else None,
+        "max_ms": max(latencies) if latencies else None,
+    }
+
+
+def main() -> None:
+    """Run the benchmarks and print the results as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--idle-seconds", type=float, default=10.0)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+    print(
+        json.dumps(
+            {
+                "idle": bench_idle(args.idle_seconds),
+                "first_pong": bench_first_pong(args.runs),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
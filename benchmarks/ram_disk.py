@@ -0,0 +1,82 @@
+"""
+Benchmark exporting textures to a RAM disk rather than to the disk.
+
+Writes and reads back raw RGBA8 maps of each size in a folder on the disk
+and in a folder on the RAM disk, as Painter writes the exported textures
+and Unreal reads them. Each write is synced, so it reaches the disk rather
+than only the page cache. The reads are served by the page cache on both,
+as the files were just written, so they only compare the file systems.
+Results are printed as JSON.
+
+usage: python benchmarks/ram_disk.py [--disk-path DIR] [--ram-disk-path DIR]
+                                     [--sizes 4096 8192] [--runs 3]
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+# size of the blocks written and read
+BLOCK_SIZE = 8 * 1024 * 1024
+
+
+def bench_folder(folder: str, size: int, runs: int) -> dict:
+    """Measure writing and reading a map of the given size in a folder."""
+    data = os.urandom(BLOCK_SIZE)
+    map_bytes = size * size * 4
+    writes, reads = [], []
+    with tempfile.TemporaryDirectory(dir=folder) as work_dir:
+        path = os.path.join(work_dir, "Set_BaseColor.raw")
+        for _ in range(runs):
+            start = time.perf_counter()
+            with open(path, "wb") as file:
+                for _ in range(map_bytes // BLOCK_SIZE):
+                    file.write(data)
+                file.write(data[: map_bytes % BLOCK_SIZE])
+                file.flush()
+                os.fsync(file.fileno())
+            writes.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            with open(path, "rb") as file:
+                while file.read(BLOCK_SIZE):
+                    pass
+            reads.append(time.perf_counter() - start)
+            os.remove(path)
+    return {
+        "mb": map_bytes / 1e6,
+        "write_seconds": statistics.median(writes),
+        "read_seconds": statistics.median(reads),
+    }
+
+
+def main() -> None:
+    """Run the benchmark and print the results as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--disk-path",
+        default=os.path.dirname(os.path.abspath(__file__)),
+        help="folder on the disk, defaults to this folder",
+    )
+    parser.add_argument(
+        "--ram-disk-path",
+        default=os.environ.get("SP2UE_RAM_DISK_PATH", "/dev/shm"),
+        help="folder on the RAM disk, defaults to SP2UE_RAM_DISK_PATH or /dev/shm",
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=[4096, 8192])
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+    if not os.path.isdir(args.ram_disk_path):
+        parser.error("no RAM disk at {0}".format(args.ram_disk_path))
+    results = {}
+    for size in args.sizes:
+        results[str(size)] = {
+            "disk": bench_folder(args.disk_path, size, args.runs),
+            "ram_disk": bench_folder(args.ram_disk_path, size, args.runs),
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,635 @@
+"""
+Benchmark the send of textures to Unreal.
+
+Runs the send path of the plugin against stand-in Unreal nodes, with mocked
+substance_painter and PySide2 modules, and measures each of its steps: the
+discovery of the nodes, the setup of a command connection, the serialization
+of the import call, its transfer and the parsing of the response. The steps
+scale over texture counts, payload sizes and node counts. The transfers are
+measured in plain JSON, as with a stock Unreal, and zlib compressed.
+
+The stand-in nodes run in this process and answer the import call without
+importing anything, so the numbers are the ones of the plugin and of the
+wire, not of Unreal. Results are printed as JSON, or written to a file which
+a later run compares itself against.
+
+usage: python benchmarks/send.py [--runs 10] [--output results.json]
+                                 [--compare baseline.json]
+"""
+import argparse
+import ast
+import contextlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# map names of the exported textures, one texture set holds one of each
+MAP_NAMES = ("BaseColor", "Normal", "OcclusionRoughnessMetallic", "Emissive")
+
+
+class _PainterStub:
+    """Any object of the mocked modules: every attribute and call is a stub."""
+
+    def __init__(self, *args, **kwargs) -> None:
+        pass
+
+    def __call__(self, *args, **kwargs):
+        return _PainterStub()
+
+    def __getattr__(self, name: str):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return _PainterStub()
+
+    def __iter__(self):
+        return iter(())
+
+
+def install_painter_mock() -> None:
+    """Mock the modules only available inside Substance Painter."""
+    for name in (
+        "substance_painter",
+        "substance_painter.application",
+        "substance_painter.event",
+        "substance_painter.export",
+        "substance_painter.logging",
+        "substance_painter.project",
+        "substance_painter.resource",
+        "substance_painter.textureset",
+        "substance_painter.ui",
+        "PySide2",
+        "PySide2.QtCore",
+        "PySide2.QtGui",
+        "PySide2.QtWidgets",
+    ):
+        module = types.ModuleType(name)
+        # the classes can be derived from, ie QObject
+        module.__getattr__ = lambda attribute: type(attribute, (_PainterStub,), {})
+        sys.modules[name] = module
+        package, _, child = name.rpartition(".")
+        if package:
+            setattr(sys.modules[package], child, module)
+
+
+install_painter_mock()
+sys.path.insert(0, ROOT)
+from substance_painter2ue.sp2ue import (  # noqa: E402
+    get_import_arguments,
+    get_material_arguments,
+)
+from substance_painter2ue.sp2ue_cache import TextureCache  # noqa: E402
+from substance_painter2ue.unreal import RemoteUECommand, trace  # noqa: E402
+from substance_painter2ue.unreal.remote_execution import (  # noqa: E402
+    ENCODING_ZLIB,
+    MODE_EVAL_STATEMENT,
+    RemoteExecution,
+    _decode_json_buffer,
+    _encode_json_bytes,
+    _RemoteExecutionMessage,
+    _TYPE_COMMAND,
+)
+from substance_painter2ue.unreal.standin import StandinNode  # noqa: E402
+from substance_painter2ue.unreal.unreal import (  # noqa: E402
+    REMOTE_MODULE_NAME,
+    _REMOTE_MODULE_CALL_COMMAND,
+    load_remote_module,
+)
+
+
+def install_remote_module_mock() -> None:
+    """
+    Mock the helper module in the stand-in nodes, which share this process.
+
+    It holds the current version, so it is never pushed, and its import
+    answers as many assets as it is given textures.
+    """
+
+    def import_texture_sets(arguments: str) -> str:
+        arguments = json.loads(arguments)
+        return json.dumps(
+            {
+                "seconds": 0.0,
+                "assets": [
+                    {
+                        "texture_set": set_name,
+                        "file": texture["file"],
+                        "asset": "{0}/{1}".format(
+                            arguments["destination_path"],
+                            os.path.splitext(os.path.basename(texture["file"]))[0],
+                        ),
+                        "seconds": 0.0,
+                        "error": None,
+                        "skipped": False,
+                    }
+                    for set_name, textures in arguments["texture_sets"].items()
+                    for texture in textures
+                ],
+                "materials": [],
+            }
+        )
+
+    module = types.ModuleType(REMOTE_MODULE_NAME)
+    module.__version__ = load_remote_module()[1]
+    module.import_texture_sets = import_texture_sets
+    sys.modules[REMOTE_MODULE_NAME] = module
+
+
+def measure(function, runs: int) -> tuple:
+    """
+    Time a function.
+
+    :param callable function: called without argument.
+    :param int runs: number of calls.
+    :return tuple: the median and the fastest duration in milliseconds, and
+                   the value returned by the last call.
+    """
+    durations = []
+    value = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        value = function()
+        durations.append((time.perf_counter() - start) * 1000)
+    return statistics.median(durations), min(durations), value
+
+
+def wire_bytes(runs: int) -> int:
+    """
+    Get the bytes sent and received by each run, since the trace was cleared.
+
+    :param int runs: The number of runs.
+    :return int: The mean number of bytes on the wire.
+    """
+    counters = trace.TRACER.counters()
+    return (counters.get("bytes_sent", 0) + counters.get("bytes_received", 0)) // runs
+
+
+class Textures:
+    """Exported texture files, of four maps per texture set."""
+
+    def __init__(self, count: int, size: int = 64) -> None:
+        """
+        Write the texture files in a temporary folder.
+
+        :param int count: The largest number of textures benchmarked.
+        :param int size: The number of bytes of each file.
+        """
+        self._folder = tempfile.TemporaryDirectory()
+        self.files = []
+        for index in range(count):
+            file = os.path.join(
+                self._folder.name,
+                "Set{0:04d}_{1}.png".format(
+                    index // len(MAP_NAMES), MAP_NAMES[index % len(MAP_NAMES)]
+                ),
+            )
+            with open(file, "wb") as texture:
+                texture.write(os.urandom(size))
+            self.files.append(file)
+        self.cache = TextureCache(self._folder.name)
+        # hash once, a send hashes the files before serializing them
+        self.cache.refresh(self.files)
+
+    def texture_sets(self, count: int) -> dict:
+        """
+        Get the first textures, by texture set name.
+
+        :param int count: The number of textures.
+        :return dict: The texture files by texture set name.
+        """
+        texture_sets: dict = {}
+        for file in self.files[:count]:
+            set_name = os.path.basename(file).split("_", 1)[0]
+            texture_sets.setdefault(set_name, []).append(file)
+        return texture_sets
+
+    def close(self) -> None:
+        """Remove the texture files."""
+        self._folder.cleanup()
+
+
+def get_import_command(texture_sets: dict, textures: Textures) -> tuple:
+    """
+    Serialize an import like a send does.
+
+    :param dict texture_sets: The texture files by texture set name.
+    :param Textures textures: The texture files and their hashes.
+    :return tuple: The import arguments and the python statement calling
+                   the import in Unreal.
+    """
+    arguments = get_import_arguments(
+        texture_sets, "/Game/Benchmark", textures.cache, "benchmark.spp"
+    )
+    arguments["materials"] = get_material_arguments(
+        texture_sets, "/Game/Benchmark", "/Game/Materials/M_Benchmark"
+    )
+    return arguments, _REMOTE_MODULE_CALL_COMMAND.format(
+        name=repr(REMOTE_MODULE_NAME),
+        function="import_texture_sets",
+        arguments=repr(json.dumps(arguments, separators=(",", ":"))),
+    )
+
+
+def wait_for_node_count(remote_exec: RemoteExecution, count: int, timeout: float):
+    """
+    Wait until a number of nodes answered discovery.
+
+    :param RemoteExecution remote_exec: The started discovery session.
+    :param int count: The number of nodes to wait for.
+    :param float timeout: Number of seconds to wait at most.
+    :return bool: True if the nodes were found in time.
+    """
+    deadline = time.perf_counter() + timeout
+    while len(remote_exec.remote_nodes) < count:
+        if time.perf_counter() > deadline:
+            return False
+        time.sleep(0.0005)
+    return True
+
+
+def bench_discovery(node_counts: list, runs: int) -> dict:
+    """Measure the time from the start of a session to finding every node."""
+    results = {}
+    for count in node_counts:
+        with contextlib.ExitStack() as stack:
+            for index in range(count):
+                stack.enter_context(StandinNode(project_name="Node{0}".format(index)))
+
+            def discover():
+                remote_exec = RemoteExecution()
+                remote_exec.start()
+                try:
+                    if not wait_for_node_count(remote_exec, count, 5):
+                        raise RuntimeError("{0} nodes not found".format(count))
+                finally:
+                    remote_exec.stop()
+
+            median_ms, min_ms, _ = measure(discover, runs)
+        results[str(count)] = {"median_ms": median_ms, "min_ms": min_ms}
+    return results
+
+
+def bench_connect(runs: int) -> dict:
+    """Measure the opening of a command connection to a found node."""
+    with StandinNode() as node:
+        remote_exec = RemoteExecution()
+        remote_exec.start()
+        try:
+            remote_exec.wait_for_nodes(5)
+
+            def connect():
+                remote_exec.open_command_connection(node.node_id, exclusive=False)
+                remote_exec.close_command_connection(node.node_id)
+
+            median_ms, min_ms, _ = measure(connect, runs)
+        finally:
+            remote_exec.stop()
+    return {"median_ms": median_ms, "min_ms": min_ms}
+
+
+def bench_serialize(textures: Textures, texture_counts: list, runs: int) -> dict:
+    """
+    Measure the serialization of an import, by number of textures.
+
+    ``arguments`` builds the import arguments, ``command`` the statement
+    calling the import and ``message`` the bytes sent to Unreal. ``indent``
+    wraps a script of one statement per texture like ``run_commands`` does.
+    """
+    results = {}
+    for count in texture_counts:
+        texture_sets = textures.texture_sets(count)
+        arguments_ms, _, arguments = measure(
+            lambda: get_import_arguments(
+                texture_sets, "/Game/Benchmark", textures.cache, "benchmark.spp"
+            ),
+            runs,
+        )
+        command_ms, _, (_, command) = measure(
+            lambda: get_import_command(texture_sets, textures), runs
+        )
+        message_ms, _, message = measure(
+            lambda: _RemoteExecutionMessage(
+                _TYPE_COMMAND,
+                "benchmark",
+                "standin",
+                {
+                    "command": command,
+                    "unattended": False,
+                    "exec_mode": MODE_EVAL_STATEMENT,
+                },
+            ).to_json_bytes(),
+            runs,
+        )
+        script = [
+            "print({0!r}, {1!r})".format(texture["file"], texture["hash"])
+            for texture_list in arguments["texture_sets"].values()
+            for texture in texture_list
+        ]
+        indent_ms, _, _ = measure(
+            lambda: RemoteUECommand._add_indent(None, script, "\t"), runs
+        )
+        results[str(count)] = {
+            "arguments_ms": arguments_ms,
+            "command_ms": command_ms,
+            "message_ms": message_ms,
+            "indent_ms": indent_ms,
+            "message_bytes": len(message),
+        }
+    return results
+
+
+def bench_encoding(textures: Textures, texture_counts: list, runs: int) -> dict:
+    """
+    Measure the zlib encoding of an import call, by number of textures.
+
+    ``encode`` compresses the message sent to Unreal and ``decode`` reads it
+    back, ``plain_decode`` reads the plain JSON message.
+    """
+    results = {}
+    for count in texture_counts:
+        _, command = get_import_command(textures.texture_sets(count), textures)
+        message = _RemoteExecutionMessage(
+            _TYPE_COMMAND,
+            "benchmark",
+            "standin",
+            {"command": command, "unattended": False, "exec_mode": MODE_EVAL_STATEMENT},
+        ).to_json_bytes()
+        encode_ms, _, frame = measure(
+            lambda: _encode_json_bytes(message, ENCODING_ZLIB, 0), runs
+        )
+        decode_ms, _, _ = measure(
+            lambda: _decode_json_buffer(bytearray(frame), len(message)), runs
+        )
+        plain_decode_ms, _, _ = measure(
+            lambda: _decode_json_buffer(bytearray(message), len(message)), runs
+        )
+        results[str(count)] = {
+            "json_bytes": len(message),
+            "zlib_bytes": len(frame),
+            "encode_ms": encode_ms,
+            "decode_ms": decode_ms,
+            "plain_decode_ms": plain_decode_ms,
+        }
+    return results
+
+
+def bench_send(
+    textures: Textures, texture_counts: list, runs: int, encodings: tuple = ()
+) -> dict:
+    """
+    Measure an import call to a node, by number of textures.
+
+    ``transfer`` sends the serialized call and receives the response,
+    ``parse`` decodes the response and ``call`` is the whole call, as
+    made by a send. ``wire_bytes`` are sent and received by a call.
+    """
+    results = {}
+    with StandinNode(execute=True, encodings=encodings) as node:
+        remote_ue = RemoteUECommand()
+        # the stand-in runs on this machine
+        remote_ue.compress_local_messages = True
+        try:
+            remote_ue.remote_exec.wait_for_nodes(5)
+            standin = remote_ue.available_nodes()[0]
+            for count in texture_counts:
+                arguments, command = get_import_command(
+                    textures.texture_sets(count), textures
+                )
+                transfer_ms, _, response = measure(
+                    lambda: remote_ue.run_python(
+                        command, MODE_EVAL_STATEMENT, unattended=False, node=standin
+                    ),
+                    runs,
+                )
+                parse_ms, _, imported = measure(
+                    lambda: json.loads(ast.literal_eval(response["result"])), runs
+                )
+                if len(imported["assets"]) != count:
+                    raise RuntimeError("{0} assets imported".format(count))
+                trace.TRACER.clear()
+                call_ms, _, _ = measure(
+                    lambda: remote_ue.call_remote(
+                        "import_texture_sets", arguments, standin
+                    ),
+                    runs,
+                )
+                results[str(count)] = {
+                    "transfer_ms": transfer_ms,
+                    "parse_ms": parse_ms,
+                    "call_ms": call_ms,
+                    "response_bytes": len(response["result"]),
+                    "wire_bytes": wire_bytes(runs),
+                }
+        finally:
+            remote_ue.stop()
+    if len(node.commands) < len(texture_counts) * runs * 2:
+        raise RuntimeError("the stand-in node missed commands")
+    return results
+
+
+def bench_payload(payload_sizes: list, runs: int, encodings: tuple = ()) -> dict:
+    """
+    Measure the round-trip of a command, by payload size.
+
+    The command and its result both hold the given number of bytes, of a
+    single repeated character, so they compress as well as can be.
+    """
+    results = {}
+    with StandinNode(encodings=encodings) as node:
+        remote_exec = RemoteExecution()
+        remote_exec.start()
+        try:
+            remote_exec.wait_for_nodes(5)
+            remote_exec.open_command_connection(node.node_id, exclusive=False)
+            for size in payload_sizes:
+                node.result_size = size
+                command = repr("x" * size)
+                trace.TRACER.clear()
+                median_ms, min_ms, _ = measure(
+                    lambda: remote_exec.run_command(
+                        command,
+                        exec_mode=MODE_EVAL_STATEMENT,
+                        remote_node_id=node.node_id,
+                    ),
+                    runs,
+                )
+                results[str(size)] = {
+                    "median_ms": median_ms,
+                    "min_ms": min_ms,
+                    "mb_per_second": 2 * size / 1000 / median_ms,
+                    "wire_bytes": wire_bytes(runs),
+                }
+        finally:
+            remote_exec.stop()
+    return results
+
+
+def bench_nodes(
+    textures: Textures, node_counts: list, texture_count: int, import_seconds: float
+) -> dict:
+    """
+    Measure a send to every node, by number of nodes.
+
+    Each node takes ``import_seconds`` to import, as Unreal does, so a send
+    to several nodes lasts as long as a send to one if they run
+    concurrently.
+    """
+    results = {}
+    arguments, _ = get_import_command(textures.texture_sets(texture_count), textures)
+    for count in node_counts:
+        with contextlib.ExitStack() as stack:
+            for index in range(count):
+                stack.enter_context(
+                    StandinNode(
+                        project_name="Node{0}".format(index),
+                        execute=True,
+                        command_delay=import_seconds,
+                    )
+                )
+            remote_ue = RemoteUECommand()
+            remote_ue.send_to_all_nodes = True
+            try:
+                if not wait_for_node_count(remote_ue.remote_exec, count, 5):
+                    raise RuntimeError("{0} nodes not found".format(count))
+                nodes = remote_ue.target_nodes()
+
+                def send():
+                    for node_result in remote_ue.run_on_nodes(
+                        lambda node: remote_ue.call_remote(
+                            "import_texture_sets", arguments, node
+                        ),
+                        nodes,
+                    ):
+                        if node_result["error"] is not None:
+                            raise node_result["error"]
+
+                # the first send opens the connections
+                first_ms, _, _ = measure(send, 1)
+                median_ms, min_ms, _ = measure(send, 3)
+            finally:
+                remote_ue.stop()
+        results[str(count)] = {
+            "first_ms": first_ms,
+            "median_ms": median_ms,
+            "min_ms": min_ms,
+        }
+    return results
+
+
+def get_metadata(args: argparse.Namespace) -> dict:
+    """Describe the run, so results of different commits can be told apart."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "arguments": vars(args),
+    }
+
+
+def flatten(results: dict, prefix: str = "") -> dict:
+    """Get the numbers of nested results by their dotted path."""
+    values = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            values.update(flatten(value, "{0}{1}.".format(prefix, key)))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[prefix + key] = value
+    return values
+
+
+def compare(baseline: dict, results: dict) -> str:
+    """
+    Compare results with the ones of a previous run.
+
+    :param dict baseline: The results of the previous run.
+    :param dict results: The results of this run.
+    :return str: A line per number both runs measured, with its ratio.
+    """
+    old = flatten({k: v for k, v in baseline.items() if k != "metadata"})
+    new = flatten({k: v for k, v in results.items() if k != "metadata"})
+    lines = [
+        "{0:<40} {1:>12} {2:>12} {3:>8}".format(
+            "",
+            str(baseline["metadata"]["commit"]),
+            str(results["metadata"]["commit"]),
+            "",
+        )
+    ]
+    for path, value in new.items():
+        if path in old:
+            lines.append(
+                "{0:<40} {1:>12.3f} {2:>12.3f} {3:>7.2f}x".format(
+                    path, old[path], value, value / old[path] if old[path] else 0.0
+                )
+            )
+    return "\n".join(lines)
+
+
+def main() -> None:
+    """Run the benchmarks and print or write the results as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument(
+        "--textures", type=int, nargs="+", default=[1, 10, 100, 500, 2000]
+    )
+    parser.add_argument(
+        "--payloads", type=int, nargs="+", default=[1024, 65536, 1048576, 16777216]
+    )
+    parser.add_argument("--nodes", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--node-textures", type=int, default=100)
+    parser.add_argument("--import-seconds", type=float, default=0.05)
+    parser.add_argument("--output", help="file to write the results to")
+    parser.add_argument("--compare", help="results of a previous run")
+    args = parser.parse_args()
+
+    install_remote_module_mock()
+    textures = Textures(max(args.textures + [args.node_textures]))
+    try:
+        results = {
+            "metadata": get_metadata(args),
+            "discovery": bench_discovery(args.nodes, args.runs),
+            "connect": bench_connect(args.runs),
+            "serialize": bench_serialize(textures, args.textures, args.runs),
+            "encoding": bench_encoding(textures, args.textures, args.runs),
+            "send": bench_send(textures, args.textures, args.runs),
+            "send_zlib": bench_send(
+                textures, args.textures, args.runs, (ENCODING_ZLIB,)
+            ),
+            "payload": bench_payload(args.payloads, args.runs),
+            "payload_zlib": bench_payload(args.payloads, args.runs, (ENCODING_ZLIB,)),
+            "nodes": bench_nodes(
+                textures, args.nodes, args.node_textures, args.import_seconds
+            ),
+        }
+    finally:
+        textures.close()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as file:
+            print(compare(json.load(file), results))
+
+
+if __name__ == "__main__":
+    main()
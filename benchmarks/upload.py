@@ -0,0 +1,146 @@
+"""
+Benchmark the upload of textures to an Unreal Editor on another machine.
+
+Uploads texture files to a stand-in node which runs the upload commands as
+Unreal does, writing them in the Saved folder of a temporary project. The
+stand-in is the receiver of the upload, it runs in this process and reaches
+the plugin through the loopback, so the numbers are the ones of the upload
+protocol, not of a network.
+
+Each step checks what the staging folder holds once done: a first upload,
+a second one sending nothing, one resuming a partial file, and one of a new
+version of a file replacing the previous version. Results are printed as
+JSON, the exit code is 1 if a check failed.
+
+usage: python benchmarks/upload.py [--files 4] [--size 8]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from substance_painter2ue.sp2ue_cache import file_hash  # noqa: E402
+from substance_painter2ue.unreal import ChunkedUploader, RemoteUECommand  # noqa: E402
+from substance_painter2ue.unreal.standin import StandinNode  # noqa: E402
+
+STAGING = "Benchmark"
+
+
+def fake_unreal(saved_dir: str) -> types.SimpleNamespace:
+    """Get the part of the ``unreal`` module the upload commands use."""
+    return types.SimpleNamespace(
+        Paths=types.SimpleNamespace(
+            project_saved_dir=lambda: saved_dir,
+            convert_relative_path_to_full=lambda path: path,
+        )
+    )
+
+
+def write_texture(path: str, size: int) -> None:
+    """Write a texture file, half random and half repeated like a PNG."""
+    with open(path, "wb") as file:
+        file.write(os.urandom(size // 2))
+        file.write(b"\x00" * (size - size // 2))
+
+
+def staged_files(root: str) -> list:
+    """Get the files of the staging folder, relative to it."""
+    return sorted(
+        os.path.relpath(os.path.join(folder, name), root).replace(os.sep, "/")
+        for folder, _, names in os.walk(root)
+        for name in names
+    )
+
+
+def upload(uploader: ChunkedUploader, textures: list) -> dict:
+    """Upload the textures and describe the upload."""
+    remote_paths = uploader.upload(
+        {texture: file_hash(texture) for texture in textures}, STAGING
+    )
+    return {
+        "seconds": uploader.seconds,
+        "file_mb": uploader.file_bytes / 1e6,
+        "wire_mb": uploader.wire_bytes / 1e6,
+        "mb_per_second": uploader.throughput() / 1e6,
+        "received": all(
+            file_hash(remote_paths[texture]) == file_hash(texture)
+            for texture in textures
+        ),
+    }
+
+
+def bench_upload(file_count: int, file_size: int) -> dict:
+    """Run each step of the upload against a stand-in receiver."""
+    local_dir = tempfile.TemporaryDirectory()
+    saved_dir = tempfile.TemporaryDirectory()
+    with local_dir, saved_dir:
+        local_dir, saved_dir = local_dir.name, saved_dir.name
+        textures = [
+            os.path.join(local_dir, "Set_{0}.png".format(index))
+            for index in range(file_count)
+        ]
+        for texture in textures:
+            write_texture(texture, file_size)
+        root = os.path.join(saved_dir, "sp2ue", STAGING)
+        node = StandinNode(execute=True, namespace={"unreal": fake_unreal(saved_dir)})
+        with node:
+            remote_ue = RemoteUECommand()
+            try:
+                if not remote_ue.remote_exec.wait_for_nodes(5):
+                    raise RuntimeError("the stand-in node was not found")
+                uploader = ChunkedUploader(remote_ue)
+                results = {"first": upload(uploader, textures)}
+
+                results["again"] = upload(uploader, textures)
+                results["again"]["nothing_sent"] = uploader.file_bytes == 0
+
+                # leave half of the first file as a partial upload
+                remote_file = os.path.join(
+                    root, file_hash(textures[0]), os.path.basename(textures[0])
+                )
+                os.replace(remote_file, remote_file + ".part")
+                with open(remote_file + ".part", "r+b") as file:
+                    file.truncate(file_size // 2)
+                results["resume"] = upload(uploader, textures)
+                # the upload resumes from the last complete chunk
+                resumed = file_size // 2 - file_size // 2 % uploader.chunk_size
+                results["resume"]["rest_sent"] = (
+                    uploader.file_bytes == file_size - resumed
+                )
+
+                write_texture(textures[0], file_size)
+                results["new_version"] = upload(uploader, textures)
+                results["new_version"]["old_version_removed"] = staged_files(
+                    root
+                ) == sorted(
+                    "{0}/{1}".format(file_hash(texture), os.path.basename(texture))
+                    for texture in textures
+                )
+            finally:
+                remote_ue.stop()
+    return results
+
+
+def main() -> int:
+    """Run the benchmark and print the results as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=4)
+    parser.add_argument("--size", type=float, default=8.0, help="MB per file")
+    args = parser.parse_args()
+    results = bench_upload(args.files, int(args.size * 1e6))
+    print(json.dumps(results, indent=2))
+    checks = [
+        value
+        for step in results.values()
+        for value in step.values()
+        if isinstance(value, bool)
+    ]
+    return 0 if all(checks) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,15 +1,28 @@
 """Module to export texture to Unreal Engine."""
+import os
 
-from .sp2ue import Painter2UE
+from .batch import BATCH_JOB_ENV
 
 # reference to the plugin instance
 PAINTER2UE_PLUGIN = None
 
 
 def start_plugin() -> None:
-    """Initialize the plugin by substance painter."""
+    """Initialize the plugin by substance painter.
+
+    Painter is only imported here, so the batch command can import this
+    package outside of Painter. A Painter started by the batch command runs
+    the batch worker instead of the interactive plugin.
+    """
     global PAINTER2UE_PLUGIN
-    PAINTER2UE_PLUGIN = Painter2UE()
+    if os.environ.get(BATCH_JOB_ENV):
+        from .sp2ue_batch import BatchWorker
+
+        PAINTER2UE_PLUGIN = BatchWorker(os.environ[BATCH_JOB_ENV])
+    else:
+        from .sp2ue import Painter2UE
+
+        PAINTER2UE_PLUGIN = Painter2UE()
 
 
 def close_plugin() -> None:
@@ -0,0 +1,6 @@
+"""Send Substance Painter projects to Unreal Engine in batch, see batch.py."""
+import sys
+
+from .batch import main
+
+sys.exit(main())
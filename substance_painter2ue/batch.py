@@ -0,0 +1,453 @@
+"""
+Send Substance Painter projects to Unreal Engine in batch.
+
+A pool of Painter processes, each running the plugin in batch mode, opens
+and exports the projects in parallel, while their textures are imported into
+Unreal one project at a time. A JSON summary of each project is printed and
+the exit code is 1 if any project failed.
+
+usage: python -m substance_painter2ue --painter PATH [--workers 2]
+                                      [--manifest FILE] [project.spp ...]
+
+This module does not depend on Substance Painter, the batch mode of the
+plugin is in sp2ue_batch.py.
+"""
+import argparse
+import json
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from .unreal import RemoteUECommand, get_remote_execution_config
+
+# environment variable holding the job file of a Painter process, which runs
+# the plugin in batch mode when it is set
+BATCH_JOB_ENV = "SP2UE_BATCH_JOB"
+JOB_FILE_NAME = "job.json"
+RESULT_FILE_NAME = "result.json"
+# number of seconds between two reads of a result file
+POLL_INTERVAL = 0.5
+# number of seconds a Painter process has to open and export a project
+DEFAULT_TIMEOUT = 1800.0
+# number of seconds to wait for an Unreal Editor to answer
+DISCOVERY_TIMEOUT = 10.0
+
+
+def read_json(path: str):
+    """Return the content of a JSON file, None if it is missing or partial.
+
+    :param path: path of the file
+    :type path: str
+    :return: the decoded content
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def write_json(path: str, data) -> None:
+    """Write a JSON file at once, so it is never read half written.
+
+    :param path: path of the file
+    :type path: str
+    :param data: the content to encode
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(data, file)
+    os.replace(tmp_path, path)
+
+
+def load_jobs(projects: list, manifest: str, defaults: dict, work_dir: str) -> list:
+    """Return the job of each project to send.
+
+    :param projects: .spp files given on the command line
+    :type projects: list
+    :param manifest: JSON file listing .spp files, or objects holding the
+                     ``project`` file and overriding any of the ``defaults``
+    :type manifest: str
+    :param defaults: the ``unreal_path``, ``preset``, ``profile`` and
+                     ``parent_material`` of the projects, ``{asset_name}`` in
+                     the Unreal path is replaced by the project name
+    :type defaults: dict
+    :param work_dir: folder holding the exported textures
+    :type work_dir: str
+    :return: the jobs, ready to be written to the job files
+    :rtype: list
+    """
+    entries: list = list(projects)
+    if manifest:
+        with open(manifest, "r", encoding="utf-8") as file:
+            entries.extend(json.load(file))
+    jobs: list = []
+    for idx, entry in enumerate(entries):
+        if isinstance(entry, str):
+            entry = {"project": entry}
+        job = dict(defaults, **entry)
+        job["id"] = idx
+        job["project"] = os.path.abspath(job["project"])
+        asset_name = os.path.splitext(os.path.basename(job["project"]))[0]
+        job["unreal_path"] = job["unreal_path"].format(asset_name=asset_name)
+        job["export_path"] = os.path.join(
+            work_dir, "export", "{0}_{1}".format(idx, asset_name)
+        )
+        jobs.append(job)
+    return jobs
+
+
+def failed_export(job: dict, start: float, error: str) -> dict:
+    """Return the result of a project which could not be exported.
+
+    :param job: the job of the project
+    :type job: dict
+    :param start: ``time.perf_counter`` when the export started
+    :type start: float
+    :param error: why the export failed
+    :type error: str
+    :return: the result, like the ones written by Painter
+    :rtype: dict
+    """
+    return {
+        "id": job["id"],
+        "project": job["project"],
+        "seconds": time.perf_counter() - start,
+        "error": error,
+        "arguments": None,
+    }
+
+
+class PainterWorker(threading.Thread):
+    """Run a Painter process and give it the projects to export.
+
+    A Painter process which crashes or does not export a project in time is
+    killed, the project is reported as failed and a new process is started
+    for the next one.
+    """
+
+    def __init__(
+        self,
+        index: int,
+        painter_command: list,
+        work_dir: str,
+        jobs: queue.Queue,
+        results: queue.Queue,
+        timeout: float = DEFAULT_TIMEOUT,
+    ) -> None:
+        """Init the worker, its Painter process starts with its first job.
+
+        :param index: index of the worker, naming its folder
+        :type index: int
+        :param painter_command: the Painter executable and its arguments
+        :type painter_command: list
+        :param work_dir: folder holding the folder of each worker
+        :type work_dir: str
+        :param jobs: the jobs left to export
+        :type jobs: queue.Queue
+        :param results: where the result of each export is put
+        :type results: queue.Queue
+        :param timeout: number of seconds to open and export a project
+        :type timeout: float
+        """
+        super().__init__(name="sp2ue-batch-{0}".format(index), daemon=True)
+        self.painter_command = painter_command
+        self.jobs = jobs
+        self.results = results
+        self.timeout = timeout
+        worker_dir = os.path.join(work_dir, "worker_{0}".format(index))
+        os.makedirs(worker_dir, exist_ok=True)
+        self.job_path = os.path.join(worker_dir, JOB_FILE_NAME)
+        self.result_path = os.path.join(worker_dir, RESULT_FILE_NAME)
+        self.process: subprocess.Popen = None
+
+    def run(self) -> None:
+        """Export jobs until none is left, putting a result for each of them."""
+        try:
+            while True:
+                try:
+                    job = self.jobs.get_nowait()
+                except queue.Empty:
+                    return
+                start = time.perf_counter()
+                try:
+                    result = self._export(job)
+                except Exception as error:
+                    # ie the Painter executable is missing, the next jobs
+                    # fail the same way rather than hang the batch
+                    result = failed_export(
+                        job, start, "{0}: {1}".format(type(error).__name__, error)
+                    )
+                self.results.put(result)
+        finally:
+            self._stop_process()
+
+    def _export(self, job: dict) -> dict:
+        """Have the Painter process export a project.
+
+        :param job: the job of the project
+        :type job: dict
+        :return: the result written by Painter, holding the import
+                 ``arguments``, or the ``error`` message
+        :rtype: dict
+        """
+        start = time.perf_counter()
+        if self.process is None or self.process.poll() is not None:
+            env = dict(os.environ)
+            env[BATCH_JOB_ENV] = self.job_path
+            self.process = subprocess.Popen(self.painter_command, env=env)
+        os.makedirs(job["export_path"], exist_ok=True)
+        write_json(self.job_path, job)
+        error = "timed out after {0:.0f}s".format(self.timeout)
+        while time.perf_counter() - start < self.timeout:
+            result = read_json(self.result_path)
+            if result is not None and result["id"] == job["id"]:
+                return result
+            if self.process.poll() is not None:
+                error = "Painter exited with code {0}".format(self.process.returncode)
+                break
+            time.sleep(POLL_INTERVAL)
+        self._stop_process()
+        return failed_export(job, start, error)
+
+    def _stop_process(self) -> None:
+        """Stop the Painter process."""
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(30)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.process = None
+
+
+def import_export(remote_ue: RemoteUECommand, export: dict) -> dict:
+    """Import the textures of an exported project into the target editors.
+
+    :param remote_ue: the connection to Unreal
+    :type remote_ue: RemoteUECommand
+    :param export: the result of the export, see ``PainterWorker._export``
+    :type export: dict
+    :return: the summary of the project
+    :rtype: dict
+    """
+    summary: dict = {
+        "project": export["project"],
+        "export_seconds": export["seconds"],
+        "import_seconds": 0.0,
+        "error": export["error"],
+        "nodes": [],
+    }
+    if export["error"]:
+        return summary
+    nodes: list = remote_ue.target_nodes(wait=True)
+    if not nodes:
+        summary["error"] = "no Unreal Editor found"
+        return summary
+
+    def run(node: dict):
+        if not remote_ue.is_node_local(node):
+            raise RuntimeError("the batch only imports into a local Unreal Editor")
+        return remote_ue.call_remote("import_texture_sets", export["arguments"], node)
+
+    start = time.perf_counter()
+    for node_result in remote_ue.run_on_nodes(run, nodes):
+        imported = node_result["result"] or {"assets": [], "materials": []}
+        summary["nodes"].append(
+            {
+                "node": node_result["node"].get("node_id"),
+                "error": str(node_result["error"]) if node_result["error"] else None,
+                "imported": sum(
+                    1
+                    for asset in imported["assets"]
+                    if not asset["error"] and not asset.get("skipped")
+                ),
+                "skipped": sum(
+                    1 for asset in imported["assets"] if asset.get("skipped")
+                ),
+                "failed": [
+                    asset["file"] for asset in imported["assets"] if asset["error"]
+                ]
+                + [
+                    material["texture_set"]
+                    for material in imported["materials"]
+                    if material["error"]
+                ],
+            }
+        )
+    summary["import_seconds"] = time.perf_counter() - start
+    return summary
+
+
+def run_batch(
+    jobs: list,
+    painter_command: list,
+    work_dir: str,
+    workers: int = 2,
+    timeout: float = DEFAULT_TIMEOUT,
+    remote_ue: RemoteUECommand = None,
+    keep_exports: bool = False,
+) -> list:
+    """Export the projects with a pool of Painter processes and import them.
+
+    Imports run from this thread only, so a single project is imported at a
+    time while the next ones export. A project which cannot be exported, ie
+    as Painter does not start, is reported with its error.
+
+    :param jobs: the jobs of the projects, see ``load_jobs``
+    :type jobs: list
+    :param painter_command: the Painter executable and its arguments
+    :type painter_command: list
+    :param work_dir: folder holding the exported textures and the job files
+    :type work_dir: str
+    :param workers: number of Painter processes
+    :type workers: int
+    :param timeout: number of seconds to open and export a project
+    :type timeout: float
+    :param remote_ue: the connection to Unreal
+    :type remote_ue: RemoteUECommand
+    :param keep_exports: keep the exported textures once imported
+    :type keep_exports: bool
+    :return: the summary of each project, in the order they were exported
+    :rtype: list
+    """
+    pending: queue.Queue = queue.Queue()
+    for job in jobs:
+        pending.put(job)
+    exports: queue.Queue = queue.Queue()
+    pool = [
+        PainterWorker(idx, painter_command, work_dir, pending, exports, timeout)
+        for idx in range(max(1, min(workers, len(jobs))))
+    ]
+    for worker in pool:
+        worker.start()
+    jobs_by_id: dict = {job["id"]: job for job in jobs}
+    export_paths: dict = {job["id"]: job["export_path"] for job in jobs}
+    start = time.perf_counter()
+    summaries: list = []
+    while jobs_by_id:
+        # checked before reading, so the results put by a worker before it
+        # stopped are all read
+        alive = any(worker.is_alive() for worker in pool)
+        try:
+            export = exports.get(timeout=POLL_INTERVAL if alive else 0)
+        except queue.Empty:
+            if alive:
+                continue
+            # the workers stopped without a result for this project
+            export = failed_export(
+                jobs_by_id[next(iter(jobs_by_id))], start, "Painter worker stopped"
+            )
+        jobs_by_id.pop(export["id"], None)
+        summary = import_export(remote_ue, export)
+        summaries.append(summary)
+        print(
+            "{0}: {1}".format(summary["project"], summary["error"] or "done"),
+            file=sys.stderr,
+        )
+        if not keep_exports:
+            shutil.rmtree(export_paths[export["id"]], ignore_errors=True)
+    for worker in pool:
+        worker.join()
+    return summaries
+
+
+def main() -> int:
+    """Run the batch from the command line.
+
+    :return: the exit code, 1 if any project failed
+    :rtype: int
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m substance_painter2ue",
+        description=__doc__.strip().splitlines()[0],
+    )
+    parser.add_argument("projects", nargs="*", help=".spp files to send")
+    parser.add_argument(
+        "--manifest",
+        help="JSON list of .spp files, or of objects holding the 'project' file"
+        " and any of 'unreal_path', 'preset', 'profile' and 'parent_material'",
+    )
+    parser.add_argument(
+        "--painter",
+        default=os.environ.get("SP2UE_PAINTER_PATH"),
+        help="Painter executable, defaults to SP2UE_PAINTER_PATH",
+    )
+    parser.add_argument(
+        "--painter-arg",
+        action="append",
+        default=[],
+        help="argument given to Painter, can be repeated",
+    )
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT)
+    parser.add_argument(
+        "--unreal-path",
+        default=os.environ.get("SP2UE_UE_CONTENT_PATH", "/Game/{asset_name}/"),
+    )
+    parser.add_argument(
+        "--preset",
+        default=os.environ.get("SP2UE_PRESET", "Unreal Engine 4 (Packed)"),
+    )
+    parser.add_argument(
+        "--profile", default=os.environ.get("SP2UE_EXPORT_PROFILE", "final")
+    )
+    parser.add_argument(
+        "--parent-material", default=os.environ.get("SP2UE_PARENT_MATERIAL", "")
+    )
+    parser.add_argument("--all-nodes", action="store_true")
+    parser.add_argument("--work-dir", help="defaults to a temporary folder")
+    parser.add_argument("--keep-exports", action="store_true")
+    args = parser.parse_args()
+    if not args.painter:
+        parser.error("the Painter executable is required (--painter)")
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="sp2ue_batch_")
+    remote_ue = RemoteUECommand(get_remote_execution_config())
+    remote_ue.send_to_all_nodes = args.all_nodes
+    try:
+        jobs = load_jobs(
+            args.projects,
+            args.manifest,
+            {
+                "unreal_path": args.unreal_path,
+                "preset": args.preset,
+                "profile": args.profile,
+                "parent_material": args.parent_material,
+            },
+            work_dir,
+        )
+        if not remote_ue.remote_exec.wait_for_nodes(DISCOVERY_TIMEOUT):
+            print("No Unreal Editor found.", file=sys.stderr)
+            return 1
+        start = time.perf_counter()
+        summaries = run_batch(
+            jobs,
+            [args.painter] + args.painter_arg,
+            work_dir,
+            args.workers,
+            args.timeout,
+            remote_ue,
+            args.keep_exports,
+        )
+    finally:
+        remote_ue.stop()
+        # the temporary folder only holds the job files and the exports
+        if not args.work_dir and not args.keep_exports:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    print(
+        json.dumps(
+            {"seconds": time.perf_counter() - start, "projects": summaries}, indent=2
+        )
+    )
+    failed = any(
+        summary["error"]
+        or any(node["error"] or node["failed"] for node in summary["nodes"])
+        for summary in summaries
+    )
+    return 1 if failed else 0
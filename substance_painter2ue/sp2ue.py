@@ -1,18 +1,56 @@
 """Substance Painter To Unreal Engine Plugin."""
 import os
+import re
+import shutil
 import tempfile
+import time
 
 import substance_painter.event as sp_event
 import substance_painter.export as sp_export
 import substance_painter.logging as sp_logging
 import substance_painter.project as sp_project
-import substance_painter.resource as sp_resource
 import substance_painter.textureset as sp_textureset
 import substance_painter.ui as sp_ui
 from PySide2.QtCore import QSettings, Slot
 
+from .sp2ue_cache import TextureCache
+from .sp2ue_livelink import DEFAULT_DEBOUNCE_MS, LiveLink
+from .sp2ue_pipeline import SendPipeline
+from .sp2ue_presets import DEFAULT_PRESET, PresetIndex
+from .sp2ue_tracker import ExportTracker
 from .sp2ue_ui import Painter2UEAction, Painter2UEWidget
-from .unreal import RemoteUECommand
+from .unreal import (
+    ChunkedUploader,
+    RemoteExecutionConfig,
+    RemoteUECommand,
+    get_remote_execution_config,
+    trace,
+)
+
+# export parameters overriding the preset, by export profile: a preview skips
+# the padding and exports 8 bits PNG at half the resolution, a quarter of the
+# pixels, a final export keeps the preset and the texture set resolution
+EXPORT_PROFILES = {
+    "final": {"paddingAlgorithm": "infinite"},
+    "preview": {
+        "paddingAlgorithm": "passthrough",
+        "fileFormat": "png",
+        "bitDepth": "8",
+    },
+}
+DEFAULT_EXPORT_PROFILE = "final"
+# resolution of a preview export, as a power of 2 below the texture set one
+PREVIEW_SIZE_LOG2_REDUCTION = 1
+# smallest resolution of a preview export, as a power of 2
+PREVIEW_MIN_SIZE_LOG2 = 7
+# parts of the file name of an output map of an export preset: a variable
+# (ie $textureSet), the start or end of an optional part, or literal text
+OUTPUT_MAP_TOKEN = re.compile(r"\$[A-Za-z]+|[()]|[^$()]+|\$")
+# separators trimmed around the map name in the file name of an output map
+OUTPUT_MAP_SEPARATORS = "_-. "
+# characters Unreal replaces by _ in the asset name of an imported file, ie
+# the . of an UDIM tile
+INVALID_NAME_CHARACTERS = re.compile(r"[^\w\-]")
 
 
 class Painter2UE:
@@ -26,117 +64,501 @@ class Painter2UE:
         # create action button in 'Send To' submenu
         self.export_action = Painter2UEAction(self.send2ue)
         # create RemoteUECommand instance
-        self.remote_ue = RemoteUECommand()
+        self.remote_ue = RemoteUECommand(self.get_remote_execution_config())
+        self.remote_ue.send_to_all_nodes = self.settings.value(
+            "send_to_all_nodes", False, type=bool
+        )
+        # export presets of the shelves, searched in the background
+        self.preset_index = PresetIndex()
+        # cache of the textures already imported into Unreal
+        self.texture_cache: TextureCache = None
+        # last export of each stack, reused until the stack changes
+        self.export_tracker = ExportTracker()
+        # run the sends in the background
+        self.pipeline = SendPipeline(self._export_texture_sets, self._send_texture_sets)
+        self.pipeline.finished.connect(self.on_send_finished)
+        self.pipeline.failed.connect(self.on_send_failed)
+        self.pipeline.cancelled.connect(self.on_send_cancelled)
+        # results of the last send, see _send_texture_sets
+        self.last_send_results: list = []
+        # a manual send exports the default stacks, the live link only the
+        # changed ones
+        self._manual_send_requested = False
+        self.live_link = LiveLink(self.send_changes)
+        self.live_link.set_debounce(
+            self.settings.value("live_link_debounce", DEFAULT_DEBOUNCE_MS, type=int)
+        )
+        self.live_link.set_enabled(self.settings.value("live_link", False, type=bool))
+        # register event callback
+        sp_event.DISPATCHER.connect(sp_event.ProjectOpened, self.on_project_opened)
+        sp_event.DISPATCHER.connect(
+            sp_event.ProjectAboutToClose, self.on_project_about_to_close
+        )
         # create UI
         self.window = Painter2UEWidget(self, self.remote_ue)
         sp_ui.add_dock_widget(self.window)
-        # export preset
-        self.selected_preset = "Unreal Engine 4 (Packed)"
-        # register event callback
-        sp_event.DISPATCHER.connect(sp_event.ProjectOpened, self.on_project_opened)
 
     @Slot()
     def send2ue(self) -> None:
-        """Export textures and Send them to Unreal Engine."""
+        """Export textures and Send them to Unreal Engine.
+
+        The send runs in the background, a send requested while another one
+        is running is queued.
+        """
         # Verify if a project is open before trying to export something
         if not sp_project.is_open():
             return
+        self._manual_send_requested = True
+        self.pipeline.request()
+
+    @Slot()
+    def send_changes(self) -> None:
+        """Send the stacks changed since the last live link send."""
+        if not sp_project.is_open():
+            return
+        self.pipeline.request()
+
+    def _export_texture_sets(self, pipeline: SendPipeline):
+        """Export the textures, from the main thread.
+
+        When every texture set is exported, each stack is exported on its
+        own, so it can be imported into Unreal while the next one exports.
+
+        :param pipeline: the pipeline running this send
+        :type pipeline: SendPipeline
+        :return: the data needed to send each export
+        :rtype: Iterator[dict]
+        """
+        if not self._manual_send_requested:
+            # only the stacks the live link marked as changed
+            root_paths = self.live_link.take_dirty()
+        elif self.settings.value("export_all_texture_sets", False, type=bool):
+            root_paths = [
+                str(stack)
+                for texture_set in sp_textureset.all_texture_sets()
+                for stack in texture_set.all_stacks()
+            ]
+        else:
+            # Get the currently active layer stack (paintable)
+            root_paths = [str(sp_textureset.get_active_stack())]
+        self._manual_send_requested = False
 
+        for idx, root_path in enumerate(root_paths):
+            pipeline.report("export", idx, len(root_paths))
+            yield self._export_root_path(root_path)
+        pipeline.report("export", len(root_paths), len(root_paths))
+
+    def _export_root_path(self, root_path: str) -> dict:
+        """Export the textures of a stack.
+
+        A stack unchanged since its last export is not exported again, the
+        textures of its last export are sent instead.
+
+        :param root_path: path of the stack to export
+        :type root_path: str
+        :return: the data needed by the send, None if nothing was exported
+        :rtype: dict
+        """
+        fingerprint: tuple = self.get_export_fingerprint(root_path)
+        texture_sets: dict = self.export_tracker.exported(root_path, fingerprint)
+        if texture_sets is None:
+            generation: tuple = self.export_tracker.generation(root_path)
+            texture_sets = self._export_texture_files(root_path)
+            self.export_tracker.record(root_path, generation, fingerprint, texture_sets)
+        else:
+            sp_logging.info("{0} unchanged since its last export.".format(root_path))
+
+        if not texture_sets:
+            return None
+        output_maps: list = get_output_maps(
+            self.preset_index.output_maps(self.settings.value("export_preset"))
+        )
+        texture_cache: TextureCache = self.get_texture_cache()
+        ram_disk_export_path: str = self.get_ram_disk_export_path()
+        return {
+            "texture_sets": texture_sets,
+            "unreal_path": self.settings.value("unreal_content_path"),
+            "texture_cache": texture_cache,
+            # textures exported to the RAM disk are removed once imported
+            "remove_exports": bool(ram_disk_export_path)
+            and texture_cache.export_path == ram_disk_export_path,
+            "transfer_mode": self.settings.value("transfer_mode"),
+            "staging": self.settings.value("asset_name"),
+            "project": sp_project.file_path() or "",
+            "output_maps": output_maps,
+            "materials": get_material_arguments(
+                texture_sets,
+                self.settings.value("unreal_content_path"),
+                self.settings.value("parent_material"),
+                output_maps,
+            ),
+        }
+
+    def _export_texture_files(self, root_path: str) -> dict:
+        """Export the textures of a stack with Painter.
+
+        :param root_path: path of the stack to export
+        :type root_path: str
+        :return: exported texture files by texture set name
+        :rtype: dict
+        """
         # Export textures based on a preset in a temp folder
-        result = self.export_textures()
+        result = self.export_textures([root_path])
         sp_logging.log(
             sp_logging.DBG_INFO, "sp2ue", "Export Status: {0}".format(result.status)
         )
         if result.status != sp_export.ExportStatus.Success:
             raise Exception(result.message)
         sp_logging.info(result.message)
+        return get_exported_texture_sets(result)
+
+    def _send_texture_sets(self, data: dict, pipeline: SendPipeline) -> dict:
+        """Import the exported textures into Unreal, from a worker thread.
+
+        Textures exported to the RAM disk are removed once every Unreal
+        Editor imported them, so they do not hold memory until the next
+        export.
+
+        :param data: the data returned by the export
+        :type data: dict
+        :param pipeline: the pipeline running this send
+        :type pipeline: SendPipeline
+        :return: the result of the send, holding the Unreal content path
+                 (``unreal_path``), the number of ``unchanged`` textures sent
+                 to no editor, the duration in ``seconds`` and the result of each
+                 Unreal Editor in ``nodes`` (see ``_send_to_node``)
+        :rtype: dict
+        """
+        unreal_path: str = data["unreal_path"]
+        texture_cache: TextureCache = data["texture_cache"]
+        start = time.perf_counter()
+        nodes: list = self.remote_ue.target_nodes(wait=True)
+        if not nodes:
+            raise ConnectionError("Could not find an open Unreal Editor instance!")
+
+        for idx, texture_list in enumerate(data["texture_sets"].values()):
+            pipeline.report("hash", idx, len(data["texture_sets"]))
+            with trace.span("hash", textures=len(texture_list)):
+                texture_cache.refresh(texture_list)
+        result: dict = {
+            "unreal_path": unreal_path,
+            "unchanged": 0,
+            "seconds": 0.0,
+            "nodes": [],
+        }
+
+        # send to every node at once, so the send lasts as long as the slowest
+        # node rather than the sum of all of them
+        with trace.span("send", nodes=len(nodes)):
+            node_results: list = self.remote_ue.run_on_nodes(
+                lambda node: self._send_to_node(node, data, pipeline), nodes
+            )
+        pipeline.raise_if_cancelled()
+        if len(node_results) == 1 and node_results[0]["error"] is not None:
+            raise node_results[0]["error"]
+        for node_result in node_results:
+            if node_result["error"] is not None:
+                result["nodes"].append(
+                    {
+                        "node": node_result["node"],
+                        "seconds": node_result["seconds"],
+                        "error": str(node_result["error"]),
+                        "unchanged": 0,
+                        "upload": None,
+                        "assets": [],
+                        "materials": [],
+                    }
+                )
+            else:
+                result["nodes"].append(node_result["result"])
+        # the textures no node needed
+        result["unchanged"] = min(
+            node_result["unchanged"] for node_result in result["nodes"]
+        )
 
-        # for each stack, get the list of exported textures
-        for stack in result.textures.items():
-            texture_set_name, stack_name = stack[0]
-            texture_list = stack[1]
-            sp_logging.log(
-                sp_logging.DBG_INFO, "sp2ue", "Stack: {0}".format(stack_name)
+        # remember the textures imported by each node, the other ones will be
+        # sent again to that node
+        all_imported = True
+        for node_result in result["nodes"]:
+            imported: list = [
+                asset["file"] for asset in node_result["assets"] if not asset["error"]
+            ]
+            texture_cache.commit(node_result["node"], imported, unreal_path)
+            all_imported = (
+                all_imported
+                and not node_result["error"]
+                and len(imported) == len(node_result["assets"])
             )
-            sp_logging.log(
-                sp_logging.DBG_INFO,
-                "sp2ue",
-                "Texture Set: {0}".format(texture_set_name),
+        if data["remove_exports"] and all_imported:
+            remove_textures(data["texture_sets"])
+        result["seconds"] = time.perf_counter() - start
+        pipeline.report("import", 1, 1)
+        return result
+
+    def _send_to_node(self, node: dict, data: dict, pipeline: SendPipeline) -> dict:
+        """Upload and import the changed textures into an Unreal Editor.
+
+        Only the textures which changed since the last import of this editor
+        are sent, the textures must be hashed by the texture cache first.
+
+        :param node: the node of the Unreal Editor
+        :type node: dict
+        :param data: the data returned by the export
+        :type data: dict
+        :param pipeline: the pipeline running this send
+        :type pipeline: SendPipeline
+        :return: the result of the editor, holding its ``node``, the duration
+                 in ``seconds``, the ``error`` message if the send failed, the
+                 number of ``unchanged`` textures not sent, the ``upload``
+                 statistics if the textures were uploaded and the
+                 result of each texture in ``assets``: its ``texture_set``,
+                 its local ``file``, the imported ``asset`` path, the import
+                 ``seconds``, the ``error`` message if it failed and whether
+                 it was ``skipped`` as already up to date in Unreal, and the
+                 result of each material instance in ``materials``
+        :rtype: dict
+        """
+        start = time.perf_counter()
+        texture_cache: TextureCache = data["texture_cache"]
+
+        # only send the textures which changed since this node imported them
+        texture_sets: dict = {}
+        unchanged = 0
+        for set_name, texture_list in data["texture_sets"].items():
+            changed_list = texture_cache.changed(
+                texture_list, data["unreal_path"], node
             )
-            sp_logging.log(
-                sp_logging.DBG_INFO, "sp2ue", "Textures: {0}".format(texture_list)
+            unchanged += len(texture_list) - len(changed_list)
+            if changed_list:
+                texture_sets[set_name] = changed_list
+        result: dict = {
+            "node": node,
+            "seconds": 0.0,
+            "error": None,
+            "unchanged": unchanged,
+            "upload": None,
+            "assets": [],
+            "materials": [],
+        }
+        if not texture_sets:
+            return result
+
+        # upload the textures when Unreal cannot read them from this machine
+        remote_paths: dict = {}
+        if self._needs_upload(data["transfer_mode"], node):
+            uploader = ChunkedUploader(self.remote_ue, node=node)
+            files: dict = {
+                texture: texture_cache.digest(texture)
+                for texture_list in texture_sets.values()
+                for texture in texture_list
+            }
+            with trace.span("upload", files=len(files)) as span:
+                remote_paths = uploader.upload(
+                    files,
+                    data["staging"],
+                    lambda done, total: pipeline.report("transfer", done, total),
+                )
+                span.set(bytes=uploader.wire_bytes)
+            result["upload"] = {
+                "file_bytes": uploader.file_bytes,
+                "wire_bytes": uploader.wire_bytes,
+                "seconds": uploader.seconds,
+            }
+
+        # a single call imports every texture set, so the whole export is
+        # sent to Unreal in one round-trip
+        pipeline.report("transfer", 1, 1)
+        arguments: dict = get_import_arguments(
+            texture_sets,
+            data["unreal_path"],
+            texture_cache,
+            data["project"],
+            remote_paths,
+            data["output_maps"],
+        )
+        arguments["materials"] = data["materials"]
+        # send the call to Unreal
+        pipeline.report("import", 0, 1)
+        imported: dict = self.remote_ue.call_remote(
+            "import_texture_sets", arguments, node
+        )
+        trace_unreal_import(imported, node)
+
+        # report the local files rather than the ones Unreal read
+        local_files: dict = {
+            texture["file"]: local_file
+            for set_name, texture_list in texture_sets.items()
+            for local_file, texture in zip(
+                texture_list, arguments["texture_sets"][set_name]
             )
+        }
+        for asset in imported["assets"]:
+            asset["file"] = local_files.get(asset["file"], asset["file"])
+        result["assets"] = imported["assets"]
+        result["materials"] = imported.get("materials", [])
+        result["seconds"] = time.perf_counter() - start
+        return result
+
+    def _needs_upload(self, transfer_mode: str, node: dict) -> bool:
+        """Return True if the textures must be uploaded to Unreal.
+
+        :param transfer_mode: "upload" to always upload, "local" to never
+                              upload, "auto" to upload only when Unreal runs
+                              on another machine
+        :type transfer_mode: str
+        :param node: the node of the Unreal Editor
+        :type node: dict
+        """
+        if transfer_mode == "upload":
+            return True
+        if transfer_mode == "local":
+            return False
+        # an editor which did not tell its machine is considered local
+        return bool(node.get("machine")) and not self.remote_ue.is_node_local(node)
+
+    def on_send_finished(self, results: list) -> None:
+        """Keep and log the results of a send once it is done.
+
+        :param results: the result of each exported job, see
+                        ``_send_texture_sets``
+        :type results: list
+        """
+        self.last_send_results = results
+        if not results:
+            sp_logging.info("Nothing exported.")
+        for result in results:
+            sp_logging.info(format_send_result(result))
 
-            # get the command to send to Unreal
-            textures_cmd: list = self.get_unreal_command(texture_list)
-            sp_logging.info(str(textures_cmd))
-            # send the command to Unreal
-            respond = self.remote_ue.run_commands(textures_cmd)
-            sp_logging.info(respond)
+    def on_send_failed(self, message: str) -> None:
+        """Log the error of a failed send."""
+        sp_logging.error("Send to Unreal failed: {0}".format(message))
 
-    def export_textures(self) -> sp_export.TextureExportResult:
-        """Export Texutre to temp."""
-        # Get the currently active layer stack (paintable)
-        stack: sp_textureset.Stack = sp_textureset.get_active_stack()
+    def on_send_cancelled(self) -> None:
+        """Log a cancelled send."""
+        sp_logging.warning("Send to Unreal cancelled.")
 
-        # Get the parent Texture Set of this layer stack
-        # material = stack.material()
+    def get_texture_cache(self) -> TextureCache:
+        """Return the texture cache of the current export path."""
+        export_path = self.get_export_path()
+        if self.texture_cache is None or self.texture_cache.export_path != export_path:
+            self.texture_cache = TextureCache(export_path)
+        return self.texture_cache
+
+    def get_export_path(self) -> str:
+        """Return the folder where to export the textures.
+
+        When every Unreal sent to runs on this machine and a RAM disk is
+        available, the textures are exported there instead of the export
+        path, so they are never written to and read back from the disk.
+        """
+        export_path = self.get_ram_disk_export_path()
+        nodes: list = self.remote_ue.target_nodes()
+        if (
+            export_path
+            and self.settings.value("use_ram_disk", True, type=bool)
+            and nodes
+            and all(self.remote_ue.is_node_local(node) for node in nodes)
+        ):
+            os.makedirs(export_path, exist_ok=True)
+            return export_path
+        return self.settings.value("export_path")
+
+    def get_ram_disk_export_path(self) -> str:
+        """Return the folder where to export the textures on the RAM disk.
+
+        :return: the folder, empty if no RAM disk is available
+        :rtype: str
+        """
+        ram_disk_path = self.settings.value("ram_disk_path")
+        if not ram_disk_path:
+            return ""
+        return os.path.join(ram_disk_path, "sp2ue")
+
+    def remove_ram_disk_exports(self) -> None:
+        """Remove every texture exported to the RAM disk, and its manifest."""
+        export_path = self.get_ram_disk_export_path()
+        if not export_path or not os.path.isdir(export_path):
+            return
+        if self.texture_cache is not None and (
+            self.texture_cache.export_path == export_path
+        ):
+            self.texture_cache = None
+        shutil.rmtree(export_path, ignore_errors=True)
+
+    @Slot()
+    def clear_texture_cache(self) -> None:
+        """Forget the imported textures, so the next send imports everything."""
+        self.get_texture_cache().clear()
+        self.export_tracker.clear()
+        sp_logging.info("Texture cache cleared.")
+
+    def get_export_fingerprint(self, root_path: str) -> tuple:
+        """Return the settings the export of a stack depends on.
+
+        :param root_path: path of the stack
+        :type root_path: str
+        :return: the preset, profile and folder of the export, and the
+                 resolution and channels of the stack
+        :rtype: tuple
+        """
+        fingerprint: tuple = (
+            self.preset_index.url(self.settings.value("export_preset")),
+            self.settings.value("export_profile"),
+            self.get_export_path(),
+        )
+        for texture_set in sp_textureset.all_texture_sets():
+            for stack in texture_set.all_stacks():
+                if str(stack) != root_path:
+                    continue
+                resolution = texture_set.get_resolution()
+                return fingerprint + (
+                    (resolution.width, resolution.height),
+                    tuple(sorted(str(channel) for channel in stack.all_channels())),
+                )
+        return fingerprint
+
+    def export_textures(self, root_paths: list = None) -> sp_export.TextureExportResult:
+        """Export Texutre to temp.
+
+        :param root_paths: paths of the stacks to export, the active stack
+                           if None
+        :type root_paths: list
+        """
+        if root_paths is None:
+            # Get the currently active layer stack (paintable)
+            stack: sp_textureset.Stack = sp_textureset.get_active_stack()
+            root_paths = [str(stack)]
 
         # Build Export Preset resource URL
         # - Context: name of the library where the resource is located
         # - Name: name of the resource (filename without extension or
         # Substance graph path)
-        export_preset: sp_resource.ResourceID = sp_resource.ResourceID(
-            context="starter_assets", name=self.selected_preset
-        )
-        sp_logging.info("Preset: {0}".format(export_preset.url()))
+        export_preset: str = self.preset_index.url(self.settings.value("export_preset"))
+        sp_logging.info("Preset: {0}".format(export_preset))
 
         # Setup the export settings
-        # resolution = material.get_resolution()
+        profile: str = self.settings.value("export_profile")
+        sp_logging.info("Profile: {0}".format(profile))
 
         # Setup the export path, in this case the textures
         # will be put next to the spp project file on the disk
         # path: str = sp_project.file_path()
         # path = os.path.dirname(path)
 
-        # Build the configuration
-        # file:///C:/Program%20Files/Adobe/Adobe%20Substance%203D%20Painter/resources/python-doc/substance_painter/export.html#full-json-config-dict-possibilities
-        config = {
-            "exportShaderParams": False,
-            "exportPath": self.settings.value("export_path"),
-            "exportList": [{"rootPath": str(stack)}],
-            "exportPresets": [{"name": "default", "maps": []}],
-            "defaultExportPreset": export_preset.url(),
-            "exportParameters": [{"parameters": {"paddingAlgorithm": "infinite"}}],
-        }
-
-        result: sp_export.TextureExportResult = sp_export.export_project_textures(
-            config
+        config: dict = get_export_config(
+            root_paths, self.get_export_path(), export_preset, profile
         )
 
-        return result
+        with trace.span("export_textures", stacks=len(root_paths)):
+            result: sp_export.TextureExportResult = sp_export.export_project_textures(
+                config
+            )
 
-    def get_unreal_command(self, textures: list) -> list[str]:
-        """Return the command to send to Unreal Engine."""
-        cmd: list = []
-        unreal_path = self.settings.value("unreal_content_path")
+        return result
 
-        texture_list_cmd = "texture_files = ["
-        for texture in textures:
-            texture_list_cmd += '"{0}",'.format(texture)
-        texture_list_cmd += "]"
-        cmd.append(texture_list_cmd)
-        # TODO :
-        # - Create material
-        # - Set spp source metadata to textures
-        cmd += [
-            "d = unreal.AutomatedAssetImportData()",
-            'd.set_editor_property("destination_path", "{}")'.format(unreal_path),
-            'd.set_editor_property("filenames", texture_files)',
-            "tex2Ds = unreal.AssetToolsHelpers.get_asset_tools().import_assets_automated(d)",  # noqa
-        ]
-
-        return cmd
+    def get_remote_execution_config(self) -> RemoteExecutionConfig:
+        """Get the network settings to reach Unreal from env var."""
+        return get_remote_execution_config()
 
     def set_settings(self):
         """Get Settings from env var."""
@@ -160,6 +582,20 @@ class Painter2UE:
             export_path = tempfile.gettempdir()
         self.settings.setValue("export_path", export_path)
 
+        # RAM disk used when Unreal is on the same machine
+        ram_disk_path = ""
+        if os.environ.get("SP2UE_RAM_DISK_PATH"):
+            ram_disk_path = os.environ.get("SP2UE_RAM_DISK_PATH")
+        elif os.path.isdir("/dev/shm"):
+            ram_disk_path = "/dev/shm"
+        self.settings.setValue("ram_disk_path", ram_disk_path)
+
+        # how textures reach Unreal
+        transfer_mode = os.environ.get("SP2UE_TRANSFER_MODE", "auto").lower()
+        if transfer_mode not in ("auto", "local", "upload"):
+            transfer_mode = "auto"
+        self.settings.setValue("transfer_mode", transfer_mode)
+
         # UE content path
         unreal_content_path = ""
         if os.environ.get("SP2UE_UE_CONTENT_PATH"):
@@ -168,11 +604,24 @@ class Painter2UE:
             unreal_content_path = "/Game/{asset_name}/".format(asset_name=asset_name)
         self.settings.setValue("unreal_content_path", unreal_content_path)
 
-        # SP Export Preset
+        # export profile, a preview is faster to export and to import
+        export_profile = os.environ.get("SP2UE_EXPORT_PROFILE", "").lower()
+        if export_profile in EXPORT_PROFILES:
+            self.settings.setValue("export_profile", export_profile)
+        elif self.settings.value("export_profile") not in EXPORT_PROFILES:
+            self.settings.setValue("export_profile", DEFAULT_EXPORT_PROFILE)
+
+        # parent material of the material instances, none when empty
+        if os.environ.get("SP2UE_PARENT_MATERIAL") is not None:
+            self.settings.setValue(
+                "parent_material", os.environ.get("SP2UE_PARENT_MATERIAL")
+            )
+
+        # SP Export Preset, its name or its resource URL
         if os.environ.get("SP2UE_PRESET"):
             self.settings.setValue("export_preset", os.environ.get("SP2UE_PRESET"))
         elif not self.settings.value("export_preset"):
-            self.settings.setValue("export_preset", "Unreal Engine 4 (Packed)")
+            self.settings.setValue("export_preset", DEFAULT_PRESET)
 
     def on_project_opened(self, e):
         """Execute when project is opened."""
@@ -180,8 +629,457 @@ class Painter2UE:
         self.set_settings()
         self.window.update()
 
+    def on_project_about_to_close(self, e):
+        """Free the RAM disk from the textures of the closing project."""
+        if self.pipeline.is_running():
+            self.pipeline.cancel()
+        self.remove_ram_disk_exports()
+
     def __del__(self) -> None:
         """Remove all added UI elements."""
+        self.live_link.set_enabled(False)
+        self.remove_ram_disk_exports()
+        self.preset_index.close()
+        self.export_tracker.close()
         self.remote_ue.stop()
         sp_ui.delete_ui_element(self.window)
         sp_ui.delete_ui_element(self.export_action)
+
+
+def get_export_config(
+    root_paths: list, export_path: str, export_preset: str, profile: str
+) -> dict:
+    """Return the config exporting stacks with an export preset.
+
+    :param root_paths: paths of the stacks to export
+    :type root_paths: list
+    :param export_path: folder where to export the textures
+    :type export_path: str
+    :param export_preset: resource URL of the export preset
+    :type export_preset: str
+    :param profile: name of the export profile, ie final or preview
+    :type profile: str
+    :return: the config of ``substance_painter.export.export_project_textures``
+    :rtype: dict
+    """
+    # file:///C:/Program%20Files/Adobe/Adobe%20Substance%203D%20Painter/resources/python-doc/substance_painter/export.html#full-json-config-dict-possibilities
+    return {
+        "exportShaderParams": False,
+        "exportPath": export_path,
+        "exportList": [{"rootPath": root_path} for root_path in root_paths],
+        "exportPresets": [{"name": "default", "maps": []}],
+        "defaultExportPreset": export_preset,
+        "exportParameters": get_export_parameters(root_paths, profile),
+    }
+
+
+def get_export_parameters(root_paths: list, profile: str) -> list:
+    """Return the export parameters of an export profile.
+
+    A preview gets one entry per stack, as its resolution depends on the
+    resolution of its texture set.
+
+    :param root_paths: paths of the exported stacks
+    :type root_paths: list
+    :param profile: name of the export profile, ie final or preview
+    :type profile: str
+    :return: the ``exportParameters`` of the export config
+    :rtype: list
+    """
+    if profile not in EXPORT_PROFILES:
+        profile = DEFAULT_EXPORT_PROFILE
+    parameters: dict = EXPORT_PROFILES[profile]
+    if profile != "preview":
+        return [{"parameters": dict(parameters)}]
+
+    texture_sets: dict = {
+        str(stack): texture_set
+        for texture_set in sp_textureset.all_texture_sets()
+        for stack in texture_set.all_stacks()
+    }
+    export_parameters: list = []
+    for root_path in root_paths:
+        stack_parameters: dict = dict(parameters)
+        if root_path in texture_sets:
+            resolution = texture_sets[root_path].get_resolution()
+            stack_parameters["sizeLog2"] = [
+                get_preview_size_log2(resolution.width),
+                get_preview_size_log2(resolution.height),
+            ]
+        export_parameters.append(
+            {"filter": {"dataPaths": [root_path]}, "parameters": stack_parameters}
+        )
+    return export_parameters
+
+
+def get_import_arguments(
+    texture_sets: dict,
+    unreal_path: str,
+    texture_cache: TextureCache,
+    project: str = "",
+    remote_paths: dict = None,
+    output_maps: list = (),
+) -> dict:
+    """Return the arguments of the import function run in Unreal Engine.
+
+    All texture sets are imported by the same call. Each texture comes
+    with the source metadata tagged on its asset, Unreal skips the
+    textures whose asset already holds the same content hash.
+
+    :param texture_sets: exported texture files by texture set name
+    :type texture_sets: dict
+    :param unreal_path: Unreal content path to import the textures to
+    :type unreal_path: str
+    :param texture_cache: the cache holding the content hash of the files
+    :type texture_cache: TextureCache
+    :param project: the .spp file the textures are exported from
+    :type project: str
+    :param remote_paths: the path Unreal reads each uploaded file from
+    :type remote_paths: dict
+    :param output_maps: the output maps of the export preset, naming the
+                        channel of each file, see ``get_output_maps``
+    :type output_maps: list
+    :return: arguments of ``sp2ue_remote.import_texture_sets``
+    :rtype: dict
+    """
+    remote_paths = remote_paths or {}
+    map_names: list = list(get_material_parameter_names())
+    return {
+        "destination_path": unreal_path,
+        "project": project.replace("\\", "/"),
+        "texture_sets": {
+            texture_set_name: [
+                {
+                    "file": remote_paths.get(texture, texture).replace("\\", "/"),
+                    "hash": texture_cache.digest(texture),
+                    "channel": get_map_name(texture, map_names, output_maps),
+                }
+                for texture in textures
+            ]
+            for texture_set_name, textures in texture_sets.items()
+        },
+    }
+
+
+def get_material_arguments(
+    texture_sets: dict,
+    unreal_path: str,
+    parent_material: str,
+    output_maps: list = (),
+) -> dict:
+    """Return the material instances to create or update in Unreal Engine.
+
+    Each texture is bound to the material parameter named after its map,
+    the output map of the export preset it is exported by (ie BaseColor),
+    unless SP2UE_MATERIAL_PARAMETERS maps it to another parameter.
+
+    :param texture_sets: exported texture files by texture set name
+    :type texture_sets: dict
+    :param unreal_path: Unreal content path the textures are imported to
+    :type unreal_path: str
+    :param parent_material: path of the parent material in Unreal
+    :type parent_material: str
+    :param output_maps: the output maps of the export preset, see
+                        ``get_output_maps``
+    :type output_maps: list
+    :return: the ``parent`` material path and the texture asset path of
+             each parameter by texture set, None if no parent material
+             is set
+    :rtype: dict
+    """
+    if not parent_material:
+        return None
+    parameter_names: dict = get_material_parameter_names()
+    materials: dict = {}
+    for texture_set_name, textures in texture_sets.items():
+        parameters: dict = {}
+        for texture in textures:
+            stem = INVALID_NAME_CHARACTERS.sub(
+                "_", os.path.splitext(os.path.basename(texture))[0]
+            )
+            map_name = get_map_name(texture, list(parameter_names), output_maps)
+            parameters[parameter_names.get(map_name, map_name)] = "{0}/{1}".format(
+                unreal_path.rstrip("/"), stem
+            )
+        materials[texture_set_name] = parameters
+    return {"parent": parent_material, "texture_sets": materials}
+
+
+def get_exported_texture_sets(result: sp_export.TextureExportResult) -> dict:
+    """Return the exported texture files of an export, by texture set name.
+
+    The name of a texture set with several stacks holds the stack name, ie
+    ``TextureSet/Stack``.
+
+    :param result: the result of the export
+    :type result: substance_painter.export.TextureExportResult
+    :return: exported texture files by texture set name
+    :rtype: dict
+    """
+    texture_sets: dict = {}
+    for stack in result.textures.items():
+        texture_set_name, stack_name = stack[0]
+        texture_list = stack[1]
+        sp_logging.log(sp_logging.DBG_INFO, "sp2ue", "Stack: {0}".format(stack_name))
+        sp_logging.log(
+            sp_logging.DBG_INFO,
+            "sp2ue",
+            "Texture Set: {0}".format(texture_set_name),
+        )
+        sp_logging.log(
+            sp_logging.DBG_INFO, "sp2ue", "Textures: {0}".format(texture_list)
+        )
+        if not texture_list:
+            continue
+        set_name = texture_set_name
+        if stack_name:
+            set_name = "{0}/{1}".format(texture_set_name, stack_name)
+        texture_sets[set_name] = texture_list
+    return texture_sets
+
+
+def remove_textures(texture_sets: dict) -> None:
+    """Remove exported texture files, the missing ones are ignored.
+
+    :param texture_sets: exported texture files by texture set name
+    :type texture_sets: dict
+    """
+    for texture_list in texture_sets.values():
+        for texture in texture_list:
+            try:
+                os.remove(texture)
+            except OSError:
+                pass
+
+
+def get_material_parameter_names() -> dict:
+    """Return the material parameter of each map name set in the environment.
+
+    SP2UE_MATERIAL_PARAMETERS holds comma separated ``map=parameter`` pairs,
+    ie ``OcclusionRoughnessMetallic=ORM,BaseColor=Albedo``.
+
+    :return: the parameter name by map name
+    :rtype: dict
+    """
+    parameter_names: dict = {}
+    for pair in os.environ.get("SP2UE_MATERIAL_PARAMETERS", "").split(","):
+        map_name, _, parameter = pair.partition("=")
+        if map_name.strip() and parameter.strip():
+            parameter_names[map_name.strip()] = parameter.strip()
+    return parameter_names
+
+
+def get_preview_size_log2(size: int) -> int:
+    """Return the preview resolution of a texture set resolution.
+
+    :param size: width or height of the texture set, in pixels
+    :type size: int
+    :return: the preview width or height, as a power of 2
+    :rtype: int
+    """
+    size_log2 = max(size, 1).bit_length() - 1
+    return max(
+        size_log2 - PREVIEW_SIZE_LOG2_REDUCTION,
+        min(size_log2, PREVIEW_MIN_SIZE_LOG2),
+    )
+
+
+def get_output_maps(file_names: list) -> list:
+    """Return the name and file pattern of the output maps of a preset.
+
+    The name of a map is the literal text of its file name after the last
+    variable, ie BaseColor for ``$mesh_$textureSet_BaseColor(.$udim)``.
+
+    :param file_names: the file name of each output map, see
+                       ``PresetIndex.output_maps``
+    :type file_names: list
+    :return: the map name and the compiled pattern matching the file name
+             without extension, of each output map, the most specific first
+    :rtype: list
+    """
+    output_maps: list = []
+    for file_name in file_names:
+        pattern, depth, name, literals = "", 0, "", ""
+        for token in OUTPUT_MAP_TOKEN.findall(file_name):
+            if token == "(":
+                pattern += "(?:"
+                depth += 1
+            elif token == ")":
+                pattern += ")?"
+                depth -= 1
+            elif token.startswith("$") and len(token) > 1:
+                pattern += ".+?"
+                if not depth:
+                    name = ""
+            else:
+                pattern += re.escape(token)
+                if not depth:
+                    name += token
+                    literals += token
+        name = name.strip(OUTPUT_MAP_SEPARATORS) or literals.strip(
+            OUTPUT_MAP_SEPARATORS
+        )
+        try:
+            output_maps.append((len(literals), name or file_name, re.compile(pattern)))
+        except re.error:
+            # unbalanced optional parts, the file suffix is used instead
+            continue
+    # the longest literal text first, so _Normal_OpenGL wins over _Normal
+    output_maps.sort(key=lambda output_map: output_map[0], reverse=True)
+    return [(name, pattern) for _, name, pattern in output_maps]
+
+
+def get_map_name(texture: str, map_names: list = (), output_maps: list = ()) -> str:
+    """Return the map of a texture file (ie BaseColor).
+
+    The map is the output map of the export preset the file name matches,
+    or the end of the file name if none does.
+
+    :param texture: the exported texture file
+    :type texture: str
+    :param map_names: known map names, which may hold underscores
+    :type map_names: list
+    :param output_maps: the output maps of the export preset, see
+                        ``get_output_maps``
+    :type output_maps: list
+    :return: the map name
+    :rtype: str
+    """
+    stem = os.path.splitext(os.path.basename(texture))[0]
+    for map_name, pattern in output_maps:
+        if pattern.fullmatch(stem):
+            return map_name
+    # the longest map names first, so BaseColor wins over Color
+    for map_name in sorted(map_names, key=len, reverse=True):
+        if stem.endswith("_" + map_name):
+            return map_name
+    return stem.rsplit("_", 1)[-1]
+
+
+def trace_unreal_import(imported: dict, node: dict) -> None:
+    """Record the durations Unreal measured during an import.
+
+    Unreal only sends durations back, so the import is laid out as ending
+    when its result is received: each texture, then each material instance,
+    one after the other on a thread named after the editor.
+
+    :param imported: the result of ``sp2ue_remote.import_texture_sets``
+    :type imported: dict
+    :param node: the node of the Unreal Editor
+    :type node: dict
+    """
+    thread: str = "Unreal {0} ({1})".format(
+        node.get("project_name"), node.get("node_id")
+    )
+    end: int = time.perf_counter_ns()
+    start: int = end - int(imported.get("seconds", 0.0) * 1e9)
+    trace.TRACER.record(
+        "unreal.import_texture_sets",
+        start,
+        end - start,
+        {"textures": len(imported["assets"])},
+        thread,
+    )
+    for name, items in (
+        ("unreal.import_texture", imported["assets"]),
+        ("unreal.update_material_instance", imported.get("materials", [])),
+    ):
+        for item in items:
+            duration = int(item["seconds"] * 1e9)
+            args = {"asset": item["asset"], "error": item["error"]}
+            if "skipped" in item:
+                args["skipped"] = item["skipped"]
+            trace.TRACER.record(name, start, duration, args, thread)
+            start += duration
+
+
+def format_send_result(result: dict) -> str:
+    """Return a readable summary of the result of a send.
+
+    :param result: the result of a send, see ``Painter2UE._send_texture_sets``
+    :type result: dict
+    :return: one line per texture set of each Unreal Editor
+    :rtype: str
+    """
+    if not any(
+        node_result["assets"] or node_result["error"] for node_result in result["nodes"]
+    ):
+        return "No texture changed since the last send."
+    lines: list = []
+    for node_result in result["nodes"]:
+        if len(result["nodes"]) > 1:
+            lines.append(
+                "{0} ({1}):".format(
+                    node_result["node"].get("project_name"),
+                    node_result["node"].get("machine"),
+                )
+            )
+        if node_result["error"]:
+            lines.append(
+                "failed in {0:.3f}s: {1}".format(
+                    node_result["seconds"], node_result["error"]
+                )
+            )
+            continue
+        if not node_result["assets"]:
+            lines.append("No texture changed since the last send.")
+            continue
+        texture_sets: dict = {}
+        for asset in node_result["assets"]:
+            texture_sets.setdefault(asset["texture_set"], []).append(asset)
+        for set_name, assets in texture_sets.items():
+            failed = [asset for asset in assets if asset["error"]]
+            skipped = [asset for asset in assets if asset.get("skipped")]
+            lines.append(
+                "{0}: {1} texture(s) imported in {2:.3f}s".format(
+                    set_name,
+                    len(assets) - len(failed) - len(skipped),
+                    sum(asset["seconds"] for asset in assets),
+                )
+            )
+            if skipped:
+                lines[-1] += ", {0} already up to date in Unreal".format(len(skipped))
+            for asset in failed:
+                lines.append(
+                    "{0}: failed {1}, {2}".format(
+                        set_name, os.path.basename(asset["file"]), asset["error"]
+                    )
+                )
+        for material in node_result.get("materials", []):
+            if material["error"]:
+                lines.append(
+                    "{0}: material failed, {1}".format(
+                        material["texture_set"], material["error"]
+                    )
+                )
+            elif material["created"] or material["parameters"]:
+                lines.append(
+                    "{0}: {1} {2}, {3} parameter(s) set".format(
+                        material["texture_set"],
+                        "created" if material["created"] else "updated",
+                        material["asset"],
+                        material["parameters"],
+                    )
+                )
+        upload = node_result["upload"]
+        if upload:
+            lines.append(
+                "Uploaded {0:.1f} MB in {1:.3f}s ({2:.1f} MB/s, "
+                "{3:.1f} MB sent)".format(
+                    upload["file_bytes"] / 1e6,
+                    upload["seconds"],
+                    upload["file_bytes"] / upload["seconds"] / 1e6
+                    if upload["seconds"]
+                    else 0.0,
+                    upload["wire_bytes"] / 1e6,
+                )
+            )
+    lines.append(
+        "{0} texture(s) sent to {1} Unreal Editor(s) in {2:.3f}s, {3} unchanged".format(
+            max(len(node_result["assets"]) for node_result in result["nodes"]),
+            len(result["nodes"]),
+            result["seconds"],
+            result["unchanged"],
+        )
+    )
+    return "\n".join(lines)
@@ -0,0 +1,146 @@
+"""Substance Painter To Unreal Engine Batch Worker."""
+import os
+import time
+
+import substance_painter.export as sp_export
+import substance_painter.logging as sp_logging
+import substance_painter.project as sp_project
+import substance_painter.textureset as sp_textureset
+from PySide2.QtCore import QObject, QTimer, Slot
+
+from .batch import RESULT_FILE_NAME, read_json, write_json
+from .sp2ue import (
+    get_export_config,
+    get_exported_texture_sets,
+    get_import_arguments,
+    get_material_arguments,
+    get_output_maps,
+)
+from .sp2ue_cache import TextureCache
+from .sp2ue_presets import PresetIndex
+
+# number of milliseconds between two reads of the job file
+POLL_INTERVAL_MS = 500
+
+
+class BatchWorker(QObject):
+    """Export the projects given by the batch command, one at a time.
+
+    The batch command writes a job in the job file, the worker opens its
+    project once Painter is idle, exports every stack and writes the
+    arguments of the import next to the job file. The import itself is done
+    by the batch command, so the imports of all workers go to Unreal one at
+    a time. No panel is created and the plugin settings are not used, each
+    job holds its own settings.
+    """
+
+    def __init__(self, job_path: str) -> None:
+        """Start polling the job file.
+
+        :param job_path: file where the batch command writes the jobs
+        :type job_path: str
+        """
+        super().__init__()
+        self.job_path = job_path
+        self.result_path = os.path.join(os.path.dirname(job_path), RESULT_FILE_NAME)
+        self._job: dict = None
+        self._last_id = -1
+        self._start = 0.0
+        self.preset_index = PresetIndex()
+        self._timer = QTimer()
+        self._timer.setInterval(POLL_INTERVAL_MS)
+        self._timer.timeout.connect(self._poll)
+        self._timer.start()
+        sp_logging.info("Batch worker waiting for jobs in {0}".format(job_path))
+
+    @Slot()
+    def _poll(self) -> None:
+        """Start the next job, or export the opened project once editable."""
+        if self._job is None:
+            job = read_json(self.job_path)
+            if job is None or job["id"] <= self._last_id:
+                return
+            self._last_id = job["id"]
+            self._job = job
+            self._start = time.perf_counter()
+            try:
+                if sp_project.is_open():
+                    sp_project.close()
+                sp_project.open(job["project"])
+            except Exception as error:
+                self._finish(error=str(error))
+        elif sp_project.is_in_edition_state():
+            try:
+                self._finish(arguments=self._export())
+            except Exception as error:
+                self._finish(error=str(error))
+
+    def _export(self) -> dict:
+        """Export every stack of the opened project.
+
+        :return: the arguments of ``sp2ue_remote.import_texture_sets``
+        :rtype: dict
+        """
+        job = self._job
+        root_paths = [
+            str(stack)
+            for texture_set in sp_textureset.all_texture_sets()
+            for stack in texture_set.all_stacks()
+        ]
+        # the project presets are only known once the project is open
+        self.preset_index.refresh()
+        result = sp_export.export_project_textures(
+            get_export_config(
+                root_paths,
+                job["export_path"],
+                self.preset_index.url(job["preset"]),
+                job["profile"],
+            )
+        )
+        if result.status != sp_export.ExportStatus.Success:
+            raise Exception(result.message)
+        texture_sets = get_exported_texture_sets(result)
+        output_maps = get_output_maps(self.preset_index.output_maps(job["preset"]))
+        arguments = get_import_arguments(
+            texture_sets,
+            job["unreal_path"],
+            TextureCache(job["export_path"]),
+            job["project"],
+            output_maps=output_maps,
+        )
+        arguments["materials"] = get_material_arguments(
+            texture_sets, job["unreal_path"], job["parent_material"], output_maps
+        )
+        return arguments
+
+    def _finish(self, arguments: dict = None, error: str = None) -> None:
+        """Write the result of the current job and close its project.
+
+        :param arguments: the import arguments, None if the export failed
+        :type arguments: dict
+        :param error: the error message if the export failed
+        :type error: str
+        """
+        write_json(
+            self.result_path,
+            {
+                "id": self._job["id"],
+                "project": self._job["project"],
+                "seconds": time.perf_counter() - self._start,
+                "error": error,
+                "arguments": arguments,
+            },
+        )
+        if error:
+            sp_logging.error("Batch export failed: {0}".format(error))
+        self._job = None
+        try:
+            if sp_project.is_open():
+                sp_project.close()
+        except Exception as close_error:
+            sp_logging.warning("Cannot close the project: {0}".format(close_error))
+
+    def __del__(self) -> None:
+        """Stop polling the job file."""
+        self._timer.stop()
+        self.preset_index.close()
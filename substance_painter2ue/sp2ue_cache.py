@@ -0,0 +1,175 @@
+"""Substance Painter To Unreal Engine Texture Cache."""
+import hashlib
+import json
+import os
+
+# name of the manifest file written in the export path
+MANIFEST_NAME = "sp2ue_manifest.json"
+MANIFEST_VERSION = 2
+# size of the blocks read when hashing a texture
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+class TextureCache:
+    """Remember the content of the textures already imported into Unreal.
+
+    The manifest maps each exported file to its content hash, size and mtime,
+    and each Unreal Editor to the hash of the textures it imported along with
+    the Unreal content path they were imported to, so an editor which did not
+    import a texture yet still gets it. It is stored next to the exported
+    textures so it follows the export path.
+    """
+
+    def __init__(self, export_path: str) -> None:
+        """Load the manifest of the given export path.
+
+        :param export_path: folder where the textures are exported
+        :type export_path: str
+        """
+        self.export_path = export_path
+        self.manifest_path = os.path.join(export_path, MANIFEST_NAME)
+        self._files: dict = {}
+        self._nodes: dict = {}
+        self.load()
+
+    def load(self) -> None:
+        """Read the manifest from disc, starting empty if it is missing."""
+        self._files = {}
+        self._nodes = {}
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as manifest:
+                data = json.load(manifest)
+        except (OSError, ValueError):
+            return
+        if data.get("version") == MANIFEST_VERSION:
+            self._files = data.get("files", {})
+            self._nodes = data.get("nodes", {})
+
+    def save(self) -> None:
+        """Write the manifest to disc."""
+        data = {
+            "version": MANIFEST_VERSION,
+            "files": self._files,
+            "nodes": self._nodes,
+        }
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as manifest:
+            json.dump(data, manifest, indent=1)
+        os.replace(tmp_path, self.manifest_path)
+
+    def clear(self) -> None:
+        """Forget every texture, so the next send imports everything."""
+        self._files = {}
+        self._nodes = {}
+        if os.path.exists(self.manifest_path):
+            os.remove(self.manifest_path)
+
+    def refresh(self, textures: list) -> None:
+        """Hash the textures written since they were last hashed.
+
+        :param textures: exported texture files
+        :type textures: list
+        """
+        for texture in textures:
+            key = os.path.normcase(os.path.abspath(texture))
+            stat = os.stat(texture)
+            entry = self._files.get(key)
+            if (
+                entry
+                and entry["size"] == stat.st_size
+                and entry["mtime"] == stat.st_mtime_ns
+            ):
+                # file untouched since it was hashed
+                continue
+            self._files[key] = {
+                "hash": file_hash(texture),
+                "size": stat.st_size,
+                "mtime": stat.st_mtime_ns,
+            }
+
+    def changed(self, textures: list, destination: str, node: dict) -> list:
+        """Return the textures which differ from their last import in a node.
+
+        The textures must be hashed by :meth:`refresh` first.
+
+        :param textures: exported texture files
+        :type textures: list
+        :param destination: Unreal content path the textures are imported to
+        :type destination: str
+        :param node: the node of the Unreal Editor importing the textures
+        :type node: dict
+        :return: textures to import
+        :rtype: list
+        """
+        imported: dict = self._nodes.get(node_key(node), {})
+        changed_textures: list = []
+        for texture in textures:
+            entry = imported.get(os.path.normcase(os.path.abspath(texture)))
+            if (
+                entry
+                and entry["destination"] == destination
+                and entry["hash"] == self.digest(texture)
+            ):
+                continue
+            changed_textures.append(texture)
+        return changed_textures
+
+    def digest(self, texture: str) -> str:
+        """Return the content hash of a texture, hashing it if needed.
+
+        :param texture: exported texture file
+        :type texture: str
+        :return: hexadecimal digest
+        :rtype: str
+        """
+        entry = self._files.get(os.path.normcase(os.path.abspath(texture)))
+        if entry:
+            return entry["hash"]
+        return file_hash(texture)
+
+    def commit(self, node: dict, textures: list, destination: str) -> None:
+        """Record the given textures as imported by a node and save the manifest.
+
+        :param node: the node of the Unreal Editor which imported the textures
+        :type node: dict
+        :param textures: textures successfully imported into Unreal
+        :type textures: list
+        :param destination: Unreal content path the textures were imported to
+        :type destination: str
+        """
+        imported: dict = self._nodes.setdefault(node_key(node), {})
+        for texture in textures:
+            imported[os.path.normcase(os.path.abspath(texture))] = {
+                "hash": self.digest(texture),
+                "destination": destination,
+            }
+        self.save()
+
+
+def node_key(node: dict) -> str:
+    """Return the key of an Unreal Editor in the manifest.
+
+    An editor is known by its machine and project, as its node id changes
+    every time it starts.
+
+    :param node: the node of the Unreal Editor
+    :type node: dict
+    :return: the machine and the project root of the editor
+    :rtype: str
+    """
+    return "{0}|{1}".format(node.get("machine", ""), node.get("project_root", ""))
+
+
+def file_hash(path: str) -> str:
+    """Return the blake2b digest of a file content.
+
+    :param path: path of the file to hash
+    :type path: str
+    :return: hexadecimal digest
+    :rtype: str
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
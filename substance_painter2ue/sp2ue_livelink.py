@@ -0,0 +1,96 @@
+"""Substance Painter To Unreal Engine Live Link."""
+import substance_painter.event as sp_event
+import substance_painter.logging as sp_logging
+import substance_painter.textureset as sp_textureset
+from PySide2.QtCore import QObject, QTimer, Slot
+
+# default number of milliseconds without change before sending
+DEFAULT_DEBOUNCE_MS = 1000
+# events marking the active stack as changed, missing ones are ignored as they
+# depend on the version of Painter
+CHANGE_EVENTS = ("LayerStacksModelDataChanged",)
+
+
+class LiveLink(QObject):
+    """Send the changed texture sets to Unreal automatically.
+
+    Change events mark the active stack as dirty. Bursts of changes are
+    coalesced: the send only starts once no change happened during the
+    debounce window, and then only exports the dirty stacks.
+    """
+
+    def __init__(self, send) -> None:
+        """Init the live link, disabled.
+
+        :param send: called without arguments when dirty stacks must be sent
+        :type send: callable
+        """
+        super().__init__()
+        self._send = send
+        self._dirty: set = set()
+        self._enabled = False
+        self._timer = QTimer()
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(DEFAULT_DEBOUNCE_MS)
+        self._timer.timeout.connect(self._on_timeout)
+        self._events = [
+            getattr(sp_event, name) for name in CHANGE_EVENTS if hasattr(sp_event, name)
+        ]
+
+    def is_enabled(self) -> bool:
+        """Return True if changes are sent automatically."""
+        return self._enabled
+
+    def set_enabled(self, enabled: bool) -> None:
+        """Start or stop listening to the changes.
+
+        :param enabled: True to send the changes automatically
+        :type enabled: bool
+        """
+        if enabled == self._enabled:
+            return
+        self._enabled = enabled
+        if enabled:
+            if not self._events:
+                sp_logging.warning(
+                    "Live link: this version of Painter has no change event."
+                )
+            for event in self._events:
+                sp_event.DISPATCHER.connect(event, self.on_changed)
+        else:
+            for event in self._events:
+                sp_event.DISPATCHER.disconnect(event, self.on_changed)
+            self._timer.stop()
+            self._dirty.clear()
+
+    def set_debounce(self, msec: int) -> None:
+        """Set the number of milliseconds without change before sending.
+
+        :param msec: debounce window in milliseconds
+        :type msec: int
+        """
+        self._timer.setInterval(msec)
+
+    def on_changed(self, e) -> None:
+        """Mark the active stack as dirty and restart the debounce window."""
+        stack = sp_textureset.get_active_stack()
+        if stack is None:
+            return
+        self._dirty.add(str(stack))
+        self._timer.start()
+
+    def take_dirty(self) -> list:
+        """Return the dirty stacks and mark them as clean.
+
+        :return: root paths of the stacks changed since the last call
+        :rtype: list
+        """
+        dirty = sorted(self._dirty)
+        self._dirty.clear()
+        return dirty
+
+    @Slot()
+    def _on_timeout(self) -> None:
+        """Send the dirty stacks once the changes settled."""
+        if self._dirty:
+            self._send()
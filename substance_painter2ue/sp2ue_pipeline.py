@@ -0,0 +1,194 @@
+"""Substance Painter To Unreal Engine Send Pipeline."""
+import queue
+import threading
+
+from PySide2.QtCore import QObject, QTimer, Signal, Slot
+
+
+class SendCancelled(Exception):
+    """Raised inside a send when it has been cancelled."""
+
+
+# marks the end of the exported jobs
+_EXPORT_DONE = object()
+
+
+class SendPipeline(QObject):
+    """Run sends to Unreal Engine without blocking the Qt main thread.
+
+    A send is made of an ``export`` stage, which calls the Painter API and so
+    runs on the main thread, followed by the ``hash``, ``transfer`` and
+    ``import`` stages which run on a worker thread. The export yields one job
+    at a time, each job is handed over to the worker as soon as it is
+    exported, so the import of a job overlaps the export of the next one.
+    Requests made while a send is running are coalesced into a single new
+    send started once it is done.
+
+    Public signals are always emitted from the main thread.
+    """
+
+    # stage name, done steps, total steps
+    progress = Signal(str, int, int)
+    # list of the results returned by the send function for each job
+    finished = Signal(object)
+    # error message
+    failed = Signal(str)
+    cancelled = Signal()
+    # a send started or stopped
+    running_changed = Signal(bool)
+
+    # signals used by the worker thread to reach the main thread
+    _worker_progress = Signal(str, int, int)
+    _worker_done = Signal(str, object)
+
+    def __init__(self, export, send) -> None:
+        """Init the pipeline.
+
+        :param export: called on the main thread with this pipeline, returns
+                       an iterator of the jobs to send, each job is exported
+                       while the iterator advances
+        :type export: callable
+        :param send: called on the worker thread with each exported job and
+                     this pipeline, returns the result of the send
+        :type send: callable
+        """
+        super().__init__()
+        self._export = export
+        self._send = send
+        self._running = False
+        self._pending = False
+        self._cancel_event = threading.Event()
+        self._jobs: queue.Queue = None
+        self._export_iterator = None
+        self._worker_progress.connect(self._on_worker_progress)
+        self._worker_done.connect(self._on_worker_done)
+
+    def is_running(self) -> bool:
+        """Return True while a send is running."""
+        return self._running
+
+    @Slot()
+    def request(self) -> None:
+        """Start a send, or queue one if a send is already running."""
+        if self._running:
+            self._pending = True
+            return
+        self._start()
+
+    @Slot()
+    def cancel(self) -> None:
+        """Cancel the running send and drop the queued one.
+
+        The cancellation is effective at the next stage boundary, a command
+        already running in Unreal is not interrupted.
+        """
+        self._pending = False
+        if self._running:
+            self._cancel_event.set()
+
+    def report(self, stage: str, done: int = 0, total: int = 0) -> None:
+        """Report the progress of the running send, from the worker thread.
+
+        :param stage: name of the current stage
+        :type stage: str
+        :param done: number of steps done in this stage
+        :type done: int
+        :param total: number of steps of this stage
+        :type total: int
+        :raises SendCancelled: if the send has been cancelled
+        """
+        self.raise_if_cancelled()
+        self._worker_progress.emit(stage, done, total)
+
+    def raise_if_cancelled(self) -> None:
+        """Stop the running send if it has been cancelled.
+
+        :raises SendCancelled: if the send has been cancelled
+        """
+        if self._cancel_event.is_set():
+            raise SendCancelled()
+
+    def _start(self) -> None:
+        """Start the worker, then export the jobs on the main thread."""
+        self._running = True
+        self._cancel_event.clear()
+        self.running_changed.emit(True)
+        self.progress.emit("export", 0, 0)
+        self._jobs = queue.Queue()
+        worker = threading.Thread(target=self._run_worker, args=(self._jobs,))
+        worker.daemon = True
+        worker.start()
+        try:
+            self._export_iterator = iter(self._export(self))
+        except Exception as error:
+            self._stop_export(error)
+            return
+        self._export_next()
+
+    @Slot()
+    def _export_next(self) -> None:
+        """Export the next job, letting Qt process events between two jobs."""
+        if self._export_iterator is None:
+            return
+        try:
+            self.raise_if_cancelled()
+            job = next(self._export_iterator)
+        except StopIteration:
+            self._stop_export()
+            return
+        except Exception as error:
+            self._stop_export(error)
+            return
+        if job is not None:
+            self._jobs.put(job)
+        QTimer.singleShot(0, self._export_next)
+
+    def _stop_export(self, error: Exception = None) -> None:
+        """Tell the worker no more job will come.
+
+        :param error: the error which stopped the export, if any
+        :type error: Exception
+        """
+        self._export_iterator = None
+        self._jobs.put(error if error is not None else _EXPORT_DONE)
+
+    def _run_worker(self, jobs: queue.Queue) -> None:
+        """Send the jobs as they are exported and report the outcome."""
+        results: list = []
+        try:
+            while True:
+                job = jobs.get()
+                if job is _EXPORT_DONE:
+                    break
+                if isinstance(job, Exception):
+                    raise job
+                results.append(self._send(job, self))
+        except SendCancelled:
+            self._worker_done.emit("cancelled", None)
+        except Exception as error:
+            # stop exporting jobs nobody will send
+            self._cancel_event.set()
+            self._worker_done.emit("failed", str(error))
+        else:
+            self._worker_done.emit("finished", results)
+
+    @Slot(str, int, int)
+    def _on_worker_progress(self, stage: str, done: int, total: int) -> None:
+        """Forward the worker progress from the main thread."""
+        self.progress.emit(stage, done, total)
+
+    @Slot(str, object)
+    def _on_worker_done(self, outcome: str, value) -> None:
+        """Emit the outcome of a send and start the queued one."""
+        self._running = False
+        self._export_iterator = None
+        if outcome == "finished":
+            self.finished.emit(value)
+        elif outcome == "cancelled":
+            self.cancelled.emit()
+        else:
+            self.failed.emit(value)
+        self.running_changed.emit(False)
+        if self._pending:
+            self._pending = False
+            self._start()
@@ -0,0 +1,162 @@
+"""Substance Painter To Unreal Engine Export Preset Index."""
+import substance_painter.event as sp_event
+import substance_painter.export as sp_export
+import substance_painter.logging as sp_logging
+import substance_painter.resource as sp_resource
+from PySide2.QtCore import QObject, QTimer, Signal, Slot
+
+# preset used until the index is built, or when the selected one is missing
+DEFAULT_PRESET = "Unreal Engine 4 (Packed)"
+# shelf query of the export presets
+PRESET_QUERY = "u:export"
+# events invalidating the index, missing ones are ignored as they depend on the
+# version of Painter
+INVALIDATE_EVENTS = ("ProjectOpened",)
+
+
+class PresetIndex(QObject):
+    """Cache the export presets of the shelves and of the project.
+
+    Searching the resources scans the libraries, so it never happens while
+    the panel is built: the index is refreshed from the event loop once it
+    is invalidated, and ``changed`` is emitted when it is up to date. Until
+    then the last known presets are returned.
+    """
+
+    changed = Signal()
+
+    def __init__(self) -> None:
+        """Init the index, empty and refreshed from the next event loop."""
+        super().__init__()
+        self._presets: list = []
+        # file name of each output map, by preset URL, read on first use
+        self._output_maps: dict = {}
+        self._dirty = True
+        self._crawling = False
+        self._timer = QTimer()
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(0)
+        self._timer.timeout.connect(self.refresh)
+        self._callbacks: list = [
+            (getattr(sp_event, name), self.invalidate)
+            for name in INVALIDATE_EVENTS
+            if hasattr(sp_event, name)
+        ]
+        if hasattr(sp_event, "ShelfCrawlingStarted"):
+            self._callbacks.append(
+                (sp_event.ShelfCrawlingStarted, self.on_crawling_started)
+            )
+        if hasattr(sp_event, "ShelfCrawlingEnded"):
+            self._callbacks.append(
+                (sp_event.ShelfCrawlingEnded, self.on_crawling_ended)
+            )
+        for event, callback in self._callbacks:
+            sp_event.DISPATCHER.connect(event, callback)
+        self._timer.start()
+
+    def presets(self) -> list:
+        """Return the known export presets, without searching the resources.
+
+        :return: the ``name``, ``context`` and ``url`` of each preset
+        :rtype: list
+        """
+        if self._dirty and not self._crawling:
+            self._timer.start()
+        return list(self._presets)
+
+    def invalidate(self, e=None) -> None:
+        """Mark the index as outdated and refresh it from the event loop."""
+        self._dirty = True
+        if not self._crawling:
+            self._timer.start()
+
+    def on_crawling_started(self, e) -> None:
+        """Wait for the shelves to be crawled before searching them."""
+        self._crawling = True
+        self._timer.stop()
+
+    def on_crawling_ended(self, e) -> None:
+        """Search the shelves again, their presets may have changed."""
+        self._crawling = False
+        self.invalidate()
+
+    @Slot()
+    def refresh(self) -> None:
+        """Search the export presets of the resource libraries."""
+        if self._crawling or not self._dirty:
+            return
+        presets: list = []
+        try:
+            resources = sp_resource.search(PRESET_QUERY)
+        except Exception as error:
+            sp_logging.warning("Cannot list the export presets: {0}".format(error))
+            resources = []
+        for resource in resources:
+            if sp_resource.Usage.EXPORT not in resource.usages():
+                continue
+            identifier = resource.identifier()
+            presets.append(
+                {
+                    "name": identifier.name,
+                    "context": identifier.context,
+                    "url": identifier.url(),
+                }
+            )
+        presets.sort(key=lambda preset: (preset["name"].lower(), preset["context"]))
+        self._output_maps.clear()
+        self._dirty = False
+        if presets != self._presets:
+            self._presets = presets
+            self.changed.emit()
+
+    def url(self, preset: str) -> str:
+        """Return the resource URL of a preset.
+
+        :param preset: the URL of the preset, or its name
+        :type preset: str
+        :return: the URL, in the starter assets if the name is unknown
+        :rtype: str
+        """
+        preset = preset or DEFAULT_PRESET
+        if preset.startswith("resource://"):
+            return preset
+        for known_preset in self._presets:
+            if known_preset["name"] == preset:
+                return known_preset["url"]
+        return sp_resource.ResourceID(context="starter_assets", name=preset).url()
+
+    def output_maps(self, preset: str) -> list:
+        """Return the file name of each output map of a preset.
+
+        The file names are the ones of the preset definition, holding
+        variables and optional parts, ie ``$mesh_$textureSet_BaseColor(.$udim)``.
+
+        :param preset: the URL of the preset, or its name
+        :type preset: str
+        :return: the file names, empty if the preset is not found
+        :rtype: list
+        """
+        url: str = self.url(preset)
+        if url not in self._output_maps:
+            file_names: list = []
+            try:
+                for export_preset in sp_export.list_resource_export_presets():
+                    if export_preset.resource_id.url() == url:
+                        file_names = [
+                            output_map["fileName"]
+                            for output_map in export_preset.list_output_maps()
+                            if output_map.get("fileName")
+                        ]
+                        break
+            except Exception as error:
+                sp_logging.warning(
+                    "Cannot list the maps of {0}: {1}".format(url, error)
+                )
+            self._output_maps[url] = file_names
+        return list(self._output_maps[url])
+
+    def close(self) -> None:
+        """Stop listening to the resource events."""
+        self._timer.stop()
+        for event, callback in self._callbacks:
+            sp_event.DISPATCHER.disconnect(event, callback)
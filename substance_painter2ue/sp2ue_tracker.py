@@ -0,0 +1,139 @@
+"""Substance Painter To Unreal Engine Export Tracker."""
+import os
+
+import substance_painter.event as sp_event
+import substance_painter.textureset as sp_textureset
+
+from .sp2ue_livelink import CHANGE_EVENTS
+
+# events after which every stack may export differently, missing ones are
+# ignored as they depend on the version of Painter
+RESET_EVENTS = (
+    "ProjectOpened",
+    "ProjectEditionEntered",
+    "BakingProcessEnded",
+    "ShelfCrawlingEnded",
+)
+
+
+class ExportTracker:
+    """Remember the last export of each stack, to skip the unchanged ones.
+
+    Change events bump the generation of the active stack. An export is
+    recorded with the generation and the fingerprint of its stack (export
+    settings, resolution, channels), it is reused as long as both are the
+    same and its files are untouched on disc. An edit happening while a
+    stack exports bumps its generation, so the next send exports it again.
+    """
+
+    def __init__(self) -> None:
+        """Start tracking the changes."""
+        self._generations: dict = {}
+        self._epoch = 0
+        self._exports: dict = {}
+        self._callbacks: list = [
+            (getattr(sp_event, name), self.on_changed)
+            for name in CHANGE_EVENTS
+            if hasattr(sp_event, name)
+        ] + [
+            (getattr(sp_event, name), self.on_reset)
+            for name in RESET_EVENTS
+            if hasattr(sp_event, name)
+        ]
+        for event, callback in self._callbacks:
+            sp_event.DISPATCHER.connect(event, callback)
+
+    def generation(self, root_path: str) -> tuple:
+        """Return the generation of a stack, bumped by each of its changes.
+
+        :param root_path: path of the stack
+        :type root_path: str
+        :return: the generation, to give back to :meth:`record`
+        :rtype: tuple
+        """
+        return (self._epoch, self._generations.get(root_path, 0))
+
+    def on_changed(self, e) -> None:
+        """Bump the generation of the active stack."""
+        stack = sp_textureset.get_active_stack()
+        if stack is None:
+            return
+        root_path = str(stack)
+        self._generations[root_path] = self._generations.get(root_path, 0) + 1
+
+    def on_reset(self, e=None) -> None:
+        """Bump the generation of every stack."""
+        self._epoch += 1
+
+    def record(
+        self, root_path: str, generation: tuple, fingerprint: tuple, texture_sets: dict
+    ) -> None:
+        """Remember the textures exported from a stack.
+
+        :param root_path: path of the exported stack
+        :type root_path: str
+        :param generation: generation of the stack when its export started
+        :type generation: tuple
+        :param fingerprint: export settings of the stack
+        :type fingerprint: tuple
+        :param texture_sets: exported texture files by texture set name
+        :type texture_sets: dict
+        """
+        self._exports[root_path] = {
+            "generation": generation,
+            "fingerprint": fingerprint,
+            "texture_sets": texture_sets,
+            "files": {
+                texture: _file_state(texture)
+                for textures in texture_sets.values()
+                for texture in textures
+            },
+        }
+
+    def exported(self, root_path: str, fingerprint: tuple) -> dict:
+        """Return the last export of a stack, if it is still up to date.
+
+        :param root_path: path of the stack
+        :type root_path: str
+        :param fingerprint: current export settings of the stack
+        :type fingerprint: tuple
+        :return: texture files by texture set name, None if the stack must
+                 be exported
+        :rtype: dict
+        """
+        export = self._exports.get(root_path)
+        if (
+            export is None
+            or export["generation"] != self.generation(root_path)
+            or export["fingerprint"] != fingerprint
+            or any(
+                _file_state(texture) != state
+                for texture, state in export["files"].items()
+            )
+        ):
+            return None
+        return export["texture_sets"]
+
+    def clear(self) -> None:
+        """Forget every export, so the next send exports everything."""
+        self._exports = {}
+
+    def close(self) -> None:
+        """Stop tracking the changes."""
+        for event, callback in self._callbacks:
+            sp_event.DISPATCHER.disconnect(event, callback)
+
+
+def _file_state(path: str) -> tuple:
+    """Return the size and mtime of a file, None if it is missing.
+
+    :param path: path of the file
+    :type path: str
+    :return: size and mtime in nanoseconds
+    :rtype: tuple
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_size, stat.st_mtime_ns)
@@ -3,9 +3,18 @@ import os
 
 import substance_painter.ui as sp_ui
 from PySide2 import QtGui, QtWidgets
-from PySide2.QtCore import QSettings
+from PySide2.QtCore import QObject, QSettings, Signal
 
-from .unreal import RemoteUECommand
+from .sp2ue_livelink import DEFAULT_DEBOUNCE_MS
+from .unreal import RemoteUECommand, trace
+
+# combobox item sending to every Unreal Editor at once
+ALL_NODES_ITEM = "All Unreal Editors"
+# combobox items of the export profiles
+EXPORT_PROFILE_ITEMS = (
+    ("Final", "final"),
+    ("Preview (half resolution, no padding)", "preview"),
+)
 
 
 class Painter2UEAction(QtWidgets.QAction):
@@ -26,6 +35,12 @@ class Painter2UEAction(QtWidgets.QAction):
         self.setShortcut(QtGui.QKeySequence("Ctrl+Shift+u"))
 
 
+class _NodesNotifier(QObject):
+    """Forward node discovery from the discovery thread to the Qt main thread."""
+
+    nodes_changed = Signal()
+
+
 class Painter2UEWidget(QtWidgets.QWidget):
     """UI for the Substance Painter to UE plugin."""
 
@@ -51,9 +66,15 @@ class Painter2UEWidget(QtWidgets.QWidget):
         self.set_nodes_list()
         self.node_selector.activated.connect(self.on_node_change)
         ue_node_hlay.addWidget(self.node_selector)
+        # fill the combobox as soon as nodes are discovered
+        self._nodes_notifier = _NodesNotifier()
+        self._nodes_notifier.nodes_changed.connect(self.set_nodes_list)
+        self.remote_ue.add_nodes_changed_callback(
+            lambda nodes: self._nodes_notifier.nodes_changed.emit()
+        )
         # refresh btn
         refresh_btn = QtWidgets.QToolButton()
-        refresh_btn.clicked.connect(self.set_nodes_list())
+        refresh_btn.clicked.connect(self.set_nodes_list)
         refresh_icon = get_icon("refresh")
         refresh_btn.setIcon(QtGui.QIcon(refresh_icon))
         ue_node_hlay.addWidget(refresh_btn)
@@ -62,13 +83,36 @@ class Painter2UEWidget(QtWidgets.QWidget):
         preset_lay = QtWidgets.QVBoxLayout()
         preset_lay.addWidget(QtWidgets.QLabel("Select the export preset:"))
         self.preset_selector = QtWidgets.QComboBox()
-        # TODO:
-        # Can we get the preset list dynamically ?
-        self.preset_selector.addItem("Unreal Engine 4 (Packed)")
-        self.preset_selector.addItem("Unreal Engine 4 SSS (Packed)")
+        self.set_presets_list()
         self.preset_selector.activated.connect(self.on_preset_change)
+        # fill the combobox once the presets are searched
+        painter2ue.preset_index.changed.connect(self.set_presets_list)
         preset_lay.addWidget(self.preset_selector)
         main_vlay.addLayout(preset_lay)
+        # Export profile
+        profile_lay = QtWidgets.QHBoxLayout()
+        profile_lay.addWidget(QtWidgets.QLabel("Quality:"))
+        self.profile_selector = QtWidgets.QComboBox()
+        self.profile_selector.setToolTip(
+            "A preview exports faster and sends a quarter of the pixels, a final"
+            " send then replaces the preview textures in Unreal."
+        )
+        for label, profile in EXPORT_PROFILE_ITEMS:
+            self.profile_selector.addItem(label, profile)
+        self.set_current_profile()
+        self.profile_selector.activated.connect(self.on_profile_change)
+        profile_lay.addWidget(self.profile_selector)
+        main_vlay.addLayout(profile_lay)
+        self.all_texture_sets_check = QtWidgets.QCheckBox("Export every texture set")
+        self.all_texture_sets_check.setToolTip(
+            "Export each texture set on its own and import it while the next one"
+            " exports. Otherwise only the active texture set is exported."
+        )
+        self.all_texture_sets_check.setChecked(
+            self.settings.value("export_all_texture_sets", False, type=bool)
+        )
+        self.all_texture_sets_check.toggled.connect(self.on_all_texture_sets_toggled)
+        main_vlay.addWidget(self.all_texture_sets_check)
 
         # Export Path
         export_path_lay = QtWidgets.QHBoxLayout()
@@ -81,6 +125,21 @@ class Painter2UEWidget(QtWidgets.QWidget):
         browse_btn.clicked.connect(self.on_browse_clicked)
         export_path_lay.addWidget(browse_btn)
         main_vlay.addLayout(export_path_lay)
+        self.ram_disk_check = QtWidgets.QCheckBox(
+            "Export to RAM disk when Unreal is on this computer"
+        )
+        self.ram_disk_check.setToolTip(
+            "RAM disk: {0}".format(self.settings.value("ram_disk_path") or "none")
+        )
+        self.ram_disk_check.setEnabled(bool(self.settings.value("ram_disk_path")))
+        self.ram_disk_check.setChecked(
+            self.settings.value("use_ram_disk", True, type=bool)
+        )
+        self.ram_disk_check.toggled.connect(self.on_ram_disk_toggled)
+        main_vlay.addWidget(self.ram_disk_check)
+        clear_cache_btn = QtWidgets.QPushButton("Re-import all textures on next send")
+        clear_cache_btn.clicked.connect(painter2ue.clear_texture_cache)
+        main_vlay.addWidget(clear_cache_btn)
 
         # Asset Name
         asset_name_lay = QtWidgets.QHBoxLayout()
@@ -100,6 +159,19 @@ class Painter2UEWidget(QtWidgets.QWidget):
         ue_content_lay.addWidget(self.ue_content_edit)
         main_vlay.addLayout(ue_content_lay)
 
+        # Parent material of the material instances
+        parent_material_lay = QtWidgets.QHBoxLayout()
+        parent_material_lay.addWidget(QtWidgets.QLabel("Parent Material:"))
+        self.parent_material_edit = QtWidgets.QLineEdit()
+        self.parent_material_edit.setPlaceholderText("No material instance")
+        self.parent_material_edit.setToolTip(
+            "Create a material instance of this material for each texture set"
+        )
+        self.parent_material_edit.setText(self.settings.value("parent_material"))
+        self.parent_material_edit.textChanged.connect(self.on_parent_material_changed)
+        parent_material_lay.addWidget(self.parent_material_edit)
+        main_vlay.addLayout(parent_material_lay)
+
         # Export
         export_btn = QtWidgets.QPushButton("Send to UE")
         ue_icon = get_icon("ue")
@@ -107,6 +179,68 @@ class Painter2UEWidget(QtWidgets.QWidget):
         export_btn.clicked.connect(painter2ue.send2ue)
         main_vlay.addWidget(export_btn)
 
+        # Live Link
+        live_link_lay = QtWidgets.QHBoxLayout()
+        self.live_link_check = QtWidgets.QCheckBox("Send changes automatically")
+        self.live_link_check.setChecked(painter2ue.live_link.is_enabled())
+        self.live_link_check.toggled.connect(self.on_live_link_toggled)
+        live_link_lay.addWidget(self.live_link_check)
+        self.debounce_spin = QtWidgets.QSpinBox()
+        self.debounce_spin.setRange(100, 60000)
+        self.debounce_spin.setSingleStep(100)
+        self.debounce_spin.setSuffix(" ms")
+        self.debounce_spin.setToolTip("Wait this long without change before sending.")
+        self.debounce_spin.setValue(
+            self.settings.value("live_link_debounce", DEFAULT_DEBOUNCE_MS, type=int)
+        )
+        self.debounce_spin.valueChanged.connect(self.on_debounce_changed)
+        live_link_lay.addWidget(self.debounce_spin)
+        main_vlay.addLayout(live_link_lay)
+
+        # Send Progress
+        progress_lay = QtWidgets.QHBoxLayout()
+        self.progress_bar = QtWidgets.QProgressBar()
+        self.progress_bar.setTextVisible(True)
+        self.progress_bar.setFormat("Idle")
+        progress_lay.addWidget(self.progress_bar)
+        self.cancel_btn = QtWidgets.QPushButton("Cancel")
+        self.cancel_btn.setEnabled(False)
+        self.cancel_btn.clicked.connect(painter2ue.pipeline.cancel)
+        progress_lay.addWidget(self.cancel_btn)
+        main_vlay.addLayout(progress_lay)
+        painter2ue.pipeline.progress.connect(self.on_send_progress)
+        painter2ue.pipeline.running_changed.connect(self.on_send_running_changed)
+        painter2ue.pipeline.finished.connect(self.on_send_finished)
+        painter2ue.pipeline.failed.connect(self.on_send_failed)
+        painter2ue.pipeline.cancelled.connect(self.on_send_cancelled)
+
+        # Send statistics
+        stats_lay = QtWidgets.QHBoxLayout()
+        self.stats_check = QtWidgets.QCheckBox("Show timings")
+        self.stats_check.setToolTip("Time spent in each step of the last sends.")
+        self.stats_check.toggled.connect(self.on_stats_toggled)
+        stats_lay.addWidget(self.stats_check)
+        stats_lay.addStretch()
+        save_trace_btn = QtWidgets.QPushButton("Save Trace...")
+        save_trace_btn.setToolTip(
+            "Save the timings as a Chrome trace, to open in chrome://tracing or"
+            " ui.perfetto.dev"
+        )
+        save_trace_btn.clicked.connect(self.on_save_trace_clicked)
+        stats_lay.addWidget(save_trace_btn)
+        clear_stats_btn = QtWidgets.QPushButton("Clear")
+        clear_stats_btn.clicked.connect(self.on_clear_stats_clicked)
+        stats_lay.addWidget(clear_stats_btn)
+        main_vlay.addLayout(stats_lay)
+        self.stats_edit = QtWidgets.QPlainTextEdit()
+        self.stats_edit.setReadOnly(True)
+        self.stats_edit.setLineWrapMode(QtWidgets.QPlainTextEdit.NoWrap)
+        self.stats_edit.setFont(
+            QtGui.QFontDatabase.systemFont(QtGui.QFontDatabase.FixedFont)
+        )
+        self.stats_edit.setVisible(False)
+        main_vlay.addWidget(self.stats_edit)
+
         # Vertical Spacer
         main_vlay.addStretch()
 
@@ -117,24 +251,104 @@ class Painter2UEWidget(QtWidgets.QWidget):
         if len(nodes) == 0:
             self.node_selector.addItem("No Unreal found.")
         else:
-            idx = 0
-            for node in nodes:
+            selected_id = self.remote_ue.selected_node.get("node_id")
+            selected_idx = 0
+            for idx, node in enumerate(nodes):
                 self.node_selector.addItem(
                     "Project: {0} - ({1})".format(
                         node.get("project_name"), node.get("node_id")
                     )
                 )
                 self.node_selector.setItemData(idx, node)
-            # first node will be selected by default
-            self.remote_ue.selected_node = nodes[0]
+                if node.get("node_id") == selected_id:
+                    selected_idx = idx
+            current_idx = selected_idx
+            if len(nodes) > 1:
+                self.node_selector.addItem(ALL_NODES_ITEM)
+                if self.remote_ue.send_to_all_nodes:
+                    current_idx = len(nodes)
+            # keep the current node, the first one is selected by default
+            self.node_selector.setCurrentIndex(current_idx)
+            self.remote_ue.selected_node = nodes[selected_idx]
 
     def on_node_change(self, index):
         """Set the selected node to the RemoteUnrealCommand."""
-        self.remote_ue.selected_node = self.node_selector.currentData()
+        send_to_all_nodes = self.node_selector.currentText() == ALL_NODES_ITEM
+        self.settings.setValue("send_to_all_nodes", send_to_all_nodes)
+        self.remote_ue.send_to_all_nodes = send_to_all_nodes
+        if not send_to_all_nodes:
+            self.remote_ue.selected_node = self.node_selector.currentData()
+
+    def set_presets_list(self) -> None:
+        """Set the list of the known export presets in combobox."""
+        self.preset_selector.clear()
+        selected = self.settings.value("export_preset")
+        presets = self.painter2ue.preset_index.presets()
+        names = [preset["name"] for preset in presets]
+        selected_idx = -1
+        for idx, preset in enumerate(presets):
+            label = preset["name"]
+            if names.count(label) > 1:
+                # same name in several libraries
+                label = "{0} ({1})".format(label, preset["context"])
+            self.preset_selector.addItem(label, preset["url"])
+            if selected_idx < 0 and selected in (preset["url"], preset["name"]):
+                selected_idx = idx
+        if selected_idx < 0:
+            # not searched yet, or missing from the shelves
+            self.preset_selector.addItem(selected, selected)
+            selected_idx = len(presets)
+        self.preset_selector.setCurrentIndex(selected_idx)
 
     def on_preset_change(self, index):
         """Set the export preset."""
-        self.painter2ue.selected_preset = self.preset_selector.currentText()
+        self.settings.setValue("export_preset", self.preset_selector.currentData())
+
+    def set_current_profile(self) -> None:
+        """Select the export profile of the settings in combobox."""
+        profiles = [profile for _, profile in EXPORT_PROFILE_ITEMS]
+        profile = self.settings.value("export_profile")
+        self.profile_selector.setCurrentIndex(
+            profiles.index(profile) if profile in profiles else 0
+        )
+
+    def on_profile_change(self, index):
+        """Set the export profile."""
+        self.settings.setValue("export_profile", self.profile_selector.currentData())
+
+    def on_all_texture_sets_toggled(self, checked: bool) -> None:
+        """Export every texture set or only the active one.
+
+        :param checked: True to export every texture set
+        :type checked: bool
+        """
+        self.settings.setValue("export_all_texture_sets", checked)
+
+    def on_live_link_toggled(self, checked: bool) -> None:
+        """Send the changes automatically or not.
+
+        :param checked: True to send the changes automatically
+        :type checked: bool
+        """
+        self.settings.setValue("live_link", checked)
+        self.painter2ue.live_link.set_enabled(checked)
+
+    def on_debounce_changed(self, value: int) -> None:
+        """Set the time to wait without change before sending.
+
+        :param value: debounce window in milliseconds
+        :type value: int
+        """
+        self.settings.setValue("live_link_debounce", value)
+        self.painter2ue.live_link.set_debounce(value)
+
+    def on_ram_disk_toggled(self, checked: bool) -> None:
+        """Export to the RAM disk when Unreal is local or not.
+
+        :param checked: True to use the RAM disk
+        :type checked: bool
+        """
+        self.settings.setValue("use_ram_disk", checked)
 
     def on_browse_clicked(self) -> None:
         """Browse folder to select export path."""
@@ -168,11 +382,109 @@ class Painter2UEWidget(QtWidgets.QWidget):
         """
         self.settings.setValue("unreal_content_path", text)
 
+    def on_parent_material_changed(self, text: str) -> None:
+        """Parent material was changed in text edit.
+
+        :param text: new text value
+        :type text: str
+        """
+        self.settings.setValue("parent_material", text)
+
+    def on_send_progress(self, stage: str, done: int, total: int) -> None:
+        """Display the progress of the running send.
+
+        :param stage: name of the current stage
+        :type stage: str
+        :param done: number of steps done in this stage
+        :type done: int
+        :param total: number of steps of this stage
+        :type total: int
+        """
+        self.progress_bar.setMaximum(max(total, 1))
+        self.progress_bar.setValue(done)
+        self.progress_bar.setFormat("{0}: %v/%m".format(stage.capitalize()))
+
+    def on_send_running_changed(self, running: bool) -> None:
+        """Enable the cancel button while a send is running.
+
+        :param running: True if a send is running
+        :type running: bool
+        """
+        self.cancel_btn.setEnabled(running)
+
+    def on_send_finished(self, results: list) -> None:
+        """Display a successful send, with the number of failed textures.
+
+        :param results: the result of each exported job
+        :type results: list
+        """
+        failed = 0
+        for result in results:
+            for node_result in result["nodes"]:
+                if node_result["error"]:
+                    failed += 1
+                for item in node_result["assets"] + node_result["materials"]:
+                    if item["error"]:
+                        failed += 1
+        if failed:
+            self._set_send_status("Done, {0} failure(s)".format(failed))
+        else:
+            self._set_send_status("Done")
+
+    def on_send_failed(self, message: str) -> None:
+        """Display a failed send."""
+        self._set_send_status("Failed")
+
+    def on_send_cancelled(self) -> None:
+        """Display a cancelled send."""
+        self._set_send_status("Cancelled")
+
+    def _set_send_status(self, status: str) -> None:
+        """Display the outcome of the last send.
+
+        :param status: text to display
+        :type status: str
+        """
+        self.progress_bar.setMaximum(1)
+        self.progress_bar.setValue(1)
+        self.progress_bar.setFormat(status)
+        self.set_stats()
+
+    def set_stats(self) -> None:
+        """Display the time spent in each step of the sends, if shown."""
+        if self.stats_check.isChecked():
+            self.stats_edit.setPlainText(trace.format_stats())
+
+    def on_stats_toggled(self, checked: bool) -> None:
+        """Show the timings or not.
+
+        :param checked: True to show the timings
+        :type checked: bool
+        """
+        self.stats_edit.setVisible(checked)
+        self.set_stats()
+
+    def on_save_trace_clicked(self) -> None:
+        """Browse a file to save the timings to, as a Chrome trace."""
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(
+            self, "Save Trace", "sp2ue_trace.json", "Chrome Trace (*.json)"
+        )
+        if path:
+            trace.TRACER.save_chrome_trace(path)
+
+    def on_clear_stats_clicked(self) -> None:
+        """Forget the timings of the previous sends."""
+        trace.TRACER.clear()
+        self.set_stats()
+
     def update(self) -> None:
         """Update UI."""
         self.folder_path_edit.setText(self.settings.value("export_path"))
         self.asset_name_edit.setText(self.settings.value("asset_name"))
         self.ue_content_edit.setText(self.settings.value("unreal_content_path"))
+        self.parent_material_edit.setText(self.settings.value("parent_material"))
+        self.set_presets_list()
+        self.set_current_profile()
 
 
 def get_icon(icon_name: str) -> str:
@@ -1,2 +1,6 @@
 """Unreal Communication Package."""
-from .unreal import RemoteUECommand  # noqa
+from . import trace  # noqa
+from .remote_execution import RemoteExecutionConfig  # noqa
+from .remote_execution_async import AsyncRemoteExecution  # noqa
+from .unreal import RemoteUECommand, get_remote_execution_config  # noqa
+from .upload import ChunkedUploader  # noqa
@@ -2,11 +2,17 @@
 
 import json as _json
 import logging as _logging
+import select as _select
+import selectors as _selectors
 import socket as _socket
+import struct as _struct
 import sys as _sys
 import threading as _threading
 import time as _time
 import uuid as _uuid
+import zlib as _zlib
+
+from . import trace as _trace
 
 # Protocol constants (see PythonScriptRemoteExecution.cpp for the full protocol definition)
 _PROTOCOL_VERSION = 1  # Protocol version number
@@ -37,7 +43,35 @@ DEFAULT_COMMAND_ENDPOINT = (
     "127.0.0.1",
     6776,
 )  # The endpoint tuple for the TCP command connection hosted by this client (that the remote client will connect to)
-DEFAULT_RECEIVE_BUFFER_SIZE = 8192  # The default receive buffer size
+DEFAULT_RECEIVE_BUFFER_SIZE = 65536  # The default receive buffer size
+DEFAULT_MAX_MESSAGE_SIZE = (
+    64 * 1024 * 1024
+)  # The maximum size of a message received over the TCP command connection
+DEFAULT_ACCEPT_TIMEOUT = 30  # Number of seconds to wait for the remote party to attempt the command socket connection
+DEFAULT_CHECK_TIMEOUT = (
+    2  # Number of seconds to wait for the answer to a command connection health check
+)
+
+# Message encodings, only used with remote nodes advertising them in their "pong" (stock UE4 only speaks plain JSON)
+ENCODING_ZLIB = "zlib"  # The UTF-8 JSON is compressed with zlib, in a frame holding its size (see `_encode_json_bytes`)
+DEFAULT_ENCODINGS = (
+    ENCODING_ZLIB,
+)  # The encodings accepted by this session, in order of preference
+DEFAULT_COMPRESS_MIN_SIZE = (
+    16 * 1024
+)  # Messages smaller than this number of bytes are sent as plain JSON, compressing them saves less than it costs
+_ZLIB_LEVEL = (
+    1  # zlib compression level, the fastest one still shrinks JSON about 10 times
+)
+_ZLIB_FRAME_MAGIC = (
+    b"\x00Z"  # Start of a zlib frame, a JSON document cannot start with it
+)
+_ZLIB_FRAME_HEADER = _struct.Struct(
+    ">2sI"
+)  # Header of a zlib frame: the magic and the size of the compressed data that follows
+_JSON_WHITESPACE = (
+    b" \t\r\n"  # Bytes allowed after the closing brace of a JSON document
+)
 
 # Execution modes (these must match the names given to LexToString for EPythonCommandExecutionMode in IPythonScriptPlugin.h)
 MODE_EXEC_FILE = "ExecuteFile"  # Execute the Python command as a file. This allows you to execute either a literal Python script containing multiple statements, or a file with optional arguments
@@ -55,6 +89,15 @@ class RemoteExecutionConfig(object):
         self.multicast_group_endpoint = DEFAULT_MULTICAST_GROUP_ENDPOINT
         self.multicast_bind_address = DEFAULT_MULTICAST_BIND_ADDRESS
         self.command_endpoint = DEFAULT_COMMAND_ENDPOINT
+        self.max_message_size = DEFAULT_MAX_MESSAGE_SIZE
+        self.encodings = DEFAULT_ENCODINGS
+        self.compress_min_size = DEFAULT_COMPRESS_MIN_SIZE
+
+
+class CommandNotSentError(ConnectionError):
+    """
+    The command connection failed before a command was fully sent, so the remote party did not run it and it can be sent again on a new connection.
+    """
 
 
 class RemoteExecution(object):
@@ -68,8 +111,11 @@ class RemoteExecution(object):
     def __init__(self, config=RemoteExecutionConfig()):
         self._config = config
         self._broadcast_connection = None
-        self._command_connection = None
+        self._command_connections = {}
+        self._command_connections_lock = _threading.Lock()
+        self._opening_command_connections = 0
         self._node_id = str(_uuid.uuid4())
+        self._nodes_changed_callbacks = []
 
     @property
     def remote_nodes(self):
@@ -85,75 +131,256 @@ class RemoteExecution(object):
             else []
         )
 
+    def add_nodes_changed_callback(self, callback):
+        """
+        Register a callback to run whenever a remote "node" is found or lost. The callback is run from the discovery thread.
+
+        Args:
+            callback (callable): Called with the current list of remote nodes (see `remote_nodes`).
+        """
+        self._nodes_changed_callbacks.append(callback)
+
+    def wait_for_nodes(self, timeout=None):
+        """
+        Block until at least one remote "node" has been discovered, returning as soon as its first "pong" is received.
+
+        Args:
+            timeout (float): The maximum number of seconds to wait, or None to wait forever.
+
+        Returns:
+            bool: True if a remote node is available, False if the timeout expired first.
+        """
+        if not self._broadcast_connection:
+            return False
+        return self._broadcast_connection.wait_for_nodes(timeout)
+
     def start(self):
         """
         Start the remote execution session. This will begin the discovey process for remote "nodes" (UE4 instances running Python).
         """
         self._broadcast_connection = _RemoteExecutionBroadcastConnection(
-            self._config, self._node_id
+            self._config, self._node_id, self._on_nodes_changed
         )
         self._broadcast_connection.open()
 
     def stop(self):
         """
-        Stop the remote execution session. This will end the discovey process for remote "nodes" (UE4 instances running Python), and close any open command connection.
+        Stop the remote execution session. This will end the discovey process for remote "nodes" (UE4 instances running Python), and close any open command connections.
         """
         self.close_command_connection()
         if self._broadcast_connection:
             self._broadcast_connection.close()
             self._broadcast_connection = None
 
-    def has_command_connection(self):
+    def has_command_connection(self, remote_node_id=None):
         """
         Check whether the remote execution session has an active command connection.
 
+        Args:
+            remote_node_id (string): The ID of the remote node to check, or None to check for any remote node.
+
         Returns:
             bool: True if the remote execution session has an active command connection, False otherwise.
         """
-        return self._command_connection is not None
+        with self._command_connections_lock:
+            if remote_node_id is None:
+                return bool(self._command_connections)
+            return remote_node_id in self._command_connections
+
+    @property
+    def command_connection_node_id(self):
+        """
+        Get the ID of the remote "node" the command connection is open with (the oldest one if several are open).
+
+        Returns:
+            string: The ID of the remote node, or None if there is no active command connection.
+        """
+        node_ids = self.command_connection_node_ids
+        return node_ids[0] if node_ids else None
+
+    @property
+    def command_connection_node_ids(self):
+        """
+        Get the IDs of the remote "nodes" a command connection is open with.
 
-    def open_command_connection(self, remote_node_id):
+        Returns:
+            list: The IDs of the remote nodes, oldest connection first.
+        """
+        with self._command_connections_lock:
+            return list(self._command_connections)
+
+    def open_command_connection(
+        self,
+        remote_node_id,
+        accept_timeout=DEFAULT_ACCEPT_TIMEOUT,
+        exclusive=True,
+        encodings=None,
+    ):
         """
         Open a command connection to the given remote "node" (a UE4 instance running Python), closing any command connection that may currently be open.
 
+        Several command connections can be kept open at once, one per remote node, by opening them with `exclusive` set to False. Each of them listens on its own port: the first one uses the configured command endpoint and the other ones a port chosen by the system.
+
         Args:
             remote_node_id (string): The ID of the remote node (this can be obtained by querying `remote_nodes`).
+            accept_timeout (float): The number of seconds to wait for the remote node to connect.
+            exclusive (bool): True to close the command connections to every remote node, False to only close the one to this remote node.
+            encodings (tuple): The message encodings to negotiate with the remote node, or None to use the configured ones.
         """
-        self._command_connection = _RemoteExecutionCommandConnection(
-            self._config, self._node_id, remote_node_id
+        if exclusive:
+            self.close_command_connection()
+        else:
+            self.close_command_connection(remote_node_id)
+        with self._command_connections_lock:
+            # only one connection at a time can listen on the configured port
+            command_endpoint = None
+            if self._command_connections or self._opening_command_connections:
+                command_endpoint = (self._config.command_endpoint[0], 0)
+            self._opening_command_connections += 1
+        remote_node = next(
+            (n for n in self.remote_nodes if n["node_id"] == remote_node_id), {}
         )
-        self._command_connection.open(self._broadcast_connection)
+        try:
+            command_connection = _RemoteExecutionCommandConnection(
+                self._config,
+                self._node_id,
+                remote_node_id,
+                command_endpoint,
+                _negotiate_encoding(
+                    self._config.encodings if encodings is None else encodings,
+                    remote_node,
+                ),
+            )
+            try:
+                with _trace.span("open_command_connection"):
+                    command_connection.open(self._broadcast_connection, accept_timeout)
+            except Exception:
+                command_connection.close(self._broadcast_connection)
+                raise
+        finally:
+            with self._command_connections_lock:
+                self._opening_command_connections -= 1
+        with self._command_connections_lock:
+            self._command_connections[remote_node_id] = command_connection
+
+    def check_command_connection(
+        self, timeout=DEFAULT_CHECK_TIMEOUT, remote_node_id=None
+    ):
+        """
+        Check that the command connection is still alive by running a no-op command, closing it if the remote party does not answer.
+
+        Args:
+            timeout (float): The number of seconds to wait for the remote party to answer.
+            remote_node_id (string): The ID of the remote node to check, or None to check every command connection.
 
-    def close_command_connection(self):
+        Returns:
+            bool: True if the command connection is alive, False otherwise.
+        """
+        if remote_node_id is None:
+            node_ids = self.command_connection_node_ids
+            alive = [self.check_command_connection(timeout, n) for n in node_ids]
+            return bool(alive) and all(alive)
+        command_connection = self._get_command_connection(remote_node_id)
+        if not command_connection:
+            return False
+        try:
+            command_connection.run_command(
+                "None", True, MODE_EVAL_STATEMENT, timeout=timeout
+            )
+            return True
+        except Exception as e:
+            _logger.debug("Command connection check failed: {0}".format(str(e)))
+            self.close_command_connection(remote_node_id)
+            return False
+
+    def close_command_connection(self, remote_node_id=None):
         """
         Close any command connection that may currently be open.
+
+        Args:
+            remote_node_id (string): The ID of the remote node to close the command connection with, or None to close every command connection.
         """
-        if self._command_connection:
-            self._command_connection.close(self._broadcast_connection)
-            self._command_connection = None
+        with self._command_connections_lock:
+            if remote_node_id is None:
+                command_connections = list(self._command_connections.values())
+                self._command_connections.clear()
+            else:
+                command_connection = self._command_connections.pop(remote_node_id, None)
+                command_connections = [command_connection] if command_connection else []
+        for command_connection in command_connections:
+            command_connection.close(self._broadcast_connection)
 
     def run_command(
-        self, command, unattended=True, exec_mode=MODE_EXEC_FILE, raise_on_failure=False
+        self,
+        command,
+        unattended=True,
+        exec_mode=MODE_EXEC_FILE,
+        raise_on_failure=False,
+        remote_node_id=None,
     ):
         """
         Run a command remotely based on the current command connection.
 
+        Commands sent to different remote nodes can run concurrently from different threads.
+
         Args:
             command (string): The Python command to run remotely.
             unattended (bool): True to run this command in "unattended" mode (suppressing some UI).
             exec_mode (string): The execution mode to use as a string value (must be one of MODE_EXEC_FILE, MODE_EXEC_STATEMENT, or MODE_EVAL_STATEMENT).
             raise_on_failure (bool): True to raise a RuntimeError if the command fails on the remote target.
+            remote_node_id (string): The ID of the remote node to run the command on, or None to use the oldest command connection.
 
         Returns:
             dict: The result from running the remote command (see `command_result` from the protocol definition).
         """
-        data = self._command_connection.run_command(command, unattended, exec_mode)
+        if remote_node_id is None:
+            remote_node_id = self.command_connection_node_id
+        command_connection = self._get_command_connection(remote_node_id)
+        if not command_connection:
+            raise RuntimeError(
+                "No command connection is open with the remote node {0}!".format(
+                    remote_node_id
+                )
+            )
+        try:
+            data = command_connection.run_command(command, unattended, exec_mode)
+        except Exception:
+            # the connection is dead or out of step with the remote party, the next command opens a new one
+            with self._command_connections_lock:
+                if self._command_connections.get(remote_node_id) is command_connection:
+                    del self._command_connections[remote_node_id]
+            command_connection.close(self._broadcast_connection)
+            raise
         if raise_on_failure and not data["success"]:
             raise RuntimeError(
                 "Remote Python Command failed! {0}".format(data["result"])
             )
         return data
 
+    def _get_command_connection(self, remote_node_id):
+        """
+        Get the command connection open with the given remote "node".
+
+        Args:
+            remote_node_id (string): The ID of the remote node.
+
+        Returns:
+            _RemoteExecutionCommandConnection: The command connection, or None if there is none.
+        """
+        with self._command_connections_lock:
+            return self._command_connections.get(remote_node_id)
+
+    def _on_nodes_changed(self):
+        """
+        Notify the registered callbacks that the set of remote "nodes" changed.
+        """
+        remote_nodes = self.remote_nodes
+        for callback in list(self._nodes_changed_callbacks):
+            try:
+                callback(remote_nodes)
+            except Exception as e:
+                _logger.error("Remote node callback failed: {0}".format(str(e)))
+
 
 class _RemoteExecutionNode(object):
     """
@@ -178,17 +405,31 @@ class _RemoteExecutionNode(object):
         Returns:
             bool: True of the node has exceeded the timeout limit (`_NODE_TIMEOUT_SECONDS`), False otherwise.
         """
-        return (self._last_pong + _NODE_TIMEOUT_SECONDS) < _time_now(now)
+        return self.timeout_deadline() <= _time_now(now)
+
+    def timeout_deadline(self):
+        """
+        Get the timestamp at which this remote node will be considered timed-out if it does not answer again.
+
+        Returns:
+            float: The timeout timestamp.
+        """
+        return self._last_pong + _NODE_TIMEOUT_SECONDS
 
 
 class _RemoteExecutionBroadcastNodes(object):
     """
     A thread-safe set of remote execution "nodes" (UE4 instances running Python).
+
+    Args:
+        on_changed (callable): Called without arguments whenever a node is found or lost.
     """
 
-    def __init__(self):
+    def __init__(self, on_changed=None):
         self._remote_nodes = {}
         self._remote_nodes_lock = _threading.RLock()
+        self._on_changed = on_changed
+        self._has_nodes = _threading.Event()
 
     @property
     def remote_nodes(self):
@@ -206,6 +447,18 @@ class _RemoteExecutionBroadcastNodes(object):
                 remote_nodes_list.append(remote_node_data)
             return remote_nodes_list
 
+    def wait_for_nodes(self, timeout=None):
+        """
+        Block until at least one remote node is known.
+
+        Args:
+            timeout (float): The maximum number of seconds to wait, or None to wait forever.
+
+        Returns:
+            bool: True if a remote node is available, False if the timeout expired first.
+        """
+        return self._has_nodes.wait(timeout)
+
     def update_remote_node(self, node_id, node_data, now=None):
         """
         Update a remote node, replacing any existing data.
@@ -217,9 +470,26 @@ class _RemoteExecutionBroadcastNodes(object):
         """
         now = _time_now(now)
         with self._remote_nodes_lock:
-            if node_id not in self._remote_nodes:
+            found = node_id not in self._remote_nodes
+            if found:
                 _logger.debug("Found Node {0}: {1}".format(node_id, node_data))
             self._remote_nodes[node_id] = _RemoteExecutionNode(node_data, now)
+            self._has_nodes.set()
+        if found and self._on_changed:
+            self._on_changed()
+
+    def next_timeout_deadline(self):
+        """
+        Get the earliest timestamp at which a remote node will be considered timed-out.
+
+        Returns:
+            float: The timeout timestamp, or None if there is no remote node.
+        """
+        with self._remote_nodes_lock:
+            deadlines = [
+                node.timeout_deadline() for node in self._remote_nodes.values()
+            ]
+        return min(deadlines) if deadlines else None
 
     def timeout_remote_nodes(self, now=None):
         """
@@ -229,11 +499,17 @@ class _RemoteExecutionBroadcastNodes(object):
             now (float): The current timestamp.
         """
         now = _time_now(now)
+        lost = False
         with self._remote_nodes_lock:
             for node_id, node in list(self._remote_nodes.items()):
                 if node.should_timeout(now):
                     _logger.debug("Lost Node {0}: {1}".format(node_id, node.data))
                     del self._remote_nodes[node_id]
+                    lost = True
+            if not self._remote_nodes:
+                self._has_nodes.clear()
+        if lost and self._on_changed:
+            self._on_changed()
 
 
 class _RemoteExecutionBroadcastConnection(object):
@@ -243,15 +519,21 @@ class _RemoteExecutionBroadcastConnection(object):
     Args:
         config (RemoteExecutionConfig): Configuration controlling the connection settings.
         node_id (string): The ID of the local "node" (this session).
+        on_nodes_changed (callable): Called without arguments whenever a remote node is found or lost.
     """
 
-    def __init__(self, config, node_id):
+    def __init__(self, config, node_id, on_nodes_changed=None):
         self._config = config
         self._node_id = node_id
+        self._on_nodes_changed = on_nodes_changed
         self._nodes = None
         self._running = False
         self._broadcast_socket = None
         self._broadcast_listen_thread = None
+        # wakes the listen thread up when the connection closes
+        self._wakeup_sockets = None
+        # reused to parse every received message
+        self._received_message = _RemoteExecutionMessage(None, None)
 
     @property
     def remote_nodes(self):
@@ -263,13 +545,26 @@ class _RemoteExecutionBroadcastConnection(object):
         """
         return self._nodes.remote_nodes if self._nodes else []
 
+    def wait_for_nodes(self, timeout=None):
+        """
+        Block until at least one remote "node" has been discovered.
+
+        Args:
+            timeout (float): The maximum number of seconds to wait, or None to wait forever.
+
+        Returns:
+            bool: True if a remote node is available, False if the timeout expired first.
+        """
+        nodes = self._nodes
+        return nodes.wait_for_nodes(timeout) if nodes else False
+
     def open(self):
         """
         Open the UDP based messaging and discovery connection. This will begin the discovey process for remote "nodes" (UE4 instances running Python).
         """
         self._running = True
         self._last_ping = None
-        self._nodes = _RemoteExecutionBroadcastNodes()
+        self._nodes = _RemoteExecutionBroadcastNodes(self._on_nodes_changed)
         self._init_broadcast_socket()
         self._init_broadcast_listen_thread()
 
@@ -278,8 +573,18 @@ class _RemoteExecutionBroadcastConnection(object):
         Close the UDP based messaging and discovery connection. This will end the discovey process for remote "nodes" (UE4 instances running Python).
         """
         self._running = False
+        if self._wakeup_sockets:
+            try:
+                self._wakeup_sockets[1].send(b"\0")
+            except OSError:
+                pass
         if self._broadcast_listen_thread:
             self._broadcast_listen_thread.join()
+            self._broadcast_listen_thread = None
+        if self._wakeup_sockets:
+            for wakeup_socket in self._wakeup_sockets:
+                wakeup_socket.close()
+            self._wakeup_sockets = None
         if self._broadcast_socket:
             self._broadcast_socket.close()
             self._broadcast_socket = None
@@ -289,41 +594,11 @@ class _RemoteExecutionBroadcastConnection(object):
         """
         Initialize the UDP based broadcast socket based on the current configuration.
         """
-        self._broadcast_socket = _socket.socket(
-            _socket.AF_INET, _socket.SOCK_DGRAM, _socket.IPPROTO_UDP
-        )  # UDP/IP socket
-        if hasattr(_socket, "SO_REUSEPORT"):
-            self._broadcast_socket.setsockopt(
-                _socket.SOL_SOCKET, _socket.SO_REUSEPORT, 1
-            )
-        else:
-            self._broadcast_socket.setsockopt(
-                _socket.SOL_SOCKET, _socket.SO_REUSEADDR, 1
-            )
-        self._broadcast_socket.bind(
-            (
-                self._config.multicast_bind_address,
-                self._config.multicast_group_endpoint[1],
-            )
-        )
-        self._broadcast_socket.setsockopt(
-            _socket.IPPROTO_IP, _socket.IP_MULTICAST_LOOP, 1
-        )
-        self._broadcast_socket.setsockopt(
-            _socket.IPPROTO_IP, _socket.IP_MULTICAST_TTL, self._config.multicast_ttl
-        )
-        self._broadcast_socket.setsockopt(
-            _socket.IPPROTO_IP,
-            _socket.IP_MULTICAST_IF,
-            _socket.inet_aton(self._config.multicast_bind_address),
-        )
-        self._broadcast_socket.setsockopt(
-            _socket.IPPROTO_IP,
-            _socket.IP_ADD_MEMBERSHIP,
-            _socket.inet_aton(self._config.multicast_group_endpoint[0])
-            + _socket.inet_aton(self._config.multicast_bind_address),
-        )
-        self._broadcast_socket.settimeout(0.1)
+        self._broadcast_socket = _create_broadcast_socket(self._config)
+        self._broadcast_socket.setblocking(False)
+        self._wakeup_sockets = _socket.socketpair()
+        for wakeup_socket in self._wakeup_sockets:
+            wakeup_socket.setblocking(False)
 
     def _init_broadcast_listen_thread(self):
         """
@@ -337,24 +612,42 @@ class _RemoteExecutionBroadcastConnection(object):
 
     def _run_broadcast_listen_thread(self):
         """
-        Main loop for the listen thread that handles processing discovery messages.
+        Main loop for the listen thread that handles processing discovery messages. The thread sleeps until data is received, the next "ping" is due, a remote node may time out, or the connection closes.
         """
-        while self._running:
-            # Receive and process all pending data
-            while True:
-                try:
-                    data = self._broadcast_socket.recv(DEFAULT_RECEIVE_BUFFER_SIZE)
-                except _socket.timeout:
-                    data = None
-                if data:
-                    self._handle_data(data)
-                else:
-                    break
-            # Run tick logic
-            now = _time_now()
-            self._broadcast_ping(now)
-            self._nodes.timeout_remote_nodes(now)
-            _time.sleep(0.1)
+        selector = _selectors.DefaultSelector()
+        selector.register(self._broadcast_socket, _selectors.EVENT_READ)
+        selector.register(self._wakeup_sockets[0], _selectors.EVENT_READ)
+        try:
+            while self._running:
+                # Run tick logic
+                now = _time_now()
+                self._broadcast_ping(now)
+                self._nodes.timeout_remote_nodes(now)
+                # Sleep until the next deadline, or until woken up
+                deadline = self._last_ping + _NODE_PING_SECONDS
+                timeout_deadline = self._nodes.next_timeout_deadline()
+                if timeout_deadline is not None:
+                    deadline = min(deadline, timeout_deadline)
+                for key, _ in selector.select(max(0.0, deadline - _time_now())):
+                    if key.fileobj is self._broadcast_socket:
+                        self._receive_pending_data()
+        finally:
+            selector.close()
+
+    def _receive_pending_data(self):
+        """
+        Receive and process all the data pending on the UDP broadcast socket.
+        """
+        while True:
+            try:
+                data = self._broadcast_socket.recv(DEFAULT_RECEIVE_BUFFER_SIZE)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                _logger.debug("Broadcast socket error: {0}".format(str(e)))
+                return
+            if data:
+                self._handle_data(data)
 
     def _broadcast_message(self, message):
         """
@@ -375,25 +668,27 @@ class _RemoteExecutionBroadcastConnection(object):
             now (float): The current timestamp.
         """
         now = _time_now(now)
-        if not self._last_ping or ((self._last_ping + _NODE_PING_SECONDS) < now):
+        if not self._last_ping or ((self._last_ping + _NODE_PING_SECONDS) <= now):
             self._last_ping = now
             self._broadcast_message(_RemoteExecutionMessage(_TYPE_PING, self._node_id))
 
-    def broadcast_open_connection(self, remote_node_id):
+    def broadcast_open_connection(self, remote_node_id, command_endpoint=None):
         """
         Broadcast an "open_connection" message over the UDP socket to be handled by the specified remote node.
 
         Args:
             remote_node_id (string): The ID of the remote node that we want to open a command connection with.
+            command_endpoint (tuple): The endpoint tuple the remote node should connect to, or None to use the configured command endpoint.
         """
+        command_endpoint = command_endpoint or self._config.command_endpoint
         self._broadcast_message(
             _RemoteExecutionMessage(
                 _TYPE_OPEN_CONNECTION,
                 self._node_id,
                 remote_node_id,
                 {
-                    "command_ip": self._config.command_endpoint[0],
-                    "command_port": self._config.command_endpoint[1],
+                    "command_ip": command_endpoint[0],
+                    "command_port": command_endpoint[1],
                 },
             )
         )
@@ -418,7 +713,7 @@ class _RemoteExecutionBroadcastConnection(object):
         Args:
             data (bytes): The raw bytes received from the socket.
         """
-        message = _RemoteExecutionMessage(None, None)
+        message = self._received_message
         if message.from_json_bytes(data):
             self._handle_message(message)
 
@@ -456,27 +751,56 @@ class _RemoteExecutionCommandConnection(object):
         config (RemoteExecutionConfig): Configuration controlling the connection settings.
         node_id (string): The ID of the local "node" (this session).
         remote_node_id (string): The ID of the remote "node" (the UE4 instance running Python).
+        command_endpoint (tuple): The endpoint tuple to listen on, or None to use the configured command endpoint (a port of 0 lets the system choose a free port).
+        encoding (string): The encoding negotiated with the remote node (see `_negotiate_encoding`), or None to only send plain JSON.
     """
 
-    def __init__(self, config, node_id, remote_node_id):
+    def __init__(
+        self, config, node_id, remote_node_id, command_endpoint=None, encoding=None
+    ):
         self._config = config
         self._node_id = node_id
         self._remote_node_id = remote_node_id
+        self._encoding = encoding
+        self._command_endpoint = command_endpoint or config.command_endpoint
         self._command_listen_socket = None
         self._command_channel_socket = (
             _socket.socket()
         )  # This type is only here to appease PyLint
+        self._receive_buffer = bytearray()
+        self._receive_chunk = memoryview(bytearray(DEFAULT_RECEIVE_BUFFER_SIZE))
+
+    @property
+    def remote_node_id(self):
+        """
+        Get the ID of the remote "node" of this command connection.
+
+        Returns:
+            string: The ID of the remote node.
+        """
+        return self._remote_node_id
+
+    @property
+    def encoding(self):
+        """
+        Get the encoding negotiated with the remote "node" of this command connection.
+
+        Returns:
+            string: The encoding, or None for plain JSON.
+        """
+        return self._encoding
 
-    def open(self, broadcast_connection):
+    def open(self, broadcast_connection, accept_timeout=DEFAULT_ACCEPT_TIMEOUT):
         """
         Open the TCP based command connection, and wait to accept the connection from the remote party.
 
         Args:
             broadcast_connection (_RemoteExecutionBroadcastConnection): The broadcast connection to send UDP based messages over.
+            accept_timeout (float): The number of seconds to wait for the remote party to connect.
         """
         self._nodes = _RemoteExecutionBroadcastNodes()
         self._init_command_listen_socket()
-        self._try_accept(broadcast_connection)
+        self._try_accept(broadcast_connection, accept_timeout)
 
     def close(self, broadcast_connection):
         """
@@ -493,7 +817,7 @@ class _RemoteExecutionCommandConnection(object):
             self._command_listen_socket.close()
             self._command_listen_socket = None
 
-    def run_command(self, command, unattended, exec_mode):
+    def run_command(self, command, unattended, exec_mode, timeout=None):
         """
         Run a command on the remote party.
 
@@ -501,25 +825,54 @@ class _RemoteExecutionCommandConnection(object):
             command (string): The Python command to run remotely.
             unattended (bool): True to run this command in "unattended" mode (suppressing some UI).
             exec_mode (string): The execution mode to use as a string value (must be one of MODE_EXEC_FILE, MODE_EXEC_STATEMENT, or MODE_EVAL_STATEMENT).
+            timeout (float): The number of seconds to wait for the remote party, or None to wait forever.
 
         Returns:
             dict: The result from running the remote command (see `command_result` from the protocol definition).
+
+        Raises:
+            CommandNotSentError: The connection failed before the command was fully sent.
         """
-        self._send_message(
-            _RemoteExecutionMessage(
-                _TYPE_COMMAND,
-                self._node_id,
-                self._remote_node_id,
-                {
-                    "command": command,
-                    "unattended": unattended,
-                    "exec_mode": exec_mode,
-                },
+        if self._is_closed_by_remote():
+            raise CommandNotSentError("The remote party closed the command connection!")
+        self._command_channel_socket.settimeout(timeout)
+        data = {
+            "command": command,
+            "unattended": unattended,
+            "exec_mode": exec_mode,
+        }
+        if self._encoding:
+            # let the remote node encode the result too
+            data["accept_encodings"] = [self._encoding]
+        try:
+            self._send_message(
+                _RemoteExecutionMessage(
+                    _TYPE_COMMAND, self._node_id, self._remote_node_id, data
+                )
             )
-        )
+        except OSError as e:
+            # a partly sent message is never run by the remote party
+            raise CommandNotSentError(
+                "Failed to send the command: {0}".format(str(e))
+            ) from e
         result = self._receive_message(_TYPE_COMMAND_RESULT)
         return result.data
 
+    def _is_closed_by_remote(self):
+        """
+        Check whether the remote party closed the TCP socket since the last command, without waiting.
+
+        Returns:
+            bool: True if the socket is closed or reset, False if it looks alive.
+        """
+        try:
+            if not _select.select([self._command_channel_socket], [], [], 0)[0]:
+                return False
+            # readable between two commands means closed, unless stray data is waiting
+            return not self._command_channel_socket.recv(1, _socket.MSG_PEEK)
+        except (OSError, ValueError):
+            return True
+
     def _send_message(self, message):
         """
         Send the given message over the TCP socket to the remote party.
@@ -527,7 +880,15 @@ class _RemoteExecutionCommandConnection(object):
         Args:
             message (_RemoteExecutionMessage): The message to send.
         """
-        self._command_channel_socket.sendall(message.to_json_bytes())
+        with _trace.span("socket.send") as span:
+            json_bytes = message.to_json_bytes()
+            data = _encode_json_bytes(
+                json_bytes, self._encoding, self._config.compress_min_size
+            )
+            self._command_channel_socket.sendall(data)
+            span.set(bytes=len(data), json_bytes=len(json_bytes))
+        _trace.count("bytes_sent", len(data))
+        _trace.count("json_bytes_sent", len(json_bytes))
 
     def _receive_message(self, expected_type):
         """
@@ -539,54 +900,86 @@ class _RemoteExecutionCommandConnection(object):
         Returns:
             The message that was received.
         """
-        data = self._command_channel_socket.recv(DEFAULT_RECEIVE_BUFFER_SIZE)
-        if data:
+        json_obj = self._receive_json()
+        if json_obj is not None:
             message = _RemoteExecutionMessage(None, None)
             if (
-                message.from_json_bytes(data)
+                message.from_json_obj(json_obj)
                 and message.passes_receive_filter(self._node_id)
                 and message.type_ == expected_type
             ):
                 return message
         raise RuntimeError("Remote party failed to send a valid response!")
 
+    def _receive_json(self):
+        """
+        Receive a complete JSON document over the TCP socket, accumulating as many chunks as needed.
+
+        Returns:
+            The decoded JSON object, or None if the remote party closed the connection before sending a complete document.
+        """
+        buffer = self._receive_buffer
+        del buffer[:]
+        # the span holds the wait for the remote party to run the command
+        with _trace.span("socket.receive") as span:
+            try:
+                while True:
+                    size = self._command_channel_socket.recv_into(self._receive_chunk)
+                    if not size:
+                        return None
+                    buffer += self._receive_chunk[:size]
+                    json_obj = _decode_json_buffer(
+                        buffer, self._config.max_message_size
+                    )
+                    if json_obj is not None:
+                        return json_obj
+            finally:
+                span.set(bytes=len(buffer))
+                _trace.count("bytes_received", len(buffer))
+                del buffer[:]
+
     def _init_command_listen_socket(self):
         """
         Initialize the TCP based command socket based on the current configuration, and set it to listen for an incoming connection.
         """
-        self._command_listen_socket = _socket.socket(
-            _socket.AF_INET, _socket.SOCK_STREAM, _socket.IPPROTO_TCP
-        )  # TCP/IP socket
-        if hasattr(_socket, "SO_REUSEPORT"):
-            self._command_listen_socket.setsockopt(
-                _socket.SOL_SOCKET, _socket.SO_REUSEPORT, 1
-            )
-        else:
-            self._command_listen_socket.setsockopt(
-                _socket.SOL_SOCKET, _socket.SO_REUSEADDR, 1
-            )
-        self._command_listen_socket.bind(self._config.command_endpoint)
-        self._command_listen_socket.listen(1)
+        self._command_listen_socket = _create_command_listen_socket(
+            self._command_endpoint
+        )
+        # advertise the port actually bound when the system chose it
+        self._command_endpoint = (
+            self._command_endpoint[0],
+            self._command_listen_socket.getsockname()[1],
+        )
         self._command_listen_socket.settimeout(5)
 
-    def _try_accept(self, broadcast_connection):
+    def _try_accept(self, broadcast_connection, timeout=DEFAULT_ACCEPT_TIMEOUT):
         """
-        Wait to accept a connection on the TCP based command connection. This makes 6 attempts to receive a connection, waiting for 5 seconds between each attempt (30 seconds total).
+        Wait to accept a connection on the TCP based command connection. This makes an attempt to receive a connection every 5 seconds until the timeout expires (30 seconds by default).
 
         Args:
             broadcast_connection (_RemoteExecutionBroadcastConnection): The broadcast connection to send UDP based messages over.
+            timeout (float): The total number of seconds to wait for the remote party to connect.
         """
-        for _n in range(6):
-            broadcast_connection.broadcast_open_connection(self._remote_node_id)
-            try:
-                self._command_channel_socket = self._command_listen_socket.accept()[0]
-                self._command_channel_socket.setblocking(True)
-                return
-            except _socket.timeout:
-                continue
-        raise RuntimeError(
-            "Remote party failed to attempt the command socket connection!"
-        )
+        with _trace.span("accept"):
+            deadline = _time_now() + timeout
+            while True:
+                remaining = deadline - _time_now()
+                if remaining <= 0:
+                    break
+                self._command_listen_socket.settimeout(min(5, remaining))
+                broadcast_connection.broadcast_open_connection(
+                    self._remote_node_id, self._command_endpoint
+                )
+                try:
+                    channel_socket = self._command_listen_socket.accept()[0]
+                    self._command_channel_socket = channel_socket
+                    self._command_channel_socket.setblocking(True)
+                    return
+                except _socket.timeout:
+                    continue
+            raise RuntimeError(
+                "Remote party failed to attempt the command socket connection!"
+            )
 
 
 class _RemoteExecutionMessage(object):
@@ -663,6 +1056,24 @@ class _RemoteExecutionMessage(object):
         """
         try:
             json_obj = _json.loads(json_str)
+        except Exception as e:
+            _logger.error(
+                'Failed to deserialize JSON "{0}": {1}'.format(json_str, str(e))
+            )
+            return False
+        return self.from_json_obj(json_obj)
+
+    def from_json_obj(self, json_obj):
+        """
+        Parse this message from its decoded JSON object.
+
+        Args:
+            json_obj (dict): The decoded JSON representation of this message.
+
+        Returns:
+            bool: True if this message could be parsed, False otherwise.
+        """
+        try:
             # Read and validate required protocol version information
             if json_obj["version"] != _PROTOCOL_VERSION:
                 raise ValueError(
@@ -686,7 +1097,7 @@ class _RemoteExecutionMessage(object):
             self.data = json_obj.get("data")
         except Exception as e:
             _logger.error(
-                'Failed to deserialize JSON "{0}": {1}'.format(json_str, str(e))
+                'Failed to deserialize JSON "{0}": {1}'.format(json_obj, str(e))
             )
             return False
         return True
@@ -705,6 +1116,165 @@ class _RemoteExecutionMessage(object):
         return self.from_json(json_str)
 
 
+def _create_broadcast_socket(config):
+    """
+    Create the UDP based broadcast socket, bound and joined to the multicast group of the given configuration.
+
+    Args:
+        config (RemoteExecutionConfig): Configuration controlling the connection settings.
+
+    Returns:
+        socket.socket: The UDP socket.
+    """
+    broadcast_socket = _socket.socket(
+        _socket.AF_INET, _socket.SOCK_DGRAM, _socket.IPPROTO_UDP
+    )  # UDP/IP socket
+    if hasattr(_socket, "SO_REUSEPORT"):
+        broadcast_socket.setsockopt(_socket.SOL_SOCKET, _socket.SO_REUSEPORT, 1)
+    else:
+        broadcast_socket.setsockopt(_socket.SOL_SOCKET, _socket.SO_REUSEADDR, 1)
+    broadcast_socket.bind(
+        (
+            config.multicast_bind_address,
+            config.multicast_group_endpoint[1],
+        )
+    )
+    broadcast_socket.setsockopt(_socket.IPPROTO_IP, _socket.IP_MULTICAST_LOOP, 1)
+    broadcast_socket.setsockopt(
+        _socket.IPPROTO_IP, _socket.IP_MULTICAST_TTL, config.multicast_ttl
+    )
+    broadcast_socket.setsockopt(
+        _socket.IPPROTO_IP,
+        _socket.IP_MULTICAST_IF,
+        _socket.inet_aton(config.multicast_bind_address),
+    )
+    broadcast_socket.setsockopt(
+        _socket.IPPROTO_IP,
+        _socket.IP_ADD_MEMBERSHIP,
+        _socket.inet_aton(config.multicast_group_endpoint[0])
+        + _socket.inet_aton(config.multicast_bind_address),
+    )
+    return broadcast_socket
+
+
+def _create_command_listen_socket(command_endpoint):
+    """
+    Create the TCP based command socket, bound to the given endpoint and listening for an incoming connection.
+
+    Args:
+        command_endpoint (tuple): The endpoint tuple to listen on (a port of 0 lets the system choose a free port).
+
+    Returns:
+        socket.socket: The TCP socket.
+    """
+    command_listen_socket = _socket.socket(
+        _socket.AF_INET, _socket.SOCK_STREAM, _socket.IPPROTO_TCP
+    )  # TCP/IP socket
+    if hasattr(_socket, "SO_REUSEPORT"):
+        command_listen_socket.setsockopt(_socket.SOL_SOCKET, _socket.SO_REUSEPORT, 1)
+    else:
+        command_listen_socket.setsockopt(_socket.SOL_SOCKET, _socket.SO_REUSEADDR, 1)
+    command_listen_socket.bind(command_endpoint)
+    command_listen_socket.listen(1)
+    return command_listen_socket
+
+
+def _negotiate_encoding(encodings, remote_node):
+    """
+    Choose the encoding of the messages exchanged with a remote "node".
+
+    Args:
+        encodings (tuple): The encodings accepted by this session, in order of preference.
+        remote_node (dict): The data of the remote node, holding the "encodings" it accepts if it is not a stock UE4.
+
+    Returns:
+        string: The first encoding of the session also accepted by the remote node, or None to only send plain JSON.
+    """
+    remote_encodings = remote_node.get("encodings") or []
+    for encoding in encodings:
+        if encoding in remote_encodings:
+            return encoding
+    return None
+
+
+def _encode_json_bytes(
+    json_bytes, encoding, compress_min_size=DEFAULT_COMPRESS_MIN_SIZE
+):
+    """
+    Encode a message for the TCP command connection.
+
+    Args:
+        json_bytes (bytes): The message, as UTF-8 encoded JSON.
+        encoding (string): The encoding negotiated with the remote party, or None for plain JSON.
+        compress_min_size (int): The number of bytes below which the message is sent as plain JSON.
+
+    Returns:
+        bytes: The plain JSON, or a zlib frame: the frame header then the compressed JSON.
+    """
+    if encoding != ENCODING_ZLIB or len(json_bytes) < compress_min_size:
+        return json_bytes
+    compressed = _zlib.compress(json_bytes, _ZLIB_LEVEL)
+    if len(compressed) + _ZLIB_FRAME_HEADER.size >= len(json_bytes):
+        return json_bytes
+    return _ZLIB_FRAME_HEADER.pack(_ZLIB_FRAME_MAGIC, len(compressed)) + compressed
+
+
+def _decode_json_buffer(buffer, max_message_size):
+    """
+    Decode the message accumulated in a receive buffer, if it is complete.
+
+    The message is either a plain JSON document or a zlib frame (see `_encode_json_bytes`), whatever the negotiated encoding.
+
+    Args:
+        buffer (bytearray): The bytes received so far.
+        max_message_size (int): The maximum number of bytes of a document.
+
+    Returns:
+        The decoded JSON object, or None if more bytes are needed.
+    """
+    if buffer[: len(_ZLIB_FRAME_MAGIC)] == _ZLIB_FRAME_MAGIC:
+        if len(buffer) < _ZLIB_FRAME_HEADER.size:
+            return None
+        size = _ZLIB_FRAME_HEADER.unpack_from(buffer)[1]
+        if size > max_message_size:
+            raise RuntimeError(
+                "Remote party sent a message larger than {0} bytes!".format(
+                    max_message_size
+                )
+            )
+        end = _ZLIB_FRAME_HEADER.size + size
+        if len(buffer) < end:
+            return None
+        decompressor = _zlib.decompressobj()
+        json_bytes = decompressor.decompress(
+            bytes(buffer[_ZLIB_FRAME_HEADER.size : end]), max_message_size
+        )
+        if decompressor.unconsumed_tail:
+            raise RuntimeError(
+                "Remote party sent a message larger than {0} bytes!".format(
+                    max_message_size
+                )
+            )
+        return _json.loads(json_bytes)
+    if len(buffer) > max_message_size:
+        raise RuntimeError(
+            "Remote party sent a message larger than {0} bytes!".format(
+                max_message_size
+            )
+        )
+    # A document can only be complete once it ends with its closing brace,
+    # only the end of the buffer is read as it can hold megabytes
+    end = len(buffer)
+    while end and buffer[end - 1] in _JSON_WHITESPACE:
+        end -= 1
+    if not end or buffer[end - 1] != ord("}"):
+        return None
+    try:
+        return _json.loads(buffer.decode("utf-8"))
+    except ValueError:
+        return None
+
+
 def _time_now(now=None):
     """
     Utility function to resolve a potentially cached time value.
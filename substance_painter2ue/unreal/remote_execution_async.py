@@ -0,0 +1,548 @@
+"""
+Asyncio client for the Unreal Python remote execution protocol.
+
+It speaks the same protocol as `remote_execution` (same messages, magic and
+version) but runs every socket on an asyncio event loop instead of a thread
+per socket, so a script can drive many Unreal Editors concurrently from a
+single thread.
+"""
+import asyncio
+import uuid
+
+from .remote_execution import (
+    _NODE_PING_SECONDS,
+    _TYPE_CLOSE_CONNECTION,
+    _TYPE_COMMAND,
+    _TYPE_COMMAND_RESULT,
+    _TYPE_OPEN_CONNECTION,
+    _TYPE_PING,
+    _TYPE_PONG,
+    DEFAULT_ACCEPT_TIMEOUT,
+    DEFAULT_CHECK_TIMEOUT,
+    DEFAULT_RECEIVE_BUFFER_SIZE,
+    MODE_EVAL_STATEMENT,
+    MODE_EXEC_FILE,
+    RemoteExecutionConfig,
+    _create_broadcast_socket,
+    _create_command_listen_socket,
+    _decode_json_buffer,
+    _logger,
+    _RemoteExecutionBroadcastNodes,
+    _RemoteExecutionMessage,
+)
+
+
+class AsyncRemoteExecution(object):
+    """
+    An asyncio remote execution session. This class can discover remote "nodes" (UE4 instances running Python), and open a command channel to any number of them.
+
+    Commands sent to different remote nodes run concurrently, for instance with `asyncio.gather`.
+
+    Args:
+        config (RemoteExecutionConfig): Configuration controlling the connection settings for this session.
+    """
+
+    def __init__(self, config=None):
+        self._config = config or RemoteExecutionConfig()
+        self._node_id = str(uuid.uuid4())
+        self._nodes = None
+        self._has_nodes = None
+        self._broadcast_transport = None
+        self._tick_task = None
+        self._command_connections = {}
+        self._opening_command_connections = 0
+        self._discovery_queues = []
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.stop()
+
+    @property
+    def remote_nodes(self):
+        """
+        Get the current set of discovered remote "nodes" (UE4 instances running Python).
+
+        Returns:
+            list: A list of dicts containg the node ID and the other data.
+        """
+        return self._nodes.remote_nodes if self._nodes else []
+
+    async def start(self):
+        """
+        Start the remote execution session. This will begin the discovey process for remote "nodes" (UE4 instances running Python).
+        """
+        loop = asyncio.get_running_loop()
+        self._nodes = _RemoteExecutionBroadcastNodes(self._on_nodes_changed)
+        self._has_nodes = asyncio.Event()
+        broadcast_socket = _create_broadcast_socket(self._config)
+        broadcast_socket.setblocking(False)
+        self._broadcast_transport, _ = await loop.create_datagram_endpoint(
+            lambda: _BroadcastProtocol(self._handle_data), sock=broadcast_socket
+        )
+        self._tick_task = loop.create_task(self._run_tick())
+
+    async def stop(self):
+        """
+        Stop the remote execution session. This will end the discovey process for remote "nodes" (UE4 instances running Python), and close any open command connections.
+        """
+        await self.close_command_connection()
+        if self._tick_task:
+            self._tick_task.cancel()
+            try:
+                await self._tick_task
+            except asyncio.CancelledError:
+                pass
+            self._tick_task = None
+        if self._broadcast_transport:
+            self._broadcast_transport.close()
+            self._broadcast_transport = None
+        self._nodes = None
+        # end the discovery streams
+        for queue in self._discovery_queues:
+            queue.put_nowait(None)
+
+    async def wait_for_nodes(self, timeout=None):
+        """
+        Wait until at least one remote "node" has been discovered, returning as soon as its first "pong" is received.
+
+        Args:
+            timeout (float): The maximum number of seconds to wait, or None to wait forever.
+
+        Returns:
+            bool: True if a remote node is available, False if the timeout expired first.
+        """
+        if not self._has_nodes:
+            return False
+        try:
+            await asyncio.wait_for(self._has_nodes.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def discover_nodes(self):
+        """
+        Yield the remote "nodes" (UE4 instances running Python) as they are discovered, starting with the ones already known. The stream ends when the session stops.
+
+        Yields:
+            dict: The node ID and the other data of each new remote node.
+        """
+        queue = asyncio.Queue()
+        for remote_node in self.remote_nodes:
+            queue.put_nowait(remote_node)
+        self._discovery_queues.append(queue)
+        try:
+            while True:
+                remote_node = await queue.get()
+                if remote_node is None:
+                    return
+                yield remote_node
+        finally:
+            self._discovery_queues.remove(queue)
+
+    def has_command_connection(self, remote_node_id=None):
+        """
+        Check whether the remote execution session has an active command connection.
+
+        Args:
+            remote_node_id (string): The ID of the remote node to check, or None to check for any remote node.
+
+        Returns:
+            bool: True if the remote execution session has an active command connection, False otherwise.
+        """
+        if remote_node_id is None:
+            return bool(self._command_connections)
+        return remote_node_id in self._command_connections
+
+    @property
+    def command_connection_node_ids(self):
+        """
+        Get the IDs of the remote "nodes" a command connection is open with.
+
+        Returns:
+            list: The IDs of the remote nodes, oldest connection first.
+        """
+        return list(self._command_connections)
+
+    async def open_command_connection(
+        self, remote_node_id, accept_timeout=DEFAULT_ACCEPT_TIMEOUT
+    ):
+        """
+        Open a command connection to the given remote "node" (a UE4 instance running Python), closing the command connection that may currently be open with it.
+
+        Each command connection listens on its own port: the first one uses the configured command endpoint and the other ones a port chosen by the system.
+
+        Args:
+            remote_node_id (string): The ID of the remote node (this can be obtained by querying `remote_nodes`).
+            accept_timeout (float): The number of seconds to wait for the remote node to connect.
+        """
+        await self.close_command_connection(remote_node_id)
+        # only one connection at a time can listen on the configured port
+        command_endpoint = None
+        if self._command_connections or self._opening_command_connections:
+            command_endpoint = (self._config.command_endpoint[0], 0)
+        self._opening_command_connections += 1
+        try:
+            command_connection = _AsyncCommandConnection(
+                self._config, self._node_id, remote_node_id, command_endpoint
+            )
+            try:
+                await command_connection.open(
+                    self._broadcast_open_connection, accept_timeout
+                )
+            except BaseException:
+                await command_connection.close(self._broadcast_close_connection)
+                raise
+        finally:
+            self._opening_command_connections -= 1
+        self._command_connections[remote_node_id] = command_connection
+
+    async def check_command_connection(
+        self, timeout=DEFAULT_CHECK_TIMEOUT, remote_node_id=None
+    ):
+        """
+        Check that the command connection is still alive by running a no-op command, closing it if the remote party does not answer.
+
+        Args:
+            timeout (float): The number of seconds to wait for the remote party to answer.
+            remote_node_id (string): The ID of the remote node to check, or None to check every command connection.
+
+        Returns:
+            bool: True if the command connection is alive, False otherwise.
+        """
+        if remote_node_id is None:
+            node_ids = self.command_connection_node_ids
+            alive = await asyncio.gather(
+                *[self.check_command_connection(timeout, n) for n in node_ids]
+            )
+            return bool(alive) and all(alive)
+        command_connection = self._command_connections.get(remote_node_id)
+        if not command_connection:
+            return False
+        try:
+            await command_connection.run_command(
+                "None", True, MODE_EVAL_STATEMENT, timeout=timeout
+            )
+            return True
+        except Exception as e:
+            _logger.debug("Command connection check failed: {0}".format(str(e)))
+            await self.close_command_connection(remote_node_id)
+            return False
+
+    async def close_command_connection(self, remote_node_id=None):
+        """
+        Close any command connection that may currently be open.
+
+        Args:
+            remote_node_id (string): The ID of the remote node to close the command connection with, or None to close every command connection.
+        """
+        if remote_node_id is None:
+            command_connections = list(self._command_connections.values())
+            self._command_connections.clear()
+        else:
+            command_connection = self._command_connections.pop(remote_node_id, None)
+            command_connections = [command_connection] if command_connection else []
+        for command_connection in command_connections:
+            await command_connection.close(self._broadcast_close_connection)
+
+    async def run_command(
+        self,
+        command,
+        unattended=True,
+        exec_mode=MODE_EXEC_FILE,
+        raise_on_failure=False,
+        remote_node_id=None,
+    ):
+        """
+        Run a command remotely based on the command connection of a remote node.
+
+        Args:
+            command (string): The Python command to run remotely.
+            unattended (bool): True to run this command in "unattended" mode (suppressing some UI).
+            exec_mode (string): The execution mode to use as a string value (must be one of MODE_EXEC_FILE, MODE_EXEC_STATEMENT, or MODE_EVAL_STATEMENT).
+            raise_on_failure (bool): True to raise a RuntimeError if the command fails on the remote target.
+            remote_node_id (string): The ID of the remote node to run the command on, or None to use the oldest command connection.
+
+        Returns:
+            dict: The result from running the remote command (see `command_result` from the protocol definition).
+        """
+        if remote_node_id is None and self._command_connections:
+            remote_node_id = next(iter(self._command_connections))
+        command_connection = self._command_connections.get(remote_node_id)
+        if not command_connection:
+            raise RuntimeError(
+                "No command connection is open with the remote node {0}!".format(
+                    remote_node_id
+                )
+            )
+        data = await command_connection.run_command(command, unattended, exec_mode)
+        if raise_on_failure and not data["success"]:
+            raise RuntimeError(
+                "Remote Python Command failed! {0}".format(data["result"])
+            )
+        return data
+
+    async def _run_tick(self):
+        """
+        Ping the remote nodes and time out the silent ones, once per ping period.
+        """
+        while True:
+            self._broadcast_message(_RemoteExecutionMessage(_TYPE_PING, self._node_id))
+            self._nodes.timeout_remote_nodes()
+            await asyncio.sleep(_NODE_PING_SECONDS)
+
+    def _handle_data(self, data):
+        """
+        Handle data received from the UDP broadcast socket.
+
+        Args:
+            data (bytes): The raw bytes received from the socket.
+        """
+        message = _RemoteExecutionMessage(None, None)
+        if not message.from_json_bytes(data):
+            return
+        if not message.passes_receive_filter(self._node_id):
+            return
+        if message.type_ != _TYPE_PONG or not self._nodes:
+            return
+        node_ids = [remote_node["node_id"] for remote_node in self.remote_nodes]
+        self._nodes.update_remote_node(message.source, message.data)
+        if message.source not in node_ids:
+            remote_node = dict(message.data or {})
+            remote_node["node_id"] = message.source
+            for queue in self._discovery_queues:
+                queue.put_nowait(remote_node)
+
+    def _on_nodes_changed(self):
+        """
+        Track whether a remote node is available when a node is found or lost.
+        """
+        if self.remote_nodes:
+            self._has_nodes.set()
+        else:
+            self._has_nodes.clear()
+
+    def _broadcast_message(self, message):
+        """
+        Broadcast the given message over the UDP socket to anything that might be listening.
+
+        Args:
+            message (_RemoteExecutionMessage): The message to broadcast.
+        """
+        if self._broadcast_transport:
+            self._broadcast_transport.sendto(
+                message.to_json_bytes(), self._config.multicast_group_endpoint
+            )
+
+    def _broadcast_open_connection(self, remote_node_id, command_endpoint):
+        """
+        Broadcast an "open_connection" message over the UDP socket to be handled by the specified remote node.
+
+        Args:
+            remote_node_id (string): The ID of the remote node that we want to open a command connection with.
+            command_endpoint (tuple): The endpoint tuple the remote node should connect to.
+        """
+        self._broadcast_message(
+            _RemoteExecutionMessage(
+                _TYPE_OPEN_CONNECTION,
+                self._node_id,
+                remote_node_id,
+                {
+                    "command_ip": command_endpoint[0],
+                    "command_port": command_endpoint[1],
+                },
+            )
+        )
+
+    def _broadcast_close_connection(self, remote_node_id):
+        """
+        Broadcast a "close_connection" message over the UDP socket to be handled by the specified remote node.
+
+        Args:
+            remote_node_id (string): The ID of the remote node that we want to close a command connection with.
+        """
+        self._broadcast_message(
+            _RemoteExecutionMessage(
+                _TYPE_CLOSE_CONNECTION, self._node_id, remote_node_id
+            )
+        )
+
+
+class _BroadcastProtocol(asyncio.DatagramProtocol):
+    """
+    Forward the datagrams received by the UDP broadcast socket.
+
+    Args:
+        on_data (callable): Called with the raw bytes of each datagram.
+    """
+
+    def __init__(self, on_data):
+        self._on_data = on_data
+
+    def datagram_received(self, data, addr):
+        self._on_data(data)
+
+    def error_received(self, exc):
+        _logger.debug("Broadcast socket error: {0}".format(str(exc)))
+
+
+class _AsyncCommandConnection(object):
+    """
+    An asyncio remote execution command connection (for TCP based command processing).
+
+    Args:
+        config (RemoteExecutionConfig): Configuration controlling the connection settings.
+        node_id (string): The ID of the local "node" (this session).
+        remote_node_id (string): The ID of the remote "node" (the UE4 instance running Python).
+        command_endpoint (tuple): The endpoint tuple to listen on, or None to use the configured command endpoint (a port of 0 lets the system choose a free port).
+    """
+
+    def __init__(self, config, node_id, remote_node_id, command_endpoint=None):
+        self._config = config
+        self._node_id = node_id
+        self._remote_node_id = remote_node_id
+        self._command_endpoint = command_endpoint or config.command_endpoint
+        self._server = None
+        self._reader = None
+        self._writer = None
+        # one command at a time goes through the connection
+        self._lock = asyncio.Lock()
+
+    async def open(self, broadcast_open_connection, accept_timeout):
+        """
+        Listen for the command connection, and wait to accept the connection from the remote party. The "open_connection" message is sent again every 5 seconds until the timeout expires.
+
+        Args:
+            broadcast_open_connection (callable): Called with the remote node ID and the command endpoint to ask the remote party to connect.
+            accept_timeout (float): The total number of seconds to wait for the remote party to connect.
+        """
+        loop = asyncio.get_running_loop()
+        accepted = loop.create_future()
+
+        def on_connection(reader, writer):
+            if accepted.done():
+                writer.close()
+                return
+            accepted.set_result((reader, writer))
+
+        listen_socket = _create_command_listen_socket(self._command_endpoint)
+        # advertise the port actually bound when the system chose it
+        self._command_endpoint = (
+            self._command_endpoint[0],
+            listen_socket.getsockname()[1],
+        )
+        self._server = await asyncio.start_server(on_connection, sock=listen_socket)
+
+        deadline = loop.time() + accept_timeout
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise RuntimeError(
+                    "Remote party failed to attempt the command socket connection!"
+                )
+            broadcast_open_connection(self._remote_node_id, self._command_endpoint)
+            try:
+                self._reader, self._writer = await asyncio.wait_for(
+                    asyncio.shield(accepted), min(5, remaining)
+                )
+                break
+            except asyncio.TimeoutError:
+                continue
+        # a single remote party connects, stop listening
+        self._server.close()
+        self._server = None
+
+    async def close(self, broadcast_close_connection):
+        """
+        Close the TCP based command connection, attempting to notify the remote party.
+
+        Args:
+            broadcast_close_connection (callable): Called with the remote node ID to notify the remote party.
+        """
+        broadcast_close_connection(self._remote_node_id)
+        if self._writer:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except Exception:
+                pass
+            self._writer = None
+            self._reader = None
+        if self._server:
+            self._server.close()
+            self._server = None
+
+    async def run_command(self, command, unattended, exec_mode, timeout=None):
+        """
+        Run a command on the remote party.
+
+        Args:
+            command (string): The Python command to run remotely.
+            unattended (bool): True to run this command in "unattended" mode (suppressing some UI).
+            exec_mode (string): The execution mode to use as a string value (must be one of MODE_EXEC_FILE, MODE_EXEC_STATEMENT, or MODE_EVAL_STATEMENT).
+            timeout (float): The number of seconds to wait for the remote party, or None to wait forever. The connection must be closed once it timed out.
+
+        Returns:
+            dict: The result from running the remote command (see `command_result` from the protocol definition).
+        """
+        async with self._lock:
+            return await asyncio.wait_for(
+                self._run_command(command, unattended, exec_mode), timeout
+            )
+
+    async def _run_command(self, command, unattended, exec_mode):
+        """
+        Send a command to the remote party and wait for its result.
+
+        Args:
+            command (string): The Python command to run remotely.
+            unattended (bool): True to run this command in "unattended" mode (suppressing some UI).
+            exec_mode (string): The execution mode to use as a string value.
+
+        Returns:
+            dict: The result from running the remote command.
+        """
+        if not self._writer:
+            raise RuntimeError("The command connection is closed!")
+        message = _RemoteExecutionMessage(
+            _TYPE_COMMAND,
+            self._node_id,
+            self._remote_node_id,
+            {
+                "command": command,
+                "unattended": unattended,
+                "exec_mode": exec_mode,
+            },
+        )
+        self._writer.write(message.to_json_bytes())
+        await self._writer.drain()
+
+        json_obj = await self._receive_json()
+        if json_obj is not None:
+            message = _RemoteExecutionMessage(None, None)
+            if (
+                message.from_json_obj(json_obj)
+                and message.passes_receive_filter(self._node_id)
+                and message.type_ == _TYPE_COMMAND_RESULT
+            ):
+                return message.data
+        raise RuntimeError("Remote party failed to send a valid response!")
+
+    async def _receive_json(self):
+        """
+        Receive a complete JSON document over the TCP connection, accumulating as many chunks as needed.
+
+        Returns:
+            The decoded JSON object, or None if the remote party closed the connection before sending a complete document.
+        """
+        buffer = bytearray()
+        while True:
+            data = await self._reader.read(DEFAULT_RECEIVE_BUFFER_SIZE)
+            if not data:
+                return None
+            buffer += data
+            json_obj = _decode_json_buffer(buffer, self._config.max_message_size)
+            if json_obj is not None:
+                return json_obj
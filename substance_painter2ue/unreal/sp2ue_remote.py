@@ -0,0 +1,304 @@
+"""
+Helper module run inside Unreal Editor.
+
+RemoteUECommand pushes this file into the ``sys.modules`` of the editor
+once per connection, so a send only calls one of its functions with JSON
+arguments instead of shipping Python source to compile. Increase
+``__version__`` whenever this file changes, editors holding an older copy
+then get the new one.
+
+The plugin never imports this module, it depends on the ``unreal`` module
+of the editor.
+"""
+import json
+import os
+import re
+import time
+
+import unreal
+
+__version__ = 7
+
+# metadata tags of the imported textures, telling where they come from
+PROJECT_TAG = "sp2ue_project"
+TEXTURE_SET_TAG = "sp2ue_texture_set"
+CHANNEL_TAG = "sp2ue_channel"
+HASH_TAG = "sp2ue_hash"
+# characters Unreal rejects in asset names, ie the / of TextureSet/Stack
+INVALID_NAME_CHARACTERS = re.compile(r"[^\w\-]")
+
+# assets looked up during the session, by path, so repeated sends do not
+# search the asset registry again
+_parent_materials: dict = {}
+_material_instances: dict = {}
+_textures: dict = {}
+# package path of the texture imported from each file, by content path and
+# file name, as Unreal names some of them its own way, ie a single texture
+# for the tiles of an UDIM
+_texture_paths: dict = {}
+
+
+def import_texture_sets(arguments: str) -> str:
+    """
+    Import texture sets, one texture at a time.
+
+    Each texture asset is tagged with its source metadata and saved. A
+    texture whose asset already holds the same content hash is skipped, the
+    other ones are imported or reimported in place.
+
+    When "materials" are given, a material instance of the parent material
+    is then created or updated for each texture set.
+
+    :param str arguments: JSON object holding the "destination_path", the
+                          source "project", the "texture_sets" mapping each
+                          texture set name to its textures, each one being
+                          a "file", its content "hash" and its "channel",
+                          and optionally the "materials":
+                          the "parent" material path and the "texture_sets"
+                          mapping each texture set name to the texture
+                          asset path of each material parameter.
+    :return str: JSON object holding the total duration in "seconds", the
+                 result of each texture in "assets": its "texture_set", its
+                 "file", the imported "asset" path, the import "seconds", the
+                 "error" message if it failed and whether it was "skipped" as
+                 already up to date, and the result of each
+                 material instance in "materials" (see
+                 `_update_material_instance`).
+    """
+    start = time.perf_counter()
+    arguments = json.loads(arguments)
+    asset_tools = unreal.AssetToolsHelpers.get_asset_tools()
+    results = []
+    for texture_set_name, textures in arguments["texture_sets"].items():
+        for texture in textures:
+            results.append(
+                _import_texture(
+                    asset_tools,
+                    texture_set_name,
+                    texture,
+                    arguments["destination_path"],
+                    arguments.get("project", ""),
+                )
+            )
+    materials = []
+    if arguments.get("materials"):
+        for texture_set_name, parameters in arguments["materials"][
+            "texture_sets"
+        ].items():
+            materials.append(
+                _update_material_instance(
+                    asset_tools,
+                    texture_set_name,
+                    arguments["materials"]["parent"],
+                    arguments["destination_path"],
+                    parameters,
+                )
+            )
+    return json.dumps(
+        {
+            "seconds": time.perf_counter() - start,
+            "assets": results,
+            "materials": materials,
+        }
+    )
+
+
+def _import_texture(
+    asset_tools,
+    texture_set_name: str,
+    texture: dict,
+    destination_path: str,
+    project: str,
+) -> dict:
+    """
+    Import a texture, catching the errors so the other textures still import.
+
+    :param unreal.AssetTools asset_tools: The asset tools of the editor.
+    :param str texture_set_name: The texture set of the texture.
+    :param dict texture: The "file" to import, its "hash" and its "channel".
+    :param str destination_path: The content path to import the texture to.
+    :param str project: The .spp file the texture is exported from.
+    :return dict: The result of the import.
+    """
+    start = time.perf_counter()
+    result = {
+        "texture_set": texture_set_name,
+        "file": texture["file"],
+        "asset": None,
+        "seconds": 0.0,
+        "error": None,
+        "skipped": False,
+    }
+    try:
+        file_name = os.path.basename(texture["file"])
+        asset_path = _texture_paths.get(
+            (destination_path, file_name),
+            "{0}/{1}".format(
+                destination_path.rstrip("/"),
+                _get_asset_name(os.path.splitext(file_name)[0]),
+            ),
+        )
+        asset = _load_cached_asset(_textures, asset_path)
+        if (
+            asset is not None
+            and texture["hash"]
+            and (
+                unreal.EditorAssetLibrary.get_metadata_tag(asset, HASH_TAG)
+                == texture["hash"]
+            )
+        ):
+            # byte-identical, a reimport would only rebuild the same texture
+            result["asset"] = asset.get_path_name()
+            result["skipped"] = True
+        else:
+            data = unreal.AutomatedAssetImportData()
+            data.set_editor_property("destination_path", destination_path)
+            data.set_editor_property("filenames", [texture["file"]])
+            data.set_editor_property("replace_existing", True)
+            assets = asset_tools.import_assets_automated(data)
+            if not assets:
+                raise RuntimeError("nothing imported from {0}".format(texture["file"]))
+            asset = assets[0]
+            asset_path = asset.get_path_name().split(".")[0]
+            _texture_paths[(destination_path, file_name)] = asset_path
+            _textures[asset_path] = asset
+            for tag, value in (
+                (PROJECT_TAG, project),
+                (TEXTURE_SET_TAG, texture_set_name),
+                (CHANNEL_TAG, texture["channel"]),
+                (HASH_TAG, texture["hash"]),
+            ):
+                unreal.EditorAssetLibrary.set_metadata_tag(asset, tag, value)
+            # the tags only reach the disk once the asset is saved
+            _save_asset(asset)
+            result["asset"] = asset.get_path_name()
+    except Exception as error:
+        result["error"] = str(error)
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def _update_material_instance(
+    asset_tools,
+    texture_set_name: str,
+    parent_path: str,
+    destination_path: str,
+    parameters: dict,
+) -> dict:
+    """
+    Create or update the material instance of a texture set.
+
+    Only the parameters not already holding their texture are set, so an
+    unchanged instance is not modified nor saved.
+
+    :param unreal.AssetTools asset_tools: The asset tools of the editor.
+    :param str texture_set_name: The texture set of the material instance.
+    :param str parent_path: The path of the parent material.
+    :param str destination_path: The content path of the material instance.
+    :param dict parameters: The texture asset path of each parameter.
+    :return dict: The "texture_set", the instance "asset" path, whether it
+                  was "created", the number of "parameters" set, the
+                  "seconds" spent and the "error" message if it failed.
+    """
+    start = time.perf_counter()
+    material_library = unreal.MaterialEditingLibrary
+    result = {
+        "texture_set": texture_set_name,
+        "asset": None,
+        "created": False,
+        "parameters": 0,
+        "seconds": 0.0,
+        "error": None,
+    }
+    try:
+        parent = _load_cached_asset(_parent_materials, parent_path)
+        if parent is None:
+            raise RuntimeError("parent material {0} not found".format(parent_path))
+        package_path = destination_path.rstrip("/")
+        name = "MI_{0}".format(_get_asset_name(texture_set_name))
+        instance_path = "{0}/{1}".format(package_path, name)
+        instance = _load_cached_asset(_material_instances, instance_path)
+        if instance is None:
+            instance = asset_tools.create_asset(
+                name,
+                package_path,
+                unreal.MaterialInstanceConstant,
+                unreal.MaterialInstanceConstantFactoryNew(),
+            )
+            _material_instances[instance_path] = instance
+            result["created"] = True
+
+        modified = result["created"]
+        current_parent = instance.get_editor_property("parent")
+        if current_parent is None or (
+            current_parent.get_path_name() != parent.get_path_name()
+        ):
+            material_library.set_material_instance_parent(instance, parent)
+            modified = True
+        for parameter, texture_path in parameters.items():
+            current = material_library.get_material_instance_texture_parameter_value(
+                instance, parameter
+            )
+            if current is not None and (
+                current.get_path_name().split(".")[0] == texture_path
+            ):
+                continue
+            texture = unreal.EditorAssetLibrary.load_asset(texture_path)
+            if texture is None:
+                # the texture failed to import, its error is already reported
+                continue
+            material_library.set_material_instance_texture_parameter_value(
+                instance, parameter, texture
+            )
+            result["parameters"] += 1
+            modified = True
+        if modified:
+            _save_asset(instance)
+        result["asset"] = instance.get_path_name()
+    except Exception as error:
+        result["error"] = str(error)
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def _save_asset(asset) -> None:
+    """
+    Save an asset, even if Unreal does not consider it modified.
+
+    :param unreal.Object asset: The asset to save.
+    """
+    if not unreal.EditorAssetLibrary.save_loaded_asset(asset, False):
+        raise RuntimeError("could not save {0}".format(asset.get_path_name()))
+
+
+def _get_asset_name(name: str) -> str:
+    """
+    Get a valid asset name, replacing the characters Unreal rejects by _.
+
+    Unreal names an imported file the same way, ie Set_BaseColor.1001.png
+    is imported as Set_BaseColor_1001.
+
+    :param str name: The name, ie of a texture set with several stacks.
+    :return str: The asset name.
+    """
+    return INVALID_NAME_CHARACTERS.sub("_", name)
+
+
+def _load_cached_asset(cache: dict, path: str):
+    """
+    Load an asset, looking it up in the asset registry only on a cache miss.
+
+    :param dict cache: The assets already loaded, by path.
+    :param str path: The path of the asset.
+    :return unreal.Object: The asset, or None if it does not exist.
+    """
+    asset = cache.get(path)
+    if asset is not None and unreal.SystemLibrary.is_valid(asset):
+        return asset
+    cache.pop(path, None)
+    if not unreal.EditorAssetLibrary.does_asset_exist(path):
+        return None
+    asset = unreal.EditorAssetLibrary.load_asset(path)
+    if asset is not None:
+        cache[path] = asset
+    return asset
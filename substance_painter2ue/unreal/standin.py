@@ -0,0 +1,361 @@
+"""
+Stand-in for an Unreal Editor running the Python remote execution plugin.
+
+StandinNode speaks the remote execution protocol without Unreal: it answers
+``ping`` with ``pong``, connects back to the client on ``open_connection``
+and answers each ``command``, either recording it or executing it in a
+Python namespace. Delays and result sizes are configurable, so tests and
+benchmarks run on any machine with a deterministic editor.
+
+usage: python -m substance_painter2ue.unreal.standin [--execute]
+                                                     [--command-delay 0.1]
+"""
+import argparse
+import contextlib
+import io
+import selectors
+import socket
+import threading
+import time
+import traceback
+import uuid
+
+from .remote_execution import (
+    ENCODING_ZLIB,
+    MODE_EVAL_STATEMENT,
+    MODE_EXEC_STATEMENT,
+    RemoteExecutionConfig,
+    _create_broadcast_socket,
+    _decode_json_buffer,
+    _encode_json_bytes,
+    _RemoteExecutionMessage,
+    _TYPE_CLOSE_CONNECTION,
+    _TYPE_COMMAND,
+    _TYPE_COMMAND_RESULT,
+    _TYPE_OPEN_CONNECTION,
+    _TYPE_PING,
+    _TYPE_PONG,
+)
+
+# size of the blocks read from the sockets
+RECEIVE_BUFFER_SIZE = 65536
+
+
+class StandinNode:
+    """A fake Unreal Editor node, answering on the remote execution protocol."""
+
+    def __init__(
+        self,
+        config: RemoteExecutionConfig = None,
+        project_name: str = "Standin",
+        execute: bool = False,
+        namespace: dict = None,
+        pong_delay: float = 0.0,
+        connect_delay: float = 0.0,
+        command_delay: float = 0.0,
+        result_size: int = 0,
+        encodings: tuple = (),
+    ) -> None:
+        """
+        Init the node, it answers once started.
+
+        :param RemoteExecutionConfig config: The network settings, the remote
+                                             execution defaults if None.
+        :param str project_name: The project name given in the pongs.
+        :param bool execute: Execute the commands, like Unreal does, instead
+                             of only recording them.
+        :param dict namespace: The globals of the executed commands, ie
+                               holding a fake ``unreal`` module.
+        :param float pong_delay: Number of seconds before answering a ping.
+        :param float connect_delay: Number of seconds before connecting back
+                                    to a client.
+        :param float command_delay: Number of seconds each command takes.
+        :param int result_size: Number of characters of the string returned
+                                by a recorded command, None is returned if 0.
+        :param tuple encodings: The message encodings advertised in the pongs,
+                                ie ENCODING_ZLIB, none like a stock Unreal.
+        """
+        self.config = config or RemoteExecutionConfig()
+        self.node_id = str(uuid.uuid4())
+        self.project_name = project_name
+        self.execute = execute
+        self.namespace = namespace if namespace is not None else {}
+        self.pong_delay = pong_delay
+        self.connect_delay = connect_delay
+        self.command_delay = command_delay
+        self.result_size = result_size
+        self.encodings = encodings
+        # data of every command received, in order
+        self.commands: list = []
+        self._connections: dict = {}
+        self._lock = threading.Lock()
+        # commands run one at a time, as on the game thread of Unreal
+        self._execute_lock = threading.Lock()
+        self._running = threading.Event()
+        self._broadcast_socket: socket.socket = None
+        self._wakeup_sockets: tuple = None
+        self._broadcast_thread: threading.Thread = None
+
+    @property
+    def pong_data(self) -> dict:
+        """The description of the node, as sent by Unreal in its pongs."""
+        data = {
+            "user": "standin",
+            "machine": socket.gethostname(),
+            "engine_version": "5.0.0-0+standin",
+            "engine_root": "",
+            "project_root": "/standin/{0}".format(self.project_name),
+            "project_name": self.project_name,
+        }
+        if self.encodings:
+            data["encodings"] = list(self.encodings)
+        return data
+
+    def start(self) -> None:
+        """Start answering the clients."""
+        self._broadcast_socket = _create_broadcast_socket(self.config)
+        self._wakeup_sockets = socket.socketpair()
+        self._running.set()
+        self._broadcast_thread = threading.Thread(
+            target=self._run_broadcast_thread, daemon=True
+        )
+        self._broadcast_thread.start()
+
+    def stop(self) -> None:
+        """Stop answering and close every connection."""
+        if not self._running.is_set():
+            return
+        self._running.clear()
+        self._wakeup_sockets[1].send(b"\0")
+        self._broadcast_thread.join()
+        with self._lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+        for connection in connections:
+            _close_socket(connection)
+        self._broadcast_socket.close()
+        for wakeup_socket in self._wakeup_sockets:
+            wakeup_socket.close()
+
+    def __enter__(self):
+        """Start the node."""
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """Stop the node."""
+        self.stop()
+
+    def _run_broadcast_thread(self) -> None:
+        """Answer the messages of the multicast group until stopped."""
+        selector = selectors.DefaultSelector()
+        selector.register(self._broadcast_socket, selectors.EVENT_READ)
+        selector.register(self._wakeup_sockets[0], selectors.EVENT_READ)
+        try:
+            while self._running.is_set():
+                for key, _ in selector.select():
+                    if key.fileobj is not self._broadcast_socket:
+                        continue
+                    data = self._broadcast_socket.recv(RECEIVE_BUFFER_SIZE)
+                    message = _RemoteExecutionMessage(None, None)
+                    if message.from_json_bytes(data) and (
+                        message.passes_receive_filter(self.node_id)
+                    ):
+                        self._handle_broadcast_message(message)
+        finally:
+            selector.close()
+
+    def _handle_broadcast_message(self, message: _RemoteExecutionMessage) -> None:
+        """
+        Answer a message of the multicast group.
+
+        :param _RemoteExecutionMessage message: The received message.
+        """
+        if message.type_ == _TYPE_PING:
+            if self.pong_delay:
+                time.sleep(self.pong_delay)
+            self._broadcast_socket.sendto(
+                _RemoteExecutionMessage(
+                    _TYPE_PONG, self.node_id, message.source, self.pong_data
+                ).to_json_bytes(),
+                self.config.multicast_group_endpoint,
+            )
+        elif message.type_ == _TYPE_OPEN_CONNECTION:
+            threading.Thread(
+                target=self._run_command_connection,
+                args=(
+                    message.source,
+                    (message.data["command_ip"], message.data["command_port"]),
+                ),
+                daemon=True,
+            ).start()
+        elif message.type_ == _TYPE_CLOSE_CONNECTION:
+            with self._lock:
+                connection = self._connections.pop(message.source, None)
+            if connection is not None:
+                _close_socket(connection)
+
+    def _run_command_connection(self, remote_node_id: str, endpoint: tuple) -> None:
+        """
+        Connect back to a client and answer its commands until closed.
+
+        :param str remote_node_id: The ID of the client.
+        :param tuple endpoint: The address and port the client listens on.
+        """
+        if self.connect_delay:
+            time.sleep(self.connect_delay)
+        try:
+            connection = socket.create_connection(endpoint)
+        except OSError:
+            return
+        with self._lock:
+            # a client opening a new connection replaces its previous one
+            previous = self._connections.pop(remote_node_id, None)
+            self._connections[remote_node_id] = connection
+        if previous is not None:
+            _close_socket(previous)
+        buffer = bytearray()
+        try:
+            while self._running.is_set():
+                data = connection.recv(RECEIVE_BUFFER_SIZE)
+                if not data:
+                    return
+                buffer.extend(data)
+                json_obj = _decode_json_buffer(buffer, self.config.max_message_size)
+                if json_obj is None:
+                    continue
+                buffer.clear()
+                message = _RemoteExecutionMessage(None, None)
+                if not message.from_json_obj(json_obj) or (
+                    message.type_ != _TYPE_COMMAND
+                ):
+                    continue
+                result = _RemoteExecutionMessage(
+                    _TYPE_COMMAND_RESULT,
+                    self.node_id,
+                    message.source,
+                    self._run_command(message.data),
+                )
+                # encode the result as the client accepts, if advertised
+                encoding = next(
+                    (
+                        encoding
+                        for encoding in message.data.get("accept_encodings", [])
+                        if encoding in self.encodings
+                    ),
+                    None,
+                )
+                connection.sendall(
+                    _encode_json_bytes(
+                        result.to_json_bytes(),
+                        encoding,
+                        self.config.compress_min_size,
+                    )
+                )
+        except OSError:
+            return
+        finally:
+            with self._lock:
+                if self._connections.get(remote_node_id) is connection:
+                    del self._connections[remote_node_id]
+            _close_socket(connection)
+
+    def _run_command(self, data: dict) -> dict:
+        """
+        Record or execute a command.
+
+        :param dict data: The ``command``, its ``exec_mode`` and whether it
+                          runs ``unattended``.
+        :return dict: The data of the command result: ``success``, the
+                      ``command``, its ``result`` and its ``output`` lines.
+        """
+        with self._execute_lock:
+            self.commands.append(data)
+            if self.command_delay:
+                time.sleep(self.command_delay)
+            if not self.execute:
+                result = repr("x" * self.result_size) if self.result_size else "None"
+                return {
+                    "success": True,
+                    "command": data["command"],
+                    "result": result,
+                    "output": [],
+                }
+            success, result = True, "None"
+            stdout = io.StringIO()
+            try:
+                with contextlib.redirect_stdout(stdout):
+                    if data["exec_mode"] == MODE_EVAL_STATEMENT:
+                        result = repr(eval(data["command"], self.namespace))
+                    elif data["exec_mode"] == MODE_EXEC_STATEMENT:
+                        exec(
+                            compile(data["command"], "<remote>", "single"),
+                            self.namespace,
+                        )
+                    else:
+                        exec(
+                            compile(data["command"], "<remote>", "exec"), self.namespace
+                        )
+            except Exception:
+                success, result = False, traceback.format_exc()
+        return {
+            "success": success,
+            "command": data["command"],
+            "result": result,
+            "output": [
+                {"type": "Info", "output": line}
+                for line in stdout.getvalue().splitlines()
+            ],
+        }
+
+
+def _close_socket(sock: socket.socket) -> None:
+    """
+    Close a connected socket, waking up the thread reading it.
+
+    :param socket.socket sock: The socket to close.
+    """
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+    sock.close()
+
+
+def main() -> None:
+    """Run a stand-in node until interrupted."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--project-name", default="Standin")
+    parser.add_argument("--execute", action="store_true")
+    parser.add_argument("--pong-delay", type=float, default=0.0)
+    parser.add_argument("--connect-delay", type=float, default=0.0)
+    parser.add_argument("--command-delay", type=float, default=0.0)
+    parser.add_argument("--result-size", type=int, default=0)
+    parser.add_argument("--multicast-ttl", type=int, default=0)
+    parser.add_argument(
+        "--zlib", action="store_true", help="accept zlib compressed messages"
+    )
+    args = parser.parse_args()
+    config = RemoteExecutionConfig()
+    config.multicast_ttl = args.multicast_ttl
+    node = StandinNode(
+        config,
+        args.project_name,
+        args.execute,
+        pong_delay=args.pong_delay,
+        connect_delay=args.connect_delay,
+        command_delay=args.command_delay,
+        result_size=args.result_size,
+        encodings=(ENCODING_ZLIB,) if args.zlib else (),
+    )
+    with node:
+        print("Stand-in node {0} running, Ctrl+C to stop.".format(node.node_id))
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
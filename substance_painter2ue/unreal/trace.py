@@ -0,0 +1,309 @@
+"""
+Timing spans of the sends, kept in memory.
+
+Each span records the name, start, duration and thread of a step of a send,
+ie an export, a command or a socket read. Spans nest when they are opened
+one in another on the same thread. The latest spans are kept in a ring
+buffer, the oldest ones are dropped first, so tracing stays on for a whole
+session at the cost of a few microseconds per span. Counters add up values
+such as the bytes sent and received. Background work which is not part of
+a send, such as the health checks of the connections, runs in a
+``suppressed`` block and records nothing.
+
+The spans can be summed up by name (``format_stats``) or saved as a Chrome
+trace, to be opened in chrome://tracing or https://ui.perfetto.dev.
+SP2UE_TRACE=0 turns tracing off.
+"""
+import collections
+import contextlib
+import json
+import os
+import threading
+import time
+
+# number of spans kept, the oldest ones are dropped first
+DEFAULT_CAPACITY = 10000
+
+
+class Span:
+    """A step being timed, recorded when its ``with`` block ends."""
+
+    __slots__ = ("_tracer", "_name", "_args", "_start")
+
+    def __init__(self, tracer, name: str, args: dict) -> None:
+        """
+        Init the span, it starts when its ``with`` block is entered.
+
+        :param Tracer tracer: The tracer to record the span in.
+        :param str name: The name of the step.
+        :param dict args: The values describing the step, ie its size.
+        """
+        self._tracer = tracer
+        self._name = name
+        self._args = args
+        self._start = 0
+
+    def set(self, **args) -> None:
+        """Describe the step with values only known once it ran."""
+        self._args.update(args)
+
+    def __enter__(self):
+        """Start timing."""
+        self._start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """Record the span, failed steps included."""
+        end = time.perf_counter_ns()
+        if exc_info[0] is not None:
+            self._args["error"] = exc_info[0].__name__
+        self._tracer.record(self._name, self._start, end - self._start, self._args)
+
+
+class _NullSpan:
+    """A span of a disabled tracer, recording nothing."""
+
+    __slots__ = ()
+
+    def set(self, **args) -> None:
+        """Ignore the values."""
+
+    def __enter__(self):
+        """Do nothing."""
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """Do nothing."""
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """A ring buffer of spans, with counters."""
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, enabled: bool = True) -> None:
+        """
+        Init an empty tracer.
+
+        :param int capacity: The number of spans kept.
+        :param bool enabled: False to record nothing.
+        """
+        self.enabled = enabled
+        self._spans = collections.deque(maxlen=capacity)
+        self._counters: dict = {}
+        self._lock = threading.Lock()
+        # depth of the suppressed blocks of each thread
+        self._local = threading.local()
+
+    def span(self, name: str, **args):
+        """
+        Time a step in a ``with`` block.
+
+        :param str name: The name of the step.
+        :param args: The values describing the step, ie its size.
+        :return Span: The span to enter.
+        """
+        if not self.enabled or getattr(self._local, "suppressed", 0):
+            return _NULL_SPAN
+        return Span(self, name, args)
+
+    @contextlib.contextmanager
+    def suppressed(self):
+        """Record nothing from the current thread in a ``with`` block."""
+        self._local.suppressed = getattr(self._local, "suppressed", 0) + 1
+        try:
+            yield
+        finally:
+            self._local.suppressed -= 1
+
+    def record(
+        self, name: str, start: int, duration: int, args: dict = None, thread=None
+    ) -> None:
+        """
+        Record a span timed elsewhere, ie by Unreal.
+
+        :param str name: The name of the step.
+        :param int start: The ``time.perf_counter_ns`` the step started at.
+        :param int duration: The duration of the step, in nanoseconds.
+        :param dict args: The values describing the step.
+        :param thread: The thread which ran the step, its ident or a label
+                       such as the Unreal Editor it ran in, the current
+                       thread if None.
+        """
+        if not self.enabled or getattr(self._local, "suppressed", 0):
+            return
+        if thread is None:
+            thread = threading.get_ident()
+        with self._lock:
+            self._spans.append((name, start, duration, thread, args))
+
+    def count(self, name: str, value: int = 1) -> None:
+        """
+        Add to a counter.
+
+        :param str name: The name of the counter.
+        :param int value: The value to add.
+        """
+        if not self.enabled or getattr(self._local, "suppressed", 0):
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def spans(self) -> list:
+        """
+        Get the kept spans, oldest first.
+
+        :return list: A tuple per span: its name, start and duration in
+                      nanoseconds, thread and args.
+        """
+        with self._lock:
+            return list(self._spans)
+
+    def counters(self) -> dict:
+        """
+        Get the counters.
+
+        :return dict: The value of each counter by name.
+        """
+        with self._lock:
+            return dict(self._counters)
+
+    def clear(self) -> None:
+        """Drop every span and reset the counters."""
+        with self._lock:
+            self._spans.clear()
+            self._counters.clear()
+
+    def stats(self) -> list:
+        """
+        Sum the kept spans up by name.
+
+        :return list: A dict per span name, the longest total first, holding
+                      the ``name``, the ``count`` of spans, their
+                      ``total_ms``, ``mean_ms``, ``max_ms`` and ``last_ms``.
+        """
+        stats: dict = {}
+        for name, _, duration, _, _ in self.spans():
+            stat = stats.get(name)
+            if stat is None:
+                stat = stats[name] = {
+                    "name": name,
+                    "count": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                }
+            duration_ms = duration / 1e6
+            stat["count"] += 1
+            stat["total_ms"] += duration_ms
+            stat["max_ms"] = max(stat["max_ms"], duration_ms)
+            stat["last_ms"] = duration_ms
+        for stat in stats.values():
+            stat["mean_ms"] = stat["total_ms"] / stat["count"]
+        return sorted(stats.values(), key=lambda stat: stat["total_ms"], reverse=True)
+
+    def chrome_trace(self) -> dict:
+        """
+        Get the kept spans and the counters as a Chrome trace.
+
+        :return dict: The trace, in the Chrome Trace Event Format.
+        """
+        pid = os.getpid()
+        thread_ids: dict = {}
+        events: list = []
+        for name, start, duration, thread, args in self.spans():
+            if isinstance(thread, str):
+                # a label, shown as a thread of its own
+                if thread not in thread_ids:
+                    thread_ids[thread] = len(thread_ids) + 1
+                    events.append(
+                        {
+                            "name": "thread_name",
+                            "ph": "M",
+                            "pid": pid,
+                            "tid": thread_ids[thread],
+                            "args": {"name": thread},
+                        }
+                    )
+                thread = thread_ids[thread]
+            events.append(
+                {
+                    "name": name,
+                    "cat": name.partition(".")[0] if "." in name else "sp2ue",
+                    "ph": "X",
+                    "ts": start / 1000,
+                    "dur": duration / 1000,
+                    "pid": pid,
+                    "tid": thread,
+                    "args": args or {},
+                }
+            )
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {"counters": self.counters()},
+        }
+
+    def save_chrome_trace(self, path: str) -> None:
+        """
+        Write the kept spans and the counters as a Chrome trace.
+
+        :param str path: The JSON file to write.
+        """
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.chrome_trace(), file)
+
+
+# the spans of the plugin
+TRACER = Tracer(enabled=os.environ.get("SP2UE_TRACE", "1") != "0")
+
+
+def span(name: str, **args):
+    """
+    Time a step of the plugin in a ``with`` block.
+
+    :param str name: The name of the step.
+    :param args: The values describing the step, ie its size.
+    :return Span: The span to enter.
+    """
+    return TRACER.span(name, **args)
+
+
+def count(name: str, value: int = 1) -> None:
+    """
+    Add to a counter of the plugin.
+
+    :param str name: The name of the counter.
+    :param int value: The value to add.
+    """
+    TRACER.count(name, value)
+
+
+def suppressed():
+    """
+    Record nothing of the plugin from the current thread in a ``with`` block.
+
+    :return: The context manager to enter.
+    """
+    return TRACER.suppressed()
+
+
+def format_stats(tracer: Tracer = TRACER) -> str:
+    """
+    Sum the spans up by name, as text.
+
+    :param Tracer tracer: The tracer holding the spans.
+    :return str: A line per span name, the longest total first, then a line
+                 per counter.
+    """
+    lines = [
+        "{0:<28} {1:>6} {2:>10} {3:>10} {4:>10}".format(
+            "span", "count", "total ms", "mean ms", "max ms"
+        )
+    ]
+    line = "{name:<28} {count:>6} {total_ms:>10.1f} {mean_ms:>10.2f} {max_ms:>10.2f}"
+    for stat in tracer.stats():
+        lines.append(line.format(**stat))
+    for name, value in sorted(tracer.counters().items()):
+        lines.append("{0:<28} {1:>17}".format(name, value))
+    return "\n".join(lines)
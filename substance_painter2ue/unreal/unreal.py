@@ -4,30 +4,216 @@ Unreal Engine Communication functions.
 borrowed from Epic Game BlenderTools
 https://github.com/EpicGames/BlenderTools/tree/main/send2ue
 """
+import ast
+import json
+import os
+import socket
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 
-from .remote_execution import RemoteExecution
+from . import trace
+from .remote_execution import (
+    MODE_EVAL_STATEMENT,
+    MODE_EXEC_FILE,
+    CommandNotSentError,
+    RemoteExecution,
+    RemoteExecutionConfig,
+)
+
+# maximum number of seconds to wait for an Unreal Editor to answer discovery
+DISCOVERY_TIMEOUT = 3.0
+# number of seconds between two health checks of the command connection
+HEALTH_CHECK_INTERVAL = 5.0
+# number of seconds the health check waits for the editor to connect back
+RECONNECT_TIMEOUT = 2.0
+# helper module pushed into Unreal, see sp2ue_remote.py
+REMOTE_MODULE_NAME = "sp2ue_remote"
+REMOTE_MODULE_PATH = os.path.join(os.path.dirname(__file__), "sp2ue_remote.py")
+
+# evaluated by Unreal to get the version of the helper module it holds
+_REMOTE_MODULE_VERSION_STATEMENT = (
+    'getattr(__import__("sys").modules.get({name}), "__version__", None)'
+)
+
+# executed by Unreal to install the helper module
+_REMOTE_MODULE_INSTALL_COMMAND = """import sys, types
+module = types.ModuleType({name})
+module.__file__ = {filename}
+exec(compile({source}, {filename}, "exec"), module.__dict__)
+sys.modules[{name}] = module
+del module
+"""
+
+# evaluated by Unreal to call a function of the helper module, which
+# returns a JSON string
+_REMOTE_MODULE_CALL_COMMAND = "__import__({name}).{function}({arguments})"
+
+
+def load_remote_module(path: str = REMOTE_MODULE_PATH) -> tuple:
+    """
+    Read the source and the version of the helper module pushed into Unreal.
+
+    The module is not imported as it depends on the ``unreal`` module of the
+    editor, its ``__version__`` is read from the source.
+
+    :param str path: The file of the helper module.
+    :return tuple: The source of the module and its version.
+    """
+    with open(path, "r", encoding="utf-8") as file:
+        source = file.read()
+    for node in ast.parse(source).body:
+        if (
+            isinstance(node, ast.Assign)
+            and len(node.targets) == 1
+            and getattr(node.targets[0], "id", None) == "__version__"
+        ):
+            return source, ast.literal_eval(node.value)
+    raise ValueError("{0} has no __version__".format(path))
+
+
+def get_remote_execution_config() -> RemoteExecutionConfig:
+    """
+    Get the network settings to reach Unreal from env var.
+
+    :return RemoteExecutionConfig: The remote execution defaults, overridden
+                                   by SP2UE_MULTICAST_TTL,
+                                   SP2UE_MULTICAST_BIND_ADDRESS,
+                                   SP2UE_COMMAND_IP and SP2UE_COMPRESSION.
+    """
+    config = RemoteExecutionConfig()
+    if os.environ.get("SP2UE_MULTICAST_TTL"):
+        config.multicast_ttl = int(os.environ.get("SP2UE_MULTICAST_TTL"))
+    if os.environ.get("SP2UE_MULTICAST_BIND_ADDRESS"):
+        config.multicast_bind_address = os.environ.get("SP2UE_MULTICAST_BIND_ADDRESS")
+    if os.environ.get("SP2UE_COMMAND_IP"):
+        config.command_endpoint = (
+            os.environ.get("SP2UE_COMMAND_IP"),
+            config.command_endpoint[1],
+        )
+    if os.environ.get("SP2UE_COMPRESSION") == "0":
+        config.encodings = ()
+    return config
 
 
 class RemoteUECommand:
     """Send python command to UE through network."""
 
-    def __init__(self) -> None:
-        """Init RemoteUECommand."""
+    def __init__(self, config: RemoteExecutionConfig = None) -> None:
+        """
+        Init RemoteUECommand.
+
+        :param RemoteExecutionConfig config: The network settings, the remote
+                                             execution defaults if None.
+        """
         # start a connection to the engine that lets you send python-commands.md strings
-        self.remote_exec: RemoteExecution = RemoteExecution()
-        self.remote_exec.start()
+        self.remote_exec: RemoteExecution = RemoteExecution(
+            config or RemoteExecutionConfig()
+        )
         self.unreal_response: str = ""
-        time.sleep(1.5)  # wait a few secondes to let it find some nodes.
-        nodes: list = self.available_nodes()
-        self.selected_node: dict = nodes[0] if len(nodes) > 0 else {}
+        # nodes are selected as soon as they answer, without waiting for them
+        self.selected_node: dict = {}
+        # send to every available node instead of the selected one
+        self.send_to_all_nodes: bool = False
+        # duration in seconds of the last command connection setup
+        self.connect_latency: float = 0.0
+        # compress the messages exchanged with the editors of this machine
+        # too, when they accept it, rather than only with the remote ones
+        self.compress_local_messages: bool = False
+        # a command connection is used by one thread at a time, commands sent
+        # to different nodes run concurrently
+        self._node_locks: dict = {}
+        self._node_locks_lock = threading.Lock()
+        # version of the helper module checked in each node since connected
+        self._remote_module_source, self._remote_module_version = load_remote_module()
+        self._remote_module_versions: dict = {}
+        self._stop_event = threading.Event()
+        self.remote_exec.add_nodes_changed_callback(self._on_nodes_changed)
+        self.remote_exec.start()
+        # keep the command connection warm in the background
+        self._keepalive_thread = threading.Thread(target=self._run_keepalive_thread)
+        self._keepalive_thread.daemon = True
+        self._keepalive_thread.start()
+
+    def add_nodes_changed_callback(self, callback) -> None:
+        """
+        Register a callback to run when an Unreal Editor is found or lost.
+
+        The callback is run from the discovery thread with the list of nodes.
+
+        :param callable callback: function called with the list of nodes.
+        """
+        self.remote_exec.add_nodes_changed_callback(callback)
 
-    def run_commands(self, commands: list[str]) -> str:
+    def _on_nodes_changed(self, nodes: list) -> None:
+        """
+        Select the first discovered node if none is selected yet.
+
+        :param list nodes: the currently available nodes.
+        """
+        if not self.selected_node and nodes:
+            self.selected_node = nodes[0]
+
+    def target_nodes(self, wait: bool = False) -> list:
+        """
+        Get the nodes a send goes to.
+
+        :param bool wait: wait for the first editor to answer discovery if no
+                          node is known yet.
+        :return list: Every available node when sending to all nodes, the
+                      selected node otherwise.
+        """
+        if wait and not self.available_nodes():
+            self.remote_exec.wait_for_nodes(DISCOVERY_TIMEOUT)
+        if self.send_to_all_nodes:
+            return self.available_nodes()
+        if not self.selected_node and self.available_nodes():
+            self.selected_node = self.available_nodes()[0]
+        self._follow_restarted_node()
+        return [self.selected_node] if self.selected_node else []
+
+    def run_on_nodes(self, function, nodes: list) -> list:
+        """
+        Call a function for each node concurrently.
+
+        Each call runs on its own thread, so the total duration is the one of
+        the slowest node rather than the sum of all of them.
+
+        :param callable function: called with a node, usually sends commands
+                                  to that node.
+        :param list nodes: the nodes to call the function for.
+        :return list: a dict per node, in the order of the nodes, holding the
+                      node, the result of the function or the exception it
+                      raised, and the duration of the call in seconds.
+        """
+
+        def run(node: dict) -> dict:
+            start = time.perf_counter()
+            result, error = None, None
+            try:
+                result = function(node)
+            except Exception as exception:
+                error = exception
+            return {
+                "node": node,
+                "result": result,
+                "error": error,
+                "seconds": time.perf_counter() - start,
+            }
+
+        if len(nodes) == 1:
+            return [run(nodes[0])]
+        with ThreadPoolExecutor(max_workers=max(1, len(nodes))) as executor:
+            return list(executor.map(run, nodes))
+
+    def run_commands(self, commands: list[str], node: dict = None) -> str:
         """
         Run a list of python commands and returns the result of the output.
 
         :param list commands: A formatted string of python commands that will be run
                             by unreal engine.
+        :param dict node: The node to run the commands on, the selected node if
+                          None.
         :return str: The stdout produced by the remote python command.
         """
         # wrap the commands in a try except so that all exceptions can be logged
@@ -39,19 +225,91 @@ class RemoteUECommand:
         )
 
         # send over the python code as a string and run it
-        self._run_unreal_python_commands(commands)
+        with trace.span("run_commands", lines=len(commands)):
+            unreal_response = self._run_unreal_python_commands(commands, node)
+
+        return self._get_response(unreal_response)
+
+    def call_remote(self, function: str, arguments: dict, node: dict = None):
+        """
+        Call a function of the helper module in Unreal.
 
-        return self._get_response()
+        The helper module is pushed into Unreal first if the editor does not
+        hold its current version, it is checked once per connection.
+
+        :param str function: The name of the function of the helper module.
+        :param dict arguments: The arguments of the function, sent as JSON.
+        :param dict node: The node to call the function on, the selected node
+                          if None.
+        :return: The decoded JSON returned by the remote function.
+        """
+        if node is None:
+            node = self._get_selected_node()
+        with trace.span("call_remote", function=function):
+            with self._get_node_lock(node.get("node_id")):
+                self._ensure_remote_module(node)
+                with trace.span("serialize"):
+                    command = _REMOTE_MODULE_CALL_COMMAND.format(
+                        name=repr(REMOTE_MODULE_NAME),
+                        function=function,
+                        arguments=repr(json.dumps(arguments, separators=(",", ":"))),
+                    )
+                unreal_response = self.run_python(
+                    command, MODE_EVAL_STATEMENT, unattended=False, node=node
+                )
+            if not unreal_response.get("success"):
+                raise RuntimeError(
+                    "{0} failed in Unreal: {1}".format(
+                        function, unreal_response.get("result")
+                    )
+                )
+            # the result is the repr of the returned json string
+            with trace.span("parse"):
+                return json.loads(ast.literal_eval(unreal_response["result"]))
 
-    def _get_response(self) -> str:
+    def _ensure_remote_module(self, node: dict) -> None:
+        """
+        Push the helper module into Unreal unless it holds the current version.
+
+        :param dict node: The node to push the module to.
+        """
+        node_id = node.get("node_id")
+        if self._remote_module_versions.get(node_id) == self._remote_module_version:
+            return
+        response = self.run_python(
+            _REMOTE_MODULE_VERSION_STATEMENT.format(name=repr(REMOTE_MODULE_NAME)),
+            MODE_EVAL_STATEMENT,
+            node=node,
+        )
+        if not response.get("success") or response.get("result") != repr(
+            self._remote_module_version
+        ):
+            response = self.run_python(
+                _REMOTE_MODULE_INSTALL_COMMAND.format(
+                    name=repr(REMOTE_MODULE_NAME),
+                    filename=repr(os.path.basename(REMOTE_MODULE_PATH)),
+                    source=repr(self._remote_module_source),
+                ),
+                node=node,
+            )
+            if not response.get("success"):
+                raise RuntimeError(
+                    "Could not install {0} in Unreal: {1}".format(
+                        REMOTE_MODULE_NAME, response.get("result")
+                    )
+                )
+        self._remote_module_versions[node_id] = self._remote_module_version
+
+    def _get_response(self, unreal_response: dict) -> str:
         """
         Get the stdout produced by the remote python call.
 
+        :param dict unreal_response: The raw result of the remote python call.
         :return str: The stdout produced by the remote python command.
         """
-        if self._unreal_response:
+        if unreal_response:
             full_output = []
-            output = self._unreal_response.get("output")
+            output = unreal_response.get("output")
             if output:
                 full_output.append(
                     "\n".join(
@@ -59,7 +317,7 @@ class RemoteUECommand:
                     )
                 )
 
-            result = self._unreal_response.get("result")
+            result = unreal_response.get("result")
             if result != "None":
                 full_output.append(result)
 
@@ -83,61 +341,207 @@ class RemoteUECommand:
         return indented_line
 
     def _run_unreal_python_commands(
-        self,
-        commands: list[str],
-        failed_connection_attempts: int = 0,
-    ) -> None:
+        self, commands: list[str], node: dict = None
+    ) -> dict:
         """
-        Send python commands to the first found Unreal Editor.
+        Send python commands to an Unreal Editor.
+
+        The command connection is reused between calls. If it turns out to be
+        dead before the commands are sent, it is opened again once before
+        giving up.
 
         :param list commands: A list of python commands that will be run
                                 by unreal engine.
-        :param int failed_connection_attempts: A counter that keeps track of how many
-                                            times an editor connection attempt was made.
+        :param dict node: The node to run the commands on, the selected node if
+                          None.
+        :return dict: The raw result of the commands (see `command_result`).
         """
-        try:
+        cmd_str = "\n".join(commands).replace("\\", "/")
+        # run the import commands and return the response
+        return self.run_python(cmd_str, unattended=False, node=node)
+
+    def run_python(
+        self,
+        command: str,
+        exec_mode: str = MODE_EXEC_FILE,
+        unattended: bool = True,
+        node: dict = None,
+    ) -> dict:
+        """
+        Run python code as is in an Unreal Editor.
+
+        The command connection is reused between calls. If it turns out to be
+        dead before the command is sent, it is opened again once before giving
+        up. A connection failing once the command is sent is closed and the
+        error raised, as the command may have run. Commands sent to different
+        nodes can run concurrently from different threads.
+
+        :param str command: The python code to run.
+        :param str exec_mode: The remote execution mode (MODE_EXEC_FILE,
+                              MODE_EXEC_STATEMENT or MODE_EVAL_STATEMENT).
+        :param bool unattended: True to suppress some UI in Unreal.
+        :param dict node: The node to run the code on, the selected node if None.
+        :return dict: The raw result of the command (see `command_result`).
+        """
+        if node is None:
+            node = self._get_selected_node()
+        node_id = node.get("node_id")
+        error = None
+        with self._get_node_lock(node_id), trace.span("run_python"):
+            for attempt in range(2):
+                try:
+                    self._ensure_command_connection(node_id, reconnect=attempt > 0)
+                except Exception as exception:
+                    error = exception
+                    continue
+                try:
+                    return self.remote_exec.run_command(
+                        command,
+                        unattended=unattended,
+                        exec_mode=exec_mode,
+                        remote_node_id=node_id,
+                    )
+                except CommandNotSentError as exception:
+                    # the connection was dead before the command went out, so
+                    # it did not run and is sent again on a new connection
+                    error = exception
+        raise ConnectionError(
+            "Could not find an open Unreal Editor instance!"
+        ) from error
+
+    def _get_selected_node(self) -> dict:
+        """
+        Get the selected node, waiting for discovery if none is selected yet.
+
+        :return dict: The selected node.
+        """
+        if not self.selected_node:
+            # wait for the first editor to answer discovery
+            if not self.remote_exec.wait_for_nodes(DISCOVERY_TIMEOUT):
+                raise ConnectionError("Could not find an open Unreal Editor instance!")
+            self.selected_node = self.available_nodes()[0]
+        self._follow_restarted_node()
+        return self.selected_node
+
+    def _get_node_lock(self, node_id: str) -> threading.RLock:
+        """
+        Get the lock serializing the use of the command connection of a node.
 
-            # create first connection
-            if not self.remote_exec.has_command_connection():
-                time.sleep(0.2)
-                if not self.selected_node:
-                    if len(self.remote_exec.available_nodes) > 0:
-                        self.selected_node = self.remote_exec.available_nodes[0]
-                    else:
-                        raise ConnectionError(
-                            "Could not find an open Unreal Editor instance!"
-                        )
+        :param str node_id: The ID of the node.
+        :return threading.RLock: The lock of the node.
+        """
+        with self._node_locks_lock:
+            return self._node_locks.setdefault(node_id, threading.RLock())
+
+    def _ensure_command_connection(
+        self, node_id: str, reconnect: bool = False, accept_timeout: float = None
+    ) -> None:
+        """
+        Make sure a command connection is open with a node.
+
+        Every node gets its own connection, opening one never closes the
+        connections to the other nodes.
+
+        :param str node_id: The ID of the node.
+        :param bool reconnect: close the current connection and open a new one.
+        :param float accept_timeout: seconds to wait for the editor to connect,
+                                     the remote execution default if None.
+        """
+        if reconnect or not self.remote_exec.has_command_connection(node_id):
+            # check the helper module again on the new connection
+            self._remote_module_versions.pop(node_id, None)
+            node = next(
+                (n for n in self.available_nodes() if n.get("node_id") == node_id), {}
+            )
+            # compressing costs more than it saves through the loopback
+            encodings = None
+            if not self.compress_local_messages and self.is_node_local(node):
+                encodings = ()
+            start = time.perf_counter()
+            if accept_timeout is None:
                 self.remote_exec.open_command_connection(
-                    self.selected_node.get("node_id")
+                    node_id, exclusive=False, encodings=encodings
                 )
-
-            # if a connection is made
-            if self.remote_exec.has_command_connection():
-                # run the import commands and save the response in unreal_response
-                cmd_str = "\n".join(commands).replace("\\", "/")
-                self._unreal_response = self.remote_exec.run_command(
-                    cmd_str, unattended=False
+            else:
+                self.remote_exec.open_command_connection(
+                    node_id, accept_timeout, exclusive=False, encodings=encodings
                 )
+            self.connect_latency = time.perf_counter() - start
 
-            # otherwise make an other attempt to connect to the engine
-            else:
-                if failed_connection_attempts < 50:
-                    self._run_unreal_python_commands(
-                        commands, failed_connection_attempts + 1
-                    )
-                else:
-                    raise ConnectionError(
-                        "Could not find an open Unreal Editor instance!"
-                    )
+    def _run_keepalive_thread(self) -> None:
+        """Check the command connections and open them again when dead."""
+        while not self._stop_event.wait(HEALTH_CHECK_INTERVAL):
+            try:
+                target_ids = [node.get("node_id") for node in self.target_nodes()]
+                available_ids = [node.get("node_id") for node in self.available_nodes()]
+            except Exception:
+                continue
+            # close the connections nothing is sent to anymore
+            for node_id in self.remote_exec.command_connection_node_ids:
+                if node_id not in target_ids:
+                    self._keep_alive(node_id, close=True)
+            for node_id in target_ids:
+                if node_id in available_ids:
+                    self._keep_alive(node_id)
+
+    def _keep_alive(self, node_id: str, close: bool = False) -> None:
+        """
+        Check the command connection of a node and open it again when dead.
 
-        # catch all errors
+        :param str node_id: The ID of the node.
+        :param bool close: close the connection instead.
+        """
+        lock = self._get_node_lock(node_id)
+        # never wait behind a running command, it keeps the connection alive
+        if not lock.acquire(blocking=False):
+            return
+        try:
+            if close:
+                self.remote_exec.close_command_connection(node_id)
+                return
+            # a dead connection is closed by the check, which is not traced
+            # so it does not crowd the sends out of the trace
+            if self.remote_exec.has_command_connection(node_id):
+                with trace.suppressed():
+                    self.remote_exec.check_command_connection(remote_node_id=node_id)
+            self._ensure_command_connection(node_id, accept_timeout=RECONNECT_TIMEOUT)
         except Exception:
-            raise ConnectionError("Could not find an open Unreal Editor instance!")
+            # the editor is not reachable yet, try again on next check
+            pass
+        finally:
+            lock.release()
+
+    def _follow_restarted_node(self) -> None:
+        """Select the new node of the selected project if its editor restarted."""
+        nodes = self.available_nodes()
+        node_ids = [node.get("node_id") for node in nodes]
+        if not self.selected_node or self.selected_node.get("node_id") in node_ids:
+            return
+        for node in nodes:
+            if node.get("project_root") == self.selected_node.get(
+                "project_root"
+            ) and node.get("machine") == self.selected_node.get("machine"):
+                self.selected_node = node
+                return
 
     def stop(self) -> None:
         """Stop remote connection."""
+        self._stop_event.set()
         self.remote_exec.stop()
 
+    def is_selected_node_local(self) -> bool:
+        """Return True if the selected Unreal Editor runs on this machine."""
+        return self.is_node_local(self.selected_node)
+
+    def is_node_local(self, node: dict) -> bool:
+        """
+        Return True if an Unreal Editor runs on this machine.
+
+        :param dict node: The node of the editor.
+        """
+        machine = node.get("machine")
+        return bool(machine) and machine.lower() == socket.gethostname().lower()
+
     def available_nodes(self) -> list:
         """Get the list of found Unreal instances."""
         return self.remote_exec.remote_nodes
@@ -0,0 +1,218 @@
+"""
+Upload files to an Unreal Editor running on another machine.
+
+The files are sent through the command connection as python commands which
+write them in a staging folder of the Unreal project. Each file is sent in
+fixed-size chunks, compressed and checksummed, so an interrupted upload
+resumes where it stopped. Once a file is uploaded, its older versions are
+removed from the staging folder.
+"""
+import ast
+import base64
+import json
+import os
+import time
+import zlib
+
+from .remote_execution import MODE_EVAL_STATEMENT
+
+# number of bytes of a file sent by a single command
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+# zlib level, textures are often already compressed so favor speed
+COMPRESSION_LEVEL = 1
+
+# evaluated by Unreal to find the staging folder and what it already received
+_STATE_STATEMENT = (
+    "(lambda os, json, root, files: json.dumps({{"
+    '"root": root, '
+    '"done": [f for f in files if os.path.isfile(os.path.join(root, f))], '
+    '"sizes": {{f: os.path.getsize(os.path.join(root, f + ".part")) '
+    'for f in files if os.path.isfile(os.path.join(root, f + ".part"))}}'
+    "}}))("
+    '__import__("os"), __import__("json"), '
+    '__import__("os").path.join(unreal.Paths.convert_relative_path_to_full('
+    'unreal.Paths.project_saved_dir()), "sp2ue", {staging}), {files})'
+)
+
+# executed by Unreal to write a chunk of a file
+_CHUNK_COMMAND = """import base64, os, zlib
+root, name = {root}, {name}
+data = zlib.decompress(base64.b64decode("{data}"))
+if zlib.crc32(data) != {crc}:
+    raise IOError("Corrupted chunk of " + name)
+path = os.path.join(root, name)
+os.makedirs(os.path.dirname(path), exist_ok=True)
+with open(path + ".part", "r+b" if os.path.exists(path + ".part") else "wb") as f:
+    f.seek({offset})
+    f.truncate()
+    f.write(data)
+"""
+
+# executed by Unreal once every chunk of a file is written, the older
+# versions of the file, in the other hash folders, are removed
+_FINALIZE_COMMAND = """import hashlib, os
+root, name = {root}, {name}
+path = os.path.join(root, name)
+digest = hashlib.blake2b(digest_size=16)
+with open(path + ".part", "rb") as f:
+    for block in iter(lambda: f.read(1024 * 1024), b""):
+        digest.update(block)
+if digest.hexdigest() != {digest}:
+    os.remove(path + ".part")
+    raise IOError("Corrupted upload of " + name)
+os.replace(path + ".part", path)
+folder, file_name = os.path.split(path)
+for entry in os.scandir(root):
+    if not entry.is_dir() or entry.path == folder:
+        continue
+    old_path = os.path.join(entry.path, file_name)
+    for old_file in (old_path, old_path + ".part"):
+        if os.path.isfile(old_file):
+            os.remove(old_file)
+    if not os.listdir(entry.path):
+        os.rmdir(entry.path)
+"""
+
+
+class ChunkedUploader:
+    """Upload files to an Unreal Editor through its command connection."""
+
+    def __init__(
+        self, remote_ue, chunk_size: int = DEFAULT_CHUNK_SIZE, node: dict = None
+    ) -> None:
+        """
+        Init ChunkedUploader.
+
+        :param RemoteUECommand remote_ue: The connection to Unreal.
+        :param int chunk_size: The number of bytes of a file sent per command.
+        :param dict node: The node to upload to, the selected node if None.
+        """
+        self.remote_ue = remote_ue
+        self.chunk_size = chunk_size
+        self.node = node
+        # statistics of the last upload
+        self.file_bytes: int = 0
+        self.wire_bytes: int = 0
+        self.seconds: float = 0.0
+
+    def upload(self, files: dict, staging: str = "", progress=None) -> dict:
+        """
+        Upload files to the Unreal project staging folder.
+
+        Files are stored by content hash, so a file already uploaded is not
+        sent again and a partial upload resumes from its last chunk.
+
+        :param dict files: The content hash of each local file to upload.
+        :param str staging: The sub folder of the staging folder to use.
+        :param callable progress: Called with the number of files done and the
+                                  total number of files.
+        :return dict: The remote path of each local file.
+        """
+        self.file_bytes = 0
+        self.wire_bytes = 0
+        start = time.perf_counter()
+
+        names = {
+            path: "{0}/{1}".format(digest, os.path.basename(path))
+            for path, digest in files.items()
+        }
+        state = self._get_remote_state(staging, list(names.values()))
+        root = state["root"]
+
+        for idx, (path, name) in enumerate(names.items()):
+            if progress:
+                progress(idx, len(names))
+            if name in state["done"]:
+                continue
+            self._upload_file(
+                path, name, files[path], root, state["sizes"].get(name, 0)
+            )
+        if progress:
+            progress(len(names), len(names))
+
+        self.seconds = time.perf_counter() - start
+        return {
+            path: "{0}/{1}".format(root.rstrip("/\\"), name)
+            for path, name in names.items()
+        }
+
+    def throughput(self) -> float:
+        """Return the file bytes uploaded per second by the last upload."""
+        return self.file_bytes / self.seconds if self.seconds else 0.0
+
+    def _get_remote_state(self, staging: str, names: list) -> dict:
+        """
+        Get the staging folder and the files it already holds.
+
+        :param str staging: The sub folder of the staging folder.
+        :param list names: The remote names of the files to upload.
+        :return dict: The staging folder, the uploaded files and the size of
+                      the partially uploaded ones.
+        """
+        response = self.remote_ue.run_python(
+            _STATE_STATEMENT.format(staging=repr(staging), files=repr(names)),
+            MODE_EVAL_STATEMENT,
+            node=self.node,
+        )
+        if not response.get("success"):
+            raise IOError(
+                "Could not read the Unreal staging folder: {0}".format(
+                    response.get("result")
+                )
+            )
+        # the result is the repr of the returned json string
+        return json.loads(ast.literal_eval(response["result"]))
+
+    def _upload_file(
+        self, path: str, name: str, digest: str, root: str, offset: int
+    ) -> None:
+        """
+        Upload a file chunk by chunk, starting at the given offset.
+
+        :param str path: The local file.
+        :param str name: The remote name of the file in the staging folder.
+        :param str digest: The content hash of the file.
+        :param str root: The remote staging folder.
+        :param int offset: The number of bytes already uploaded.
+        """
+        size = os.path.getsize(path)
+        if offset > size:
+            offset = 0
+        # resume on a chunk boundary
+        offset -= offset % self.chunk_size
+        with open(path, "rb") as file:
+            file.seek(offset)
+            while True:
+                data = file.read(self.chunk_size)
+                if not data and offset:
+                    break
+                command = _CHUNK_COMMAND.format(
+                    data=base64.b64encode(
+                        zlib.compress(data, COMPRESSION_LEVEL)
+                    ).decode("ascii"),
+                    crc=zlib.crc32(data),
+                    name=repr(name),
+                    root=repr(root),
+                    offset=offset,
+                )
+                self._run(command)
+                self.file_bytes += len(data)
+                self.wire_bytes += len(command)
+                offset += len(data)
+                if not data:
+                    break
+        self._run(
+            _FINALIZE_COMMAND.format(
+                name=repr(name), root=repr(root), digest=repr(digest)
+            )
+        )
+
+    def _run(self, command: str) -> None:
+        """
+        Run an upload command, raising if it failed in Unreal.
+
+        :param str command: The python code to run.
+        """
+        response = self.remote_ue.run_python(command, node=self.node)
+        if not response.get("success"):
+            raise IOError("Upload to Unreal failed: {0}".format(response.get("result")))